@@ -5,11 +5,14 @@ Handles environment variables, thresholds, and service configuration.
 """
 
 import os
+import socket
 from dataclasses import dataclass, field
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 from pathlib import Path
 from dotenv import load_dotenv
 
+from .ppe import IGNORE, PPEClass
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -20,6 +23,98 @@ class CameraConfig:
     id: str
     source: str  # RTSP URL or USB device index
     enabled: bool = True
+    # Region of interest: polygons in normalized (0-1) frame coordinates
+    roi: List[List[Tuple[float, float]]] = field(default_factory=list)
+    # Per-camera overrides of the global frame settings (None = use global)
+    fps: Optional[int] = None
+    frame_width: Optional[int] = None
+    frame_height: Optional[int] = None
+
+
+def parse_roi(spec: str) -> List[List[Tuple[float, float]]]:
+    """
+    Parse an ROI spec into polygons.
+
+    Regions are separated by "|". Each region is a comma-separated list of
+    normalized coordinates: 4 values are a rectangle (x1,y1,x2,y2), 6 or more
+    values are polygon vertices (x,y,x,y,...).
+    """
+    polygons = []
+    for region in spec.split("|"):
+        values = [float(v) for v in region.split(",") if v.strip()]
+        if len(values) == 4:
+            x1, y1, x2, y2 = values
+            polygons.append([(x1, y1), (x2, y1), (x2, y2), (x1, y2)])
+        elif len(values) >= 6 and len(values) % 2 == 0:
+            polygons.append(list(zip(values[0::2], values[1::2])))
+        elif values:
+            raise ValueError(f"Invalid ROI region: {region!r}")
+    return polygons
+
+
+def parse_model_imgsz(spec: str) -> Dict[str, int]:
+    """Parse a per-model input size spec such as "person:640,eyes:160"."""
+    sizes = {}
+    for item in spec.split(","):
+        parts = item.strip().split(":", 1)
+        if len(parts) == 2:
+            sizes[parts[0].strip()] = int(parts[1])
+    return sizes
+
+
+MODEL_VARIANTS = ("fp32", "int8")
+
+
+def parse_model_variants(spec: str) -> Dict[str, str]:
+    """Parse a per-model variant spec such as "person:int8,coat:int8"."""
+    variants = {}
+    for item in spec.split(","):
+        parts = item.strip().split(":", 1)
+        if len(parts) != 2:
+            continue
+        name, variant = parts[0].strip(), parts[1].strip().lower()
+        if variant not in MODEL_VARIANTS:
+            raise ValueError(f"Invalid MODEL_VARIANTS entry {item.strip()!r}, expected one of {MODEL_VARIANTS}")
+        variants[name] = variant
+    return variants
+
+
+def parse_class_map(spec: str) -> Dict[str, str]:
+    """
+    Parse a model class mapping such as "nitrile glove:gloves,vest:ignore".
+
+    Keys are model class names (case-insensitive), values are canonical class
+    labels or "ignore".
+    """
+    mapping = {}
+    for item in spec.split(","):
+        parts = item.strip().rsplit(":", 1)
+        if len(parts) != 2:
+            continue
+        name, target = parts[0].strip().lower(), parts[1].strip().lower()
+        if target != IGNORE and target.upper() not in PPEClass.__members__:
+            raise ValueError(f"Invalid CLASS_MAP target {target!r} for class {name!r}")
+        mapping[name] = target
+    return mapping
+
+
+def parse_hour_range(spec: str) -> Optional[Tuple[int, int]]:
+    """
+    Parse a local-time hour window such as "22-6" (22:00 to 06:00).
+
+    Returns:
+        (start hour, end hour), or None for an empty spec (any time).
+    """
+    spec = spec.strip()
+    if not spec:
+        return None
+    try:
+        start, end = (int(part) for part in spec.split("-"))
+    except ValueError:
+        raise ValueError(f"Invalid hour range {spec!r}, expected e.g. \"22-6\"") from None
+    if not (0 <= start <= 23 and 0 <= end <= 24):
+        raise ValueError(f"Invalid hour range {spec!r}: hours must be 0-24")
+    return start, end
 
 
 @dataclass
@@ -34,12 +129,83 @@ class Config:
     # AI Detector Configuration
     detector_timeout: float = 5.0
     use_mock_detector: bool = False  # Flag to use mock detection
+    model_imgsz: Dict[str, int] = field(default_factory=dict)  # model name -> max input size
+    model_variants: Dict[str, str] = field(default_factory=dict)  # model name -> fp32 | int8
+    adaptive_imgsz: bool = False  # Shrink sub-model input size to fit the crop
+    min_imgsz: int = 64  # Smallest input size the adaptive policy will pick
+    class_map: Dict[str, str] = field(default_factory=dict)  # model class name -> canonical class
+    
+    # Tiled high-resolution mode: person model on a downscaled frame,
+    # PPE crops from the full-resolution frame
+    tiled_detection: bool = False
+    tile_size: int = 0  # >0 also searches overlapping full-res tiles for people
+    tile_overlap: float = 0.2  # Fraction of tile size shared by neighbouring tiles
+    tile_nms_iou: float = 0.5  # IoU above which person boxes from tiles are merged
+    tile_nms_containment: float = 0.8  # Also merged when this much of the smaller box lies in the other
     
     # Camera Configuration
     cameras: List[CameraConfig] = None
     frame_width: int = 640
     frame_height: int = 480
     fps: int = 10  # Frames per second to process
+    idle_health_check_interval: float = 1.0  # Seconds between grabs while no session is active
+    frame_deadline: float = 5.0  # Drop frames older than this by the end of detection (0 = off)
+    latency_slo: float = 0.0  # Capture-to-alert objective in seconds, reported by /latency (0 = none)
+    
+    # Decoding: "thread" decodes in the service process, "process" uses
+    # supervised decoder processes writing to shared-memory frame rings
+    decoder_mode: str = "thread"
+    decoder_processes: int = 0  # 0 = one per CPU core (capped at the camera count)
+    decoder_ring_slots: int = 4
+    decoder_max_width: int = 3840  # Slot size for full-resolution (tiled) mode
+    decoder_max_height: int = 2160
+    decoder_heartbeat_timeout: float = 10.0
+    decoder_max_cameras: int = 64  # Upper bound on cameras handled by the decoder pool
+    
+    # Thread pools for blocking work, one per workload (see core.executors)
+    inference_workers: int = 2  # Concurrent cascade runs
+    encode_workers: int = 2  # JPEG encoding of snapshots, previews and clip frames
+    io_workers: int = 4  # Clip files, history, snapshot cache
+    
+    # Sharding: split the configured cameras between several edge nodes
+    sharding_enabled: bool = False
+    node_id: str = ""  # Defaults to the hostname
+    shard_backend: str = "file"  # "file" (shared lease file) or "supabase"
+    shard_lease_file: str = "shard_leases.json"
+    shard_lease_ttl: float = 6.0  # Seconds before a silent node's cameras move
+    shard_renew_interval: float = 2.0
+    
+    # Live preview (MJPEG, encoded once per frame for all viewers)
+    preview_fps: float = 5.0
+    preview_width: int = 640  # Frames wider than this are downscaled
+    preview_quality: int = 70
+    preview_draw_boxes: bool = True
+    
+    # Pre-event violation clips (JPEG ring per camera, MP4 written on violation)
+    clip_enabled: bool = False
+    clip_pre_seconds: float = 10.0
+    clip_post_seconds: float = 5.0
+    clip_fps: float = 5.0
+    clip_width: int = 640
+    clip_quality: int = 70
+    clip_buffer_mb: float = 8.0  # Per-camera ring cap
+    clip_dir: str = "clips"
+    clip_upload_queue: int = 20
+    clip_dir_max_mb: float = 1024.0  # Clips not uploaded are pruned oldest first beyond this (0 = no cap)
+    
+    # Time-weighted PPE compliance per session/camera (compliance_rollups table)
+    compliance_enabled: bool = False
+    compliance_flush_interval: float = 60.0  # Seconds between rollup rows
+    compliance_max_gap: float = 2.0  # Longest frame interval credited as observation time
+    
+    # Local detection history (GET /history)
+    history_enabled: bool = False
+    history_dir: str = "history"
+    history_flush_interval: float = 5.0  # Seconds between batched appends
+    history_retention_hours: int = 72  # Older hour partitions are deleted (0 = keep)
+    
+    # Live events (GET /events): per-subscriber queue bound
+    event_queue_size: int = 100
     
     # Violation Detection Configuration
     violation_debounce_seconds: float = 2.0
@@ -52,18 +218,48 @@ class Config:
     
     # Person-PPE Association
     iou_threshold: float = 0.3  # Intersection over Union for matching PPE to people
+    track_iou_threshold: float = 0.3  # Min IoU to continue a person track in the next frame
+    
+    # PPE presence smoothing per track (exponential, with hysteresis)
+    ppe_smoothing_seconds: float = 1.0  # Time constant; 0 = use each frame as is
+    ppe_on_threshold: float = 0.5  # Smoothed confidence at which PPE counts as worn
+    ppe_off_threshold: float = 0.2  # ...and below which it counts as missing again
     
     # Storage Configuration
     snapshot_storage_bucket: str = "violation-snapshots"
     snapshot_quality: int = 85  # JPEG quality (1-100)
+    snapshot_dedup_enabled: bool = True  # Link near-duplicate snapshots instead of uploading
+    snapshot_dedup_track_distance: int = 10  # Max dHash bit distance, same person track
+    snapshot_dedup_camera_distance: int = 4  # Max dHash bit distance, any track of the camera
+    snapshot_dedup_size: int = 64  # Snapshots remembered per camera (LRU)
+    # Tiered snapshots: thumbnail with the alert, full image cached and uploaded later
+    snapshot_tiered: bool = False
+    snapshot_thumbnail_width: int = 160
+    snapshot_thumbnail_quality: int = 70
+    snapshot_cache_dir: str = "snapshot_cache"
+    snapshot_cache_mb: float = 512.0  # Full images kept locally (LRU)
+    snapshot_upload_hours: Optional[Tuple[int, int]] = None  # Local off-peak window; None = any time
+    snapshot_upload_interval: float = 60.0  # Seconds between full-image upload batches
+    snapshot_upload_batch: int = 20
     
     # Reconnection Settings
-    camera_reconnect_delay: float = 5.0
+    camera_reconnect_delay: float = 5.0  # First camera retry delay, doubled per failure
+    camera_reconnect_max_delay: float = 60.0
+    camera_slow_retry_interval: float = 120.0  # Retry interval once max attempts are used up
     detector_reconnect_delay: float = 3.0
     max_reconnect_attempts: int = 10
     
     # Logging
     log_level: str = "INFO"
+    log_queue_size: int = 10000  # Records buffered for the writer thread; extra records are dropped
+    log_rate_limit: int = 10  # Records per message key per interval (0 = unlimited)
+    log_rate_interval: float = 10.0
+    log_sample_every: int = 100  # Still log every Nth suppressed record (0 = none)
+    log_summary_interval: float = 60.0  # Per-camera detection summary period (0 = off)
+    debug_counters: bool = False  # Count frame-path allocations (see /debug/counters)
+    
+    # Offline tools (benchmarks) run without Supabase credentials
+    require_supabase: bool = True
     
     def __post_init__(self):
         """Initialize configuration from environment variables."""
@@ -78,7 +274,7 @@ class Config:
             self.supabase_service_role_key
         )
         
-        if not self.supabase_url or not self.supabase_key:
+        if self.require_supabase and (not self.supabase_url or not self.supabase_key):
             raise ValueError(
                 "SUPABASE_URL and SUPABASE_KEY (or SUPABASE_ANON_KEY) must be set in environment"
             )
@@ -90,6 +286,34 @@ class Config:
         self.use_mock_detector = os.getenv(
             "USE_MOCK_DETECTOR", str(self.use_mock_detector)
         ).lower() == "true"
+        model_imgsz = os.getenv("MODEL_IMGSZ", "")
+        if model_imgsz:
+            self.model_imgsz = parse_model_imgsz(model_imgsz)
+        model_variants = os.getenv("MODEL_VARIANTS", "")
+        if model_variants:
+            self.model_variants = parse_model_variants(model_variants)
+        self.adaptive_imgsz = os.getenv(
+            "ADAPTIVE_IMGSZ", str(self.adaptive_imgsz)
+        ).lower() == "true"
+        self.min_imgsz = int(os.getenv("MIN_IMGSZ", str(self.min_imgsz)))
+        class_map = os.getenv("CLASS_MAP", "")
+        if class_map:
+            self.class_map = parse_class_map(class_map)
+        
+        # Tiled detection
+        self.tiled_detection = os.getenv(
+            "TILED_DETECTION", str(self.tiled_detection)
+        ).lower() == "true"
+        self.tile_size = int(os.getenv("TILE_SIZE", str(self.tile_size)))
+        self.tile_overlap = float(
+            os.getenv("TILE_OVERLAP", str(self.tile_overlap))
+        )
+        self.tile_nms_iou = float(
+            os.getenv("TILE_NMS_IOU", str(self.tile_nms_iou))
+        )
+        self.tile_nms_containment = float(
+            os.getenv("TILE_NMS_CONTAINMENT", str(self.tile_nms_containment))
+        )
         
         # Camera Configuration
         camera_sources = os.getenv("CAMERA_SOURCES", "")
@@ -105,12 +329,148 @@ class Config:
             # Default: single USB camera at index 0
             self.cameras = [CameraConfig(id="camera_0", source="0")]
         
+        # Camera ROIs
+        # Format: "camera1=0.1,0.2,0.6,0.9;camera2=0,0,0.5,0,0.5,1|0.6,0,1,1"
+        camera_rois = os.getenv("CAMERA_ROIS", "")
+        if camera_rois:
+            rois = {}
+            for roi_str in camera_rois.split(";"):
+                parts = roi_str.strip().split("=", 1)
+                if len(parts) == 2:
+                    rois[parts[0].strip()] = parse_roi(parts[1])
+            for camera in self.cameras:
+                if camera.id in rois:
+                    camera.roi = rois[camera.id]
+        
         # Frame settings
         self.frame_width = int(os.getenv("FRAME_WIDTH", str(self.frame_width)))
         self.frame_height = int(
             os.getenv("FRAME_HEIGHT", str(self.frame_height))
         )
         self.fps = int(os.getenv("FPS", str(self.fps)))
+        self.idle_health_check_interval = float(
+            os.getenv(
+                "IDLE_HEALTH_CHECK_INTERVAL",
+                str(self.idle_health_check_interval)
+            )
+        )
+        self.frame_deadline = float(os.getenv("FRAME_DEADLINE", str(self.frame_deadline)))
+        self.latency_slo = float(os.getenv("LATENCY_SLO", str(self.latency_slo)))
+        
+        # Decoder settings
+        self.decoder_mode = os.getenv("DECODER_MODE", self.decoder_mode).lower()
+        if self.decoder_mode not in ("thread", "process"):
+            raise ValueError("DECODER_MODE must be 'thread' or 'process'")
+        self.decoder_processes = int(
+            os.getenv("DECODER_PROCESSES", str(self.decoder_processes))
+        )
+        self.decoder_ring_slots = int(
+            os.getenv("DECODER_RING_SLOTS", str(self.decoder_ring_slots))
+        )
+        self.decoder_max_width = int(
+            os.getenv("DECODER_MAX_WIDTH", str(self.decoder_max_width))
+        )
+        self.decoder_max_height = int(
+            os.getenv("DECODER_MAX_HEIGHT", str(self.decoder_max_height))
+        )
+        self.decoder_heartbeat_timeout = float(
+            os.getenv(
+                "DECODER_HEARTBEAT_TIMEOUT",
+                str(self.decoder_heartbeat_timeout)
+            )
+        )
+        self.decoder_max_cameras = int(
+            os.getenv("DECODER_MAX_CAMERAS", str(self.decoder_max_cameras))
+        )
+        
+        # Executor sizes
+        self.inference_workers = int(
+            os.getenv("INFERENCE_WORKERS", str(self.inference_workers))
+        )
+        self.encode_workers = int(os.getenv("ENCODE_WORKERS", str(self.encode_workers)))
+        self.io_workers = int(os.getenv("IO_WORKERS", str(self.io_workers)))
+        if min(self.inference_workers, self.encode_workers, self.io_workers) < 1:
+            raise ValueError("INFERENCE_WORKERS, ENCODE_WORKERS and IO_WORKERS must be at least 1")
+        
+        # Sharding
+        self.sharding_enabled = os.getenv(
+            "SHARDING_ENABLED", str(self.sharding_enabled)
+        ).lower() == "true"
+        self.node_id = os.getenv("NODE_ID", self.node_id) or socket.gethostname()
+        self.shard_backend = os.getenv("SHARD_BACKEND", self.shard_backend).lower()
+        if self.shard_backend not in ("file", "supabase"):
+            raise ValueError("SHARD_BACKEND must be 'file' or 'supabase'")
+        self.shard_lease_file = os.getenv("SHARD_LEASE_FILE", self.shard_lease_file)
+        self.shard_lease_ttl = float(
+            os.getenv("SHARD_LEASE_TTL", str(self.shard_lease_ttl))
+        )
+        self.shard_renew_interval = float(
+            os.getenv("SHARD_RENEW_INTERVAL", str(self.shard_renew_interval))
+        )
+        if self.shard_renew_interval >= self.shard_lease_ttl:
+            raise ValueError("SHARD_RENEW_INTERVAL must be shorter than SHARD_LEASE_TTL")
+        
+        # Preview
+        self.preview_fps = float(os.getenv("PREVIEW_FPS", str(self.preview_fps)))
+        self.preview_width = int(os.getenv("PREVIEW_WIDTH", str(self.preview_width)))
+        self.preview_quality = int(
+            os.getenv("PREVIEW_QUALITY", str(self.preview_quality))
+        )
+        self.preview_draw_boxes = os.getenv(
+            "PREVIEW_DRAW_BOXES", str(self.preview_draw_boxes)
+        ).lower() == "true"
+        
+        # Clips
+        self.clip_enabled = os.getenv(
+            "CLIP_ENABLED", str(self.clip_enabled)
+        ).lower() == "true"
+        self.clip_pre_seconds = float(
+            os.getenv("CLIP_PRE_SECONDS", str(self.clip_pre_seconds))
+        )
+        self.clip_post_seconds = float(
+            os.getenv("CLIP_POST_SECONDS", str(self.clip_post_seconds))
+        )
+        self.clip_fps = float(os.getenv("CLIP_FPS", str(self.clip_fps)))
+        self.clip_width = int(os.getenv("CLIP_WIDTH", str(self.clip_width)))
+        self.clip_quality = int(os.getenv("CLIP_QUALITY", str(self.clip_quality)))
+        self.clip_buffer_mb = float(
+            os.getenv("CLIP_BUFFER_MB", str(self.clip_buffer_mb))
+        )
+        self.clip_dir = os.getenv("CLIP_DIR", self.clip_dir)
+        self.clip_upload_queue = int(
+            os.getenv("CLIP_UPLOAD_QUEUE", str(self.clip_upload_queue))
+        )
+        self.clip_dir_max_mb = float(
+            os.getenv("CLIP_DIR_MAX_MB", str(self.clip_dir_max_mb))
+        )
+        
+        # Compliance
+        self.compliance_enabled = os.getenv(
+            "COMPLIANCE_ENABLED", str(self.compliance_enabled)
+        ).lower() == "true"
+        self.compliance_flush_interval = float(
+            os.getenv("COMPLIANCE_FLUSH_INTERVAL", str(self.compliance_flush_interval))
+        )
+        self.compliance_max_gap = float(
+            os.getenv("COMPLIANCE_MAX_GAP", str(self.compliance_max_gap))
+        )
+        
+        # History
+        self.history_enabled = os.getenv(
+            "HISTORY_ENABLED", str(self.history_enabled)
+        ).lower() == "true"
+        self.history_dir = os.getenv("HISTORY_DIR", self.history_dir)
+        self.history_flush_interval = float(
+            os.getenv("HISTORY_FLUSH_INTERVAL", str(self.history_flush_interval))
+        )
+        self.history_retention_hours = int(
+            os.getenv("HISTORY_RETENTION_HOURS", str(self.history_retention_hours))
+        )
+        
+        # Events
+        self.event_queue_size = int(
+            os.getenv("EVENT_QUEUE_SIZE", str(self.event_queue_size))
+        )
         
         # Violation settings
         self.violation_debounce_seconds = float(
@@ -141,6 +501,22 @@ class Config:
         self.iou_threshold = float(
             os.getenv("IOU_THRESHOLD", str(self.iou_threshold))
         )
+        self.track_iou_threshold = float(
+            os.getenv("TRACK_IOU_THRESHOLD", str(self.track_iou_threshold))
+        )
+        
+        # PPE smoothing
+        self.ppe_smoothing_seconds = float(
+            os.getenv("PPE_SMOOTHING_SECONDS", str(self.ppe_smoothing_seconds))
+        )
+        self.ppe_on_threshold = float(
+            os.getenv("PPE_ON_THRESHOLD", str(self.ppe_on_threshold))
+        )
+        self.ppe_off_threshold = float(
+            os.getenv("PPE_OFF_THRESHOLD", str(self.ppe_off_threshold))
+        )
+        if self.ppe_off_threshold > self.ppe_on_threshold:
+            raise ValueError("PPE_OFF_THRESHOLD must not exceed PPE_ON_THRESHOLD")
         
         # Storage
         self.snapshot_storage_bucket = os.getenv(
@@ -150,6 +526,40 @@ class Config:
         self.snapshot_quality = int(
             os.getenv("SNAPSHOT_QUALITY", str(self.snapshot_quality))
         )
+        self.snapshot_dedup_enabled = os.getenv(
+            "SNAPSHOT_DEDUP_ENABLED", str(self.snapshot_dedup_enabled)
+        ).lower() == "true"
+        self.snapshot_dedup_track_distance = int(
+            os.getenv("SNAPSHOT_DEDUP_TRACK_DISTANCE", str(self.snapshot_dedup_track_distance))
+        )
+        self.snapshot_dedup_camera_distance = int(
+            os.getenv("SNAPSHOT_DEDUP_CAMERA_DISTANCE", str(self.snapshot_dedup_camera_distance))
+        )
+        self.snapshot_dedup_size = int(
+            os.getenv("SNAPSHOT_DEDUP_SIZE", str(self.snapshot_dedup_size))
+        )
+        self.snapshot_tiered = os.getenv(
+            "SNAPSHOT_TIERED", str(self.snapshot_tiered)
+        ).lower() == "true"
+        self.snapshot_thumbnail_width = int(
+            os.getenv("SNAPSHOT_THUMBNAIL_WIDTH", str(self.snapshot_thumbnail_width))
+        )
+        self.snapshot_thumbnail_quality = int(
+            os.getenv("SNAPSHOT_THUMBNAIL_QUALITY", str(self.snapshot_thumbnail_quality))
+        )
+        self.snapshot_cache_dir = os.getenv("SNAPSHOT_CACHE_DIR", self.snapshot_cache_dir)
+        self.snapshot_cache_mb = float(
+            os.getenv("SNAPSHOT_CACHE_MB", str(self.snapshot_cache_mb))
+        )
+        upload_hours = os.getenv("SNAPSHOT_UPLOAD_HOURS", "")
+        if upload_hours:
+            self.snapshot_upload_hours = parse_hour_range(upload_hours)
+        self.snapshot_upload_interval = float(
+            os.getenv("SNAPSHOT_UPLOAD_INTERVAL", str(self.snapshot_upload_interval))
+        )
+        self.snapshot_upload_batch = int(
+            os.getenv("SNAPSHOT_UPLOAD_BATCH", str(self.snapshot_upload_batch))
+        )
         
         # Reconnection
         self.camera_reconnect_delay = float(
@@ -170,6 +580,30 @@ class Config:
                 str(self.max_reconnect_attempts)
             )
         )
+        self.camera_reconnect_max_delay = float(
+            os.getenv(
+                "CAMERA_RECONNECT_MAX_DELAY",
+                str(self.camera_reconnect_max_delay)
+            )
+        )
+        self.camera_slow_retry_interval = float(
+            os.getenv(
+                "CAMERA_SLOW_RETRY_INTERVAL",
+                str(self.camera_slow_retry_interval)
+            )
+        )
         
         # Logging
         self.log_level = os.getenv("LOG_LEVEL", self.log_level)
+        self.log_queue_size = int(os.getenv("LOG_QUEUE_SIZE", str(self.log_queue_size)))
+        self.log_rate_limit = int(os.getenv("LOG_RATE_LIMIT", str(self.log_rate_limit)))
+        self.log_rate_interval = float(
+            os.getenv("LOG_RATE_INTERVAL", str(self.log_rate_interval))
+        )
+        self.log_sample_every = int(os.getenv("LOG_SAMPLE_EVERY", str(self.log_sample_every)))
+        self.log_summary_interval = float(
+            os.getenv("LOG_SUMMARY_INTERVAL", str(self.log_summary_interval))
+        )
+        self.debug_counters = os.getenv(
+            "DEBUG_COUNTERS", str(self.debug_counters)
+        ).lower() == "true"
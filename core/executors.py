@@ -0,0 +1,160 @@
+"""
+Named executors.
+
+Blocking work runs in separately sized thread pools per workload instead of
+asyncio's shared default executor, so a burst of one kind (e.g. clip
+writes) cannot starve another (inference):
+
+- inference: the detection cascade
+- encode: JPEG encoding of snapshots, previews and clip frames
+- io: blocking disk work (clip files, history, the snapshot cache)
+- leases: shard lease renewal, which must never wait behind other work
+
+Every pool counts queued and running calls, time spent waiting for a
+worker and time spent running, so its saturation can be observed.
+"""
+
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+INFERENCE = "inference"
+ENCODE = "encode"
+IO = "io"
+LEASES = "leases"
+
+DEFAULT_WORKERS = {INFERENCE: 2, ENCODE: 2, IO: 4, LEASES: 1}
+
+
+class NamedExecutor:
+    """Thread pool of one workload with queue and utilization counters."""
+
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{name}-")
+        self._lock = threading.Lock()
+        self._created = time.monotonic()
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.queued = 0
+        self.peak_queued = 0
+        self.active = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.busy_seconds = 0.0
+
+    def _call(self, submitted: float, fn: Callable):
+        started = time.perf_counter()
+        wait = started - submitted
+        with self._lock:
+            self.queued -= 1
+            self.active += 1
+            self.wait_seconds += wait
+            self.max_wait_seconds = max(self.max_wait_seconds, wait)
+        failed = False
+        try:
+            return fn()
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.active -= 1
+                self.completed += 1
+                self.failed += failed
+                self.busy_seconds += elapsed
+
+    def _on_done(self, future: Future):
+        # A call cancelled before a worker picked it up never reaches _call
+        if future.cancelled():
+            with self._lock:
+                self.queued -= 1
+                self.cancelled += 1
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """Run fn(*args, **kwargs) on this pool and await its result."""
+        with self._lock:
+            self.submitted += 1
+            self.queued += 1
+            self.peak_queued = max(self.peak_queued, self.queued)
+        future = self._pool.submit(self._call, time.perf_counter(), functools.partial(fn, *args, **kwargs))
+        future.add_done_callback(self._on_done)
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            started = self.completed + self.active
+            uptime = time.monotonic() - self._created
+            return {
+                "workers": self.workers,
+                "active": self.active,
+                "queued": self.queued,
+                "peak_queued": self.peak_queued,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "cancelled": self.cancelled,
+                "mean_wait_ms": round(self.wait_seconds / started * 1000, 2) if started else 0.0,
+                "max_wait_ms": round(self.max_wait_seconds * 1000, 2),
+                "mean_run_ms": round(self.busy_seconds / self.completed * 1000, 2) if self.completed else 0.0,
+                # Share of worker time spent running calls since the pool was created
+                "utilization": round(self.busy_seconds / (self.workers * uptime), 4) if uptime > 0 else 0.0,
+            }
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+
+class Executors:
+    """The process's named executors, created on first use."""
+
+    def __init__(self):
+        self._sizes = dict(DEFAULT_WORKERS)
+        self._executors: Dict[str, NamedExecutor] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, sizes: Dict[str, int]):
+        """Set pool sizes; call before the pools are first used."""
+        for name, workers in sizes.items():
+            if workers < 1:
+                raise ValueError(f"Executor {name} needs at least one worker, got {workers}")
+            if name in self._executors and self._executors[name].workers != workers:
+                raise RuntimeError(f"Executor {name} is already running with {self._executors[name].workers} workers")
+            self._sizes[name] = workers
+
+    def get(self, name: str) -> NamedExecutor:
+        with self._lock:
+            executor = self._executors.get(name)
+            if executor is None:
+                executor = NamedExecutor(name, self._sizes.get(name, 1))
+                self._executors[name] = executor
+            return executor
+
+    async def run(self, name: str, fn: Callable, *args, **kwargs):
+        """Run a blocking call on the named executor."""
+        return await self.get(name).run(fn, *args, **kwargs)
+
+    def stats(self, name: Optional[str] = None) -> Dict:
+        with self._lock:
+            executors = dict(self._executors)
+        if name is not None:
+            return executors[name].stats() if name in executors else {}
+        return {name: executor.stats() for name, executor in sorted(executors.items())}
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            executors, self._executors = list(self._executors.values()), {}
+        for executor in executors:
+            executor.shutdown(wait=wait)
+
+
+# Process-wide instance, sized from Config in main
+executors = Executors()
@@ -0,0 +1,202 @@
+"""
+Logging setup.
+
+Log records are handed to a bounded queue and written by a background
+thread, so the frame path never waits on stderr or a file. Repeated
+messages are rate limited per message key (the call site, unless a record
+sets `extra={"log_key": ...}`), with a sample of suppressed messages still
+let through. Per-frame detail is aggregated into periodic per-camera
+summaries instead of being logged line by line.
+"""
+
+import logging
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, Tuple
+import numpy as np
+
+from .config import Config
+from .ppe import LABELS
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets at most `limit` records per message key through per `interval`.
+
+    Every `sample_every`-th suppressed record still passes (0 = none). The
+    first record after suppression notes how many were dropped.
+    """
+
+    def __init__(self, limit: int, interval: float, sample_every: int = 0):
+        super().__init__()
+        self.limit = limit
+        self.interval = interval
+        self.sample_every = sample_every
+        # key -> [window start, passed in window, suppressed since last pass]
+        self._windows: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+        self.suppressed = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.limit <= 0:
+            return True
+        key = getattr(record, "log_key", None) or (record.pathname, record.lineno)
+        now = record.created
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window else 0
+                window = self._windows[key] = [now, 0, suppressed]
+            if window[1] >= self.limit:
+                window[2] += 1
+                if not self.sample_every or window[2] % self.sample_every:
+                    self.suppressed += 1
+                    return False
+            window[1] += 1
+            suppressed, window[2] = window[2], 0
+        if suppressed:
+            record.msg = f"{record.msg} ({suppressed} similar messages suppressed)"
+        return True
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class DetectionSummary:
+    """
+    Per-camera detection counts per class, logged once per interval.
+
+    `add` costs one attribute check when disabled and a bincount otherwise.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.interval = 60.0
+        self.logger = logging.getLogger("detections")
+        self._counts: Dict[str, np.ndarray] = {}
+        self._frames: Dict[str, int] = {}
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def configure(self, interval: float):
+        self.interval = interval
+        self.enabled = interval > 0
+
+    def add(self, camera_id: str, class_ids: np.ndarray):
+        """Count one processed frame's detections (canonical class ids)."""
+        if not self.enabled:
+            return
+        counts = np.bincount(class_ids, minlength=len(LABELS))
+        with self._lock:
+            if camera_id in self._counts:
+                self._counts[camera_id] += counts
+                self._frames[camera_id] += 1
+            else:
+                self._counts[camera_id] = counts.astype(np.int64)
+                self._frames[camera_id] = 1
+            due = time.monotonic() - self._started >= self.interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Log and reset the counts gathered since the last flush."""
+        with self._lock:
+            counts, self._counts = self._counts, {}
+            frames, self._frames = self._frames, {}
+            elapsed = time.monotonic() - self._started
+            self._started = time.monotonic()
+        for camera_id in sorted(counts):
+            totals = ", ".join(
+                f"{LABELS[i]}={n}" for i, n in enumerate(counts[camera_id].tolist()) if n
+            )
+            self.logger.info(
+                f"Camera {camera_id}: {frames[camera_id]} frames in {elapsed:.0f}s, "
+                f"detections: {totals or 'none'}"
+            )
+
+
+# Process-wide instance, configured by setup_logging
+detection_summary = DetectionSummary()
+
+_handler: Optional[DroppingQueueHandler] = None
+_rate_filter: Optional[RateLimitFilter] = None
+
+
+def setup_logging(config: Config) -> QueueListener:
+    """
+    Route the root logger through a background writer thread.
+
+    Returns:
+        The started listener; stop it at shutdown to flush queued records.
+    """
+    global _handler, _rate_filter
+
+    log_queue: queue.Queue = queue.Queue(maxsize=config.log_queue_size)
+    _handler = DroppingQueueHandler(log_queue)
+    _rate_filter = RateLimitFilter(
+        config.log_rate_limit, config.log_rate_interval, config.log_sample_every
+    )
+    _handler.addFilter(_rate_filter)
+
+    output = logging.StreamHandler()
+    output.setFormatter(logging.Formatter(LOG_FORMAT))
+    listener = QueueListener(log_queue, output, respect_handler_level=True)
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(_handler)
+    root.setLevel(config.log_level.upper())
+
+    detection_summary.configure(config.log_summary_interval)
+    listener.start()
+    return listener
+
+
+def shutdown_logging(listener: QueueListener):
+    """
+    Flush the detection summary and queued records, then log directly.
+
+    The root logger writes to stderr itself from here on, so records logged
+    after shutdown (threads still winding down, interpreter exit) are not
+    left in a queue nobody reads.
+    """
+    global _handler
+
+    detection_summary.flush()
+
+    output = logging.StreamHandler()
+    output.setFormatter(logging.Formatter(LOG_FORMAT))
+    if _rate_filter is not None:
+        output.addFilter(_rate_filter)
+    root = logging.getLogger()
+    # Swap handlers before stopping so no record lands in the queue after it is drained
+    root.addHandler(output)
+    if _handler is not None:
+        root.removeHandler(_handler)
+        _handler = None
+    listener.stop()
+
+
+def log_stats() -> Dict:
+    """Records dropped by the full queue and suppressed by rate limiting."""
+    return {
+        "queued": _handler.queue.qsize() if _handler else 0,
+        "dropped": _handler.dropped if _handler else 0,
+        "suppressed": _rate_filter.suppressed if _rate_filter else 0,
+    }
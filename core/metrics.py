@@ -0,0 +1,132 @@
+"""
+Runtime metrics.
+
+Lightweight in-process counters for diagnosing the frame hot path, and
+latency histograms from frame capture to each pipeline stage.
+"""
+
+import bisect
+import threading
+from collections import defaultdict
+from typing import Dict, Optional, Sequence
+
+# Counter name prefix for array allocations on the frame path
+ALLOC_PREFIX = "alloc."
+
+# Upper bounds (seconds) of the latency histogram buckets; one more bucket
+# counts everything slower
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 10.0, 30.0, 60.0)
+
+
+class DebugCounters:
+    """Named counters that cost a single attribute check when disabled."""
+
+    def __init__(self):
+        self.enabled = False
+        self._counts: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def add(self, name: str, count: int = 1):
+        """Increment a counter (no-op unless enabled)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counts[name] += count
+
+    def snapshot(self) -> Dict[str, float]:
+        """Current counter values plus derived allocations per processed frame."""
+        with self._lock:
+            counts: Dict[str, float] = dict(self._counts)
+
+        frames = counts.get("frames_processed", 0)
+        allocations = sum(v for k, v in counts.items() if k.startswith(ALLOC_PREFIX))
+        counts["allocations_per_frame"] = allocations / frames if frames else 0.0
+        return counts
+
+    def reset(self):
+        """Reset all counters to zero."""
+        with self._lock:
+            self._counts.clear()
+
+
+# Process-wide instance, enabled from Config.debug_counters
+debug_counters = DebugCounters()
+
+
+class LatencyHistogram:
+    """Latencies (seconds) counted into fixed buckets."""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.within_slo = 0
+
+    def observe(self, seconds: float, slo: Optional[float] = None):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        if slo is not None and seconds <= slo:
+            self.within_slo += 1
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile by interpolating inside its bucket."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(self.max, lower + (upper - lower) * (rank - seen) / n)
+            seen += n
+        return self.max
+
+    def snapshot(self, slo: Optional[float] = None) -> Dict:
+        labels = [f"{b:g}" for b in self.buckets] + ["inf"]
+        result = {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count * 1000, 1) if self.count else 0.0,
+            "p50_ms": round(self.quantile(0.5) * 1000, 1),
+            "p95_ms": round(self.quantile(0.95) * 1000, 1),
+            "p99_ms": round(self.quantile(0.99) * 1000, 1),
+            "max_ms": round(self.max * 1000, 1),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+        if slo is not None:
+            result["within_slo"] = round(self.within_slo / self.count, 4) if self.count else 1.0
+        return result
+
+
+class LatencyTracker:
+    """Capture-to-stage latency histograms, by stage name."""
+
+    def __init__(self):
+        # Latency objective in seconds (None = not set); counted at observe time
+        self.slo: Optional[float] = None
+        self._stages: Dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float):
+        """Record how long after capture a frame reached `stage`."""
+        with self._lock:
+            histogram = self._stages.get(stage)
+            if histogram is None:
+                histogram = self._stages[stage] = LatencyHistogram()
+            histogram.observe(max(0.0, seconds), self.slo)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {stage: h.snapshot(self.slo) for stage, h in self._stages.items()}
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+
+# Process-wide instance; the SLO is set from Config.latency_slo
+frame_latency = LatencyTracker()
@@ -0,0 +1,75 @@
+"""
+Canonical PPE classes.
+
+Every class a model can output is mapped to one of these once, when the
+models are loaded. Detections carry the canonical class id from then on,
+so nothing on the frame path compares class names.
+"""
+
+from enum import IntEnum
+from typing import Dict, Optional
+
+
+class PPEClass(IntEnum):
+    """Canonical detection classes (values are the ids stored in detections)."""
+    PERSON = 0
+    GOGGLES = 1
+    LAB_COAT = 2
+    GLOVES = 3
+    HAND = 4
+    EYES = 5
+
+    @property
+    def label(self) -> str:
+        return self.name.lower()
+
+
+# Lowercase label of every class, indexed by class id
+LABELS = tuple(c.label for c in PPEClass)
+
+# Classes a person can be required to wear
+PPE_ITEMS = (PPEClass.GOGGLES, PPEClass.LAB_COAT, PPEClass.GLOVES)
+
+# Mapping target for model classes that should be dropped
+IGNORE = "ignore"
+
+# Model class names (lowercase) that don't match a canonical label directly
+DEFAULT_CLASS_MAP = {
+    "safety glove": "gloves",
+    "glove": "gloves",
+    "coat": "lab_coat",
+    "lab coat": "lab_coat",
+    "safety glasses": "goggles",
+    "glasses": "goggles",
+    "eye protection": "goggles",
+    "hands": "hand",
+    "eye": "eyes",
+}
+
+
+def canonical_class(name: str, class_map: Optional[Dict[str, str]] = None) -> Optional[PPEClass]:
+    """
+    Canonical class of a model class name.
+
+    Args:
+        name: Class name as reported by the model
+        class_map: User mapping (lowercase name -> label or "ignore"),
+            consulted before the built-in aliases
+
+    Returns:
+        The canonical class, or None if the class is mapped to "ignore".
+
+    Raises:
+        ValueError: If the name is neither a canonical label nor mapped.
+    """
+    key = name.strip().lower()
+    target = (class_map or {}).get(key) or DEFAULT_CLASS_MAP.get(key, key)
+    if target == IGNORE:
+        return None
+    try:
+        return PPEClass[target.upper()]
+    except KeyError:
+        raise ValueError(
+            f"Unknown class {name!r}; map it with CLASS_MAP, "
+            f"e.g. \"{key}:gloves\" or \"{key}:{IGNORE}\""
+        ) from None
@@ -10,20 +10,32 @@ import asyncio
 import logging
 import signal
 import sys
+import time
 from contextlib import asynccontextmanager
+from typing import List, Optional
 
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 
-from core import Config
+from pydantic import BaseModel, Field
+from supabase import create_client
+
+from core import Config, CameraConfig
+from core.config import parse_roi
+from core.executors import ENCODE, INFERENCE, IO, executors
+from core.logs import log_stats, setup_logging, shutdown_logging
+from core.metrics import debug_counters, frame_latency
 from services import CameraManager, AIClient, ViolationEngine, CloudSync
+from services.clip_recorder import ClipRecorder
+from services.compliance import ComplianceTracker
+from services.snapshot_dedup import SnapshotIndex
+from services.event_bus import EventBus
+from services.history_store import HistoryStore
+from services.preview import BOUNDARY
+from services.shard_coordinator import ShardCoordinator, FileLeaseStore, SupabaseLeaseStore
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
 
@@ -32,10 +44,25 @@ class EdgeControllerService:
     
     def __init__(self):
         self.config = Config()
+        # Records are written by a background thread from here on
+        self.log_listener = setup_logging(self.config)
+        debug_counters.enabled = self.config.debug_counters
+        frame_latency.slo = self.config.latency_slo or None
+        executors.configure({
+            INFERENCE: self.config.inference_workers,
+            ENCODE: self.config.encode_workers,
+            IO: self.config.io_workers,
+        })
         self.camera_manager = None
         self.ai_client = None
         self.violation_engine = None
         self.cloud_sync = None
+        self.event_bus = None
+        self.clip_recorder = None
+        self.compliance = None
+        self.history = None
+        self.snapshot_index = None
+        self.shard_coordinator = None
         self.running = False
         
     async def initialize(self):
@@ -46,22 +73,64 @@ class EdgeControllerService:
         self.cloud_sync = CloudSync(self.config)
         await self.cloud_sync.initialize()
         
+        # Live events for connected frontends
+        self.event_bus = EventBus(self.config)
+        
+        # Pre-event clips around violations
+        if self.config.clip_enabled:
+            self.clip_recorder = ClipRecorder(self.config, self.cloud_sync)
+        
+        # Per-session compliance aggregates
+        if self.config.compliance_enabled:
+            self.compliance = ComplianceTracker(self.config, self.cloud_sync)
+        
+        # Local detection history
+        if self.config.history_enabled:
+            self.history = HistoryStore(self.config)
+        
+        # Perceptual-hash index of uploaded snapshots
+        if self.config.snapshot_dedup_enabled:
+            self.snapshot_index = SnapshotIndex(self.config)
+        
         # Initialize AI client
         self.ai_client = AIClient(self.config)
         
         # Initialize violation engine
         self.violation_engine = ViolationEngine(
             self.config,
-            self.cloud_sync
+            self.cloud_sync,
+            self.event_bus,
+            self.clip_recorder,
+            self.compliance,
+            self.snapshot_index
         )
         
         # Initialize camera manager
         self.camera_manager = CameraManager(
             self.config,
             self.ai_client,
-            self.violation_engine
+            self.violation_engine,
+            self.event_bus,
+            self.clip_recorder,
+            self.history
         )
         
+        # Initialize shard coordinator when cameras are split across nodes
+        if self.config.sharding_enabled:
+            if self.config.shard_backend == "supabase":
+                # The lease store is synchronous (runs on the leases executor)
+                store = SupabaseLeaseStore(
+                    create_client(self.config.supabase_url, self.config.supabase_key)
+                )
+            else:
+                store = FileLeaseStore(self.config.shard_lease_file)
+            self.shard_coordinator = ShardCoordinator(
+                self.config,
+                store,
+                self._start_sharded_camera,
+                self.camera_manager.stop_camera
+            )
+        
         logger.info("Service initialized successfully")
     
     async def start(self):
@@ -73,11 +142,24 @@ class EdgeControllerService:
         logger.info("Starting Edge Controller Service...")
         self.running = True
         
+        if self.clip_recorder:
+            self.clip_recorder.start()
+        if self.compliance:
+            self.compliance.start()
+        if self.history:
+            self.history.start()
+        
+        # Off-peak upload of cached full-resolution snapshots (tiered mode)
+        self.cloud_sync.start_snapshot_uploads()
+        
         # Start listening for session commands from Supabase
         await self.cloud_sync.start_session_listener(self.handle_session_command)
         
-        # Start camera streams
-        await self.camera_manager.start_all_cameras()
+        # Start camera streams (only this node's share when sharded)
+        if self.shard_coordinator:
+            await self.shard_coordinator.start()
+        else:
+            await self.camera_manager.start_all_cameras()
         
         logger.info("Service started successfully")
     
@@ -89,15 +171,42 @@ class EdgeControllerService:
         logger.info("Stopping Edge Controller Service...")
         self.running = False
         
+        # Hand camera leases back so other nodes take over immediately
+        if self.shard_coordinator:
+            await self.shard_coordinator.stop()
+        
         # Stop camera streams
         if self.camera_manager:
             await self.camera_manager.stop_all_cameras()
         
+        # Finish clips in progress
+        if self.clip_recorder:
+            await self.clip_recorder.stop()
+        
+        # Write buffered history rows
+        if self.history:
+            await self.history.stop()
+        
+        # Summarize the session still running
+        if self.compliance:
+            await self.compliance.stop(self.violation_engine.required_ppe)
+        
         # Stop cloud sync
         if self.cloud_sync:
             await self.cloud_sync.stop()
         
+        executors.shutdown()
+        
         logger.info("Service stopped")
+        # Flush queued log records and the detection summary
+        shutdown_logging(self.log_listener)
+    
+    async def _start_sharded_camera(self, camera_id: str):
+        """Start a camera whose lease this node acquired."""
+        for camera_config in self.config.cameras:
+            if camera_config.id == camera_id:
+                await self.camera_manager.start_camera(camera_config)
+                return
     
     async def handle_session_command(self, command: dict):
         """Handle start/stop session commands from Supabase."""
@@ -108,9 +217,14 @@ class EdgeControllerService:
         if action == 'start':
             logger.info(f"Starting session: {session_id}")
             self.violation_engine.set_active_session(session_id, config)
+            self.camera_manager.set_session_active(True)
         elif action == 'stop':
             logger.info(f"Stopping session: {session_id}")
+            self.camera_manager.set_session_active(False)
             self.violation_engine.clear_active_session()
+        
+        if action in ('start', 'stop'):
+            self.event_bus.publish("session", action=action, session_id=session_id)
 
 # Global service instance
 service = EdgeControllerService()
@@ -150,6 +264,242 @@ async def health_check():
         "service": "Edge Controller"
     }
 
+@app.get("/debug/counters")
+async def get_debug_counters():
+    """Hot-path debug counters (frame allocations). Enable with DEBUG_COUNTERS=true."""
+    return {
+        "enabled": debug_counters.enabled,
+        "counters": debug_counters.snapshot(),
+        "logging": log_stats()
+    }
+
+@app.get("/latency")
+async def get_latency():
+    """
+    Latency histograms from frame capture to detection, to the alert decision
+    and to the committed alert (glass-to-alert), plus frames dropped as stale.
+    """
+    stale = {
+        camera_id: stream.health.frames_stale
+        for camera_id, stream in service.camera_manager.streams.items()
+    }
+    return {
+        "frame_deadline": service.config.frame_deadline,
+        "slo": service.config.latency_slo or None,
+        "stages": frame_latency.snapshot(),
+        "frames_stale": stale,
+    }
+
+@app.get("/executors/stats")
+async def executor_stats():
+    """Per-workload thread pools: workers, queue depth, wait and run times, utilization."""
+    return {"executors": executors.stats()}
+
+# Per-camera limits accepted by the API; streams are polled at 30 Hz
+MAX_CAMERA_FPS = 30
+MAX_FRAME_WIDTH = 3840
+MAX_FRAME_HEIGHT = 2160
+
+
+class CameraCreate(BaseModel):
+    """Body of POST /cameras."""
+    id: str
+    source: str
+    enabled: bool = True
+    fps: Optional[int] = Field(None, gt=0, le=MAX_CAMERA_FPS)
+    frame_width: Optional[int] = Field(None, gt=0, le=MAX_FRAME_WIDTH)
+    frame_height: Optional[int] = Field(None, gt=0, le=MAX_FRAME_HEIGHT)
+    roi: str = ""  # Same format as one CAMERA_ROIS entry
+
+
+class CameraUpdate(BaseModel):
+    """Body of PATCH /cameras/{camera_id}; omitted fields are unchanged."""
+    fps: Optional[int] = Field(None, gt=0, le=MAX_CAMERA_FPS)
+    frame_width: Optional[int] = Field(None, gt=0, le=MAX_FRAME_WIDTH)
+    frame_height: Optional[int] = Field(None, gt=0, le=MAX_FRAME_HEIGHT)
+    roi: Optional[str] = None  # "" clears the ROI
+
+
+def _parse_roi_field(spec: str):
+    try:
+        return parse_roi(spec)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/cameras")
+async def list_cameras():
+    """Configured cameras and their stream state."""
+    return {"cameras": service.camera_manager.get_cameras()}
+
+@app.get("/cameras/stats")
+async def camera_stats():
+    """Per-camera stream health: state, achieved fps, decode latency, freshness, reconnects."""
+    return {"cameras": service.camera_manager.get_stream_stats()}
+
+@app.post("/cameras", status_code=201)
+async def add_camera(camera: CameraCreate):
+    """Add and start a camera without restarting the service."""
+    camera_config = CameraConfig(
+        id=camera.id,
+        source=camera.source,
+        enabled=camera.enabled,
+        roi=_parse_roi_field(camera.roi),
+        fps=camera.fps,
+        frame_width=camera.frame_width,
+        frame_height=camera.frame_height
+    )
+    coordinator = service.shard_coordinator
+    # When sharded, the camera starts once this node holds its lease
+    if not await service.camera_manager.add_camera(camera_config, start=coordinator is None):
+        raise HTTPException(status_code=409, detail=f"Camera {camera.id} already exists")
+    if coordinator and camera.enabled:
+        coordinator.add_camera(camera.id)
+    return {"status": "added", "camera_id": camera.id}
+
+@app.delete("/cameras/{camera_id}")
+async def remove_camera(camera_id: str):
+    """Stop and remove a camera."""
+    if not await service.camera_manager.remove_camera(camera_id):
+        raise HTTPException(status_code=404, detail=f"Camera {camera_id} not found")
+    if service.shard_coordinator:
+        service.shard_coordinator.remove_camera(camera_id)
+    return {"status": "removed", "camera_id": camera_id}
+
+@app.patch("/cameras/{camera_id}")
+async def update_camera(camera_id: str, update: CameraUpdate):
+    """Change fps, processing resolution or ROI of a running camera."""
+    roi = _parse_roi_field(update.roi) if update.roi is not None else None
+    if not await service.camera_manager.reconfigure_camera(
+        camera_id,
+        fps=update.fps,
+        frame_width=update.frame_width,
+        frame_height=update.frame_height,
+        roi=roi
+    ):
+        raise HTTPException(status_code=404, detail=f"Camera {camera_id} not found")
+    return {"status": "updated", "camera_id": camera_id}
+
+@app.post("/cameras/{camera_id}/pause")
+async def pause_camera(camera_id: str):
+    """Stop inference on a camera while keeping its stream connected."""
+    if not service.camera_manager.pause_camera(camera_id):
+        raise HTTPException(status_code=404, detail=f"Camera {camera_id} is not running")
+    return {"status": "paused", "camera_id": camera_id}
+
+@app.post("/cameras/{camera_id}/resume")
+async def resume_camera(camera_id: str):
+    """Resume inference on a paused camera."""
+    if not service.camera_manager.resume_camera(camera_id):
+        raise HTTPException(status_code=404, detail=f"Camera {camera_id} is not running")
+    return {"status": "resumed", "camera_id": camera_id}
+
+@app.get("/cameras/{camera_id}/preview")
+async def camera_preview(camera_id: str):
+    """Live MJPEG preview of a camera (open in a browser or <img> tag)."""
+    if camera_id not in service.camera_manager.streams:
+        raise HTTPException(status_code=404, detail=f"Camera {camera_id} is not running")
+    return StreamingResponse(
+        service.camera_manager.preview.stream(camera_id),
+        media_type=f"multipart/x-mixed-replace; boundary={BOUNDARY}"
+    )
+
+@app.get("/events")
+async def stream_events(camera_id: Optional[List[str]] = Query(None)):
+    """
+    Server-Sent Events stream of detection summaries, violations and session changes.
+
+    Repeat ?camera_id= to only receive events of those cameras.
+    """
+    return StreamingResponse(
+        service.event_bus.sse(set(camera_id) if camera_id else None),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
+
+@app.get("/clips/stats")
+async def clip_stats():
+    """Pre-event clip ring memory use and encode/write costs. Enable with CLIP_ENABLED=true."""
+    if not service.clip_recorder:
+        return {"enabled": False}
+    return {"enabled": True, **service.clip_recorder.stats()}
+
+@app.get("/snapshots/stats")
+async def snapshot_stats():
+    """Deduplication hit rate, upload bytes per snapshot tier and full-image cache use."""
+    dedup = (
+        {"enabled": True, **service.snapshot_index.stats()}
+        if service.snapshot_index else {"enabled": False}
+    )
+    return {"dedup": dedup, **service.cloud_sync.snapshot_stats()}
+
+@app.get("/snapshots/full/{image_path:path}")
+async def get_full_snapshot(image_path: str):
+    """Full-resolution image of an alert (by its image_path) from the local cache (SNAPSHOT_TIERED)."""
+    cache = service.cloud_sync.snapshot_cache
+    local_path = cache.get(image_path) if cache else None
+    if local_path is None:
+        raise HTTPException(status_code=404, detail=f"Snapshot {image_path} not cached")
+    return FileResponse(local_path, media_type="image/jpeg")
+
+@app.post("/snapshots/full/{image_path:path}")
+async def upload_full_snapshot(image_path: str):
+    """Upload an alert's cached full-resolution image now instead of in the next off-peak batch."""
+    if not service.cloud_sync.snapshot_cache:
+        raise HTTPException(status_code=400, detail="Tiered snapshots are disabled (SNAPSHOT_TIERED)")
+    remote_path = await service.cloud_sync.upload_full_snapshot(image_path)
+    if remote_path is None:
+        raise HTTPException(status_code=404, detail=f"Snapshot {image_path} not cached, upload failed or no alert linked")
+    return {"image_path": image_path, "full_image_path": remote_path}
+
+@app.get("/compliance")
+async def get_compliance():
+    """Live time-weighted PPE compliance of the active session, per camera."""
+    if not service.compliance:
+        return {"enabled": False}
+    return {"enabled": True, **service.compliance.snapshot()}
+
+@app.get("/history")
+async def get_history(
+    camera_id: Optional[List[str]] = Query(None),
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    bucket: float = 60.0,
+    limit: int = 1000
+):
+    """
+    Local detection history. Times are epoch seconds (default: the last hour).
+
+    Returns per-class detection counts aggregated into `bucket`-second buckets,
+    or individual frames (newest first, up to `limit` per camera) with bucket=0.
+    Repeat ?camera_id= to filter cameras.
+    """
+    if not service.history:
+        raise HTTPException(status_code=404, detail="History is disabled")
+    end = end if end is not None else time.time()
+    start = start if start is not None else end - 3600
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    try:
+        # Memory-mapped reads; keep them off the event loop
+        return await executors.run(IO, service.history.query, start, end, camera_id, bucket, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/history/stats")
+async def history_stats():
+    """History write volume and partition count."""
+    if not service.history:
+        return {"enabled": False}
+    return {"enabled": True, **service.history.stats()}
+
+@app.get("/shard")
+async def get_shard_status():
+    """Cluster membership and the cameras owned by this node."""
+    if not service.shard_coordinator:
+        return {"enabled": False}
+    return {"enabled": True, **service.shard_coordinator.status()}
+
 def main():
     """Main entry point."""
     # Use uvicorn to run the application
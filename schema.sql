@@ -15,12 +15,64 @@ CREATE TABLE IF NOT EXISTS alerts (
     session_id UUID REFERENCES monitoring_sessions(id),
     violation_type TEXT NOT NULL,
     image_path TEXT,
+    clip_path TEXT,  -- Pre/post-event MP4 next to the snapshot (CLIP_ENABLED)
+    full_image_path TEXT,  -- Full-resolution snapshot, uploaded later (SNAPSHOT_TIERED)
+    captured_at TIMESTAMPTZ,  -- Capture time of the frame that raised the alert
     created_at TIMESTAMPTZ DEFAULT NOW()
 );
 
+-- Existing deployments: add the clip, full image and capture time columns
+ALTER TABLE alerts ADD COLUMN IF NOT EXISTS clip_path TEXT;
+ALTER TABLE alerts ADD COLUMN IF NOT EXISTS full_image_path TEXT;
+ALTER TABLE alerts ADD COLUMN IF NOT EXISTS captured_at TIMESTAMPTZ;
+
+-- Time-weighted PPE compliance computed at the edge (COMPLIANCE_ENABLED)
+-- Rollups hold increments per flush interval; summaries the session totals
+CREATE TABLE IF NOT EXISTS compliance_rollups (
+    id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    session_id UUID REFERENCES monitoring_sessions(id),
+    camera_id TEXT NOT NULL,
+    ppe_type TEXT NOT NULL,
+    period_start TIMESTAMPTZ NOT NULL,
+    period_end TIMESTAMPTZ NOT NULL,
+    person_seconds DOUBLE PRECISION NOT NULL,
+    worn_seconds DOUBLE PRECISION NOT NULL,
+    violations INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS compliance_summaries (
+    session_id UUID REFERENCES monitoring_sessions(id),
+    camera_id TEXT NOT NULL,
+    ppe_type TEXT NOT NULL,
+    required BOOLEAN NOT NULL DEFAULT FALSE,
+    person_seconds DOUBLE PRECISION NOT NULL,
+    worn_seconds DOUBLE PRECISION NOT NULL,
+    compliance_rate DOUBLE PRECISION,  -- worn_seconds / person_seconds
+    violations INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (session_id, camera_id, ppe_type)
+);
+
+-- Edge node membership and camera leases (SHARD_BACKEND=supabase)
+-- expires_at is epoch seconds written by the edge nodes
+CREATE TABLE IF NOT EXISTS edge_nodes (
+    node_id TEXT PRIMARY KEY,
+    expires_at DOUBLE PRECISION NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS camera_leases (
+    camera_id TEXT PRIMARY KEY,
+    node_id TEXT NOT NULL,
+    expires_at DOUBLE PRECISION NOT NULL
+);
+
 -- Enable Row Level Security (RLS)
 ALTER TABLE monitoring_sessions ENABLE ROW LEVEL SECURITY;
 ALTER TABLE alerts ENABLE ROW LEVEL SECURITY;
+ALTER TABLE edge_nodes ENABLE ROW LEVEL SECURITY;
+ALTER TABLE camera_leases ENABLE ROW LEVEL SECURITY;
+ALTER TABLE compliance_rollups ENABLE ROW LEVEL SECURITY;
+ALTER TABLE compliance_summaries ENABLE ROW LEVEL SECURITY;
 
 -- Create policies to allow public access (since we're using anon key for now)
 -- In production, you'd restrict this to authenticated users or specific roles
@@ -30,6 +82,16 @@ CREATE POLICY "Allow public update on monitoring_sessions" ON monitoring_session
 
 CREATE POLICY "Allow public select on alerts" ON alerts FOR SELECT USING (true);
 CREATE POLICY "Allow public insert on alerts" ON alerts FOR INSERT WITH CHECK (true);
+-- clip_path and full_image_path are filled in after the alert is inserted
+CREATE POLICY "Allow public update on alerts" ON alerts FOR UPDATE USING (true);
+
+CREATE POLICY "Allow public select on compliance_rollups" ON compliance_rollups FOR SELECT USING (true);
+CREATE POLICY "Allow public insert on compliance_rollups" ON compliance_rollups FOR INSERT WITH CHECK (true);
+
+CREATE POLICY "Allow public access on compliance_summaries" ON compliance_summaries FOR ALL USING (true) WITH CHECK (true);
+
+CREATE POLICY "Allow public access on edge_nodes" ON edge_nodes FOR ALL USING (true) WITH CHECK (true);
+CREATE POLICY "Allow public access on camera_leases" ON camera_leases FOR ALL USING (true) WITH CHECK (true);
 
 -- Create storage bucket for violation snapshots
 INSERT INTO storage.buckets (id, name, public)
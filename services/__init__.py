@@ -1,8 +1,20 @@
 """Service modules for camera, AI, violation detection, and cloud sync."""
 
-from .ai_client import AIClient
-from .camera_manager import CameraManager
-from .cloud_sync import CloudSync
-from .violation_engine import ViolationEngine
+import importlib
+
+# Exports are resolved lazily so that helper processes (e.g. decoders) importing
+# a single submodule don't pay for ultralytics and the Supabase client.
+_EXPORTS = {
+    "AIClient": ".ai_client",
+    "CameraManager": ".camera_manager",
+    "CloudSync": ".cloud_sync",
+    "ViolationEngine": ".violation_engine",
+}
 
 __all__ = ["AIClient", "CameraManager", "CloudSync", "ViolationEngine"]
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        return getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -5,12 +5,16 @@ Runs local object detection using YOLO models in a cascade pattern.
 Directly integrates the model logic instead of calling an external API.
 """
 
-import asyncio
 import logging
 import os
-from typing import List, Dict
+import time
+from typing import List, Dict, Optional
 import numpy as np
 from core import Config
+from core.executors import INFERENCE, executors
+from core.ppe import PPEClass
+from .detections import build_class_lookup, concatenate, empty, from_dicts, from_result
+from .tiling import compute_tiles, nms
 
 logger = logging.getLogger(__name__)
 
@@ -22,12 +26,54 @@ except ImportError:
     logger.warning("ultralytics not installed. Running in MOCK mode.")
     HAS_YOLO = False
 
+# Ultralytics default input size and the stride input sizes must be a multiple of
+DEFAULT_IMGSZ = 640
+IMGSZ_STRIDE = 32
+
+# Canonical class each model of the cascade must be able to output
+MODEL_CLASSES = {
+    "person": PPEClass.PERSON,
+    "coat": PPEClass.LAB_COAT,
+    "hand": PPEClass.HAND,
+    "gloves": PPEClass.GLOVES,
+    "eyes": PPEClass.EYES,
+    "goggles": PPEClass.GOGGLES,
+}
+
+# Weights of each cascade model (FP32), looked up in models/ and the working directory
+MODEL_FILES = {
+    "person": "Person_Test.pt",
+    "eyes": "Eye_Test.pt",
+    "gloves": "Glove_Test.pt",
+    "goggles": "Goggles_Test.pt",
+    "hand": "Hand_Test.pt",
+    "coat": "Lab_Coat_Test.pt",
+}
+
+
+def model_file(name: str, variant: str = "fp32") -> str:
+    """File name of a model variant; INT8 variants are ONNX files from services.quantization."""
+    filename = MODEL_FILES[name]
+    if variant == "int8":
+        return f"{os.path.splitext(filename)[0]}_int8.onnx"
+    return filename
+
+
+def find_model(filename: str) -> Optional[str]:
+    """Path of a model file in models/ or the working directory, or None."""
+    for path in (os.path.join("models", filename), filename, os.path.join(os.getcwd(), "models", filename)):
+        if os.path.exists(path):
+            return path
+    return None
+
+
 class AIClient:
     """Client for running local object detection models."""
     
     def __init__(self, config: Config):
         self.config = config
         self.models = {}
+        self._class_lookups: Dict[str, np.ndarray] = {}
         self._load_models()
 
     def _load_models(self):
@@ -36,35 +82,23 @@ class AIClient:
             logger.warning("YOLO not available, skipping model loading.")
             return
 
-        # Model configuration
-        # Assumes models are in a 'models' directory in the current working directory
-        model_files = {
-            "person": "Person_Test.pt",
-            "eyes": "Eye_Test.pt", 
-            "gloves": "Glove_Test.pt",
-            "goggles": "Goggles_Test.pt",
-            "hand": "Hand_Test.pt",
-            "coat": "Lab_Coat_Test.pt"
-        }
-
-        for name, filename in model_files.items():
+        for name in MODEL_FILES:
             try:
-                # Check valid paths
-                paths_to_check = [
-                    os.path.join("models", filename),
-                    filename,
-                    os.path.join(os.getcwd(), "models", filename)
-                ]
-                
-                model_path = None
-                for p in paths_to_check:
-                    if os.path.exists(p):
-                        model_path = p
-                        break
+                variant = self.config.model_variants.get(name, "fp32")
+                filename = model_file(name, variant)
+                model_path = find_model(filename)
+                if model_path is None and variant != "fp32":
+                    logger.warning(
+                        f"Model file {filename} not found (create it with services.quantization); "
+                        f"using the FP32 {name} model."
+                    )
+                    filename = model_file(name)
+                    model_path = find_model(filename)
                 
                 if model_path:
                     logger.info(f"Loading model {name} from {model_path}...")
-                    self.models[name] = YOLO(model_path)
+                    # Exported models don't carry the task the way .pt files do
+                    self.models[name] = YOLO(model_path, task="detect")
                     # Log classes for verification
                     logger.info(f"Model {name} detects classes: {self.models[name].names}")
                 else:
@@ -72,32 +106,114 @@ class AIClient:
             except Exception as e:
                 logger.error(f"Failed to load model {name}: {e}")
 
-    async def detect(self, frame: np.ndarray) -> List[Dict]:
+        self._build_class_lookups()
+
+    def _build_class_lookups(self):
+        """
+        Map every loaded model's class ids to canonical classes, once.
+
+        Raises:
+            ValueError: If a model reports a class without a canonical class
+                (extend CLASS_MAP), or none of its classes is the one the
+                cascade expects from it.
+        """
+        errors = []
+        for name, model in self.models.items():
+            try:
+                lookup = build_class_lookup(model.names, self.config.class_map)
+            except ValueError as e:
+                errors.append(f"model {name}: {e}")
+                continue
+            expected = MODEL_CLASSES.get(name)
+            if expected is not None and expected not in lookup:
+                errors.append(
+                    f"model {name}: none of its classes {model.names} maps to {expected.label!r}"
+                )
+                continue
+            self._class_lookups[name] = lookup
+            logger.info(
+                f"Model {name} class mapping: " + ", ".join(
+                    f"{model.names[i]}->{PPEClass(c).label if c >= 0 else 'ignore'}"
+                    for i, c in enumerate(lookup.tolist()) if i in model.names
+                )
+            )
+        if errors:
+            raise ValueError("Unmapped model classes: " + "; ".join(errors))
+
+    def _imgsz_for(self, name: str, image: np.ndarray) -> Optional[int]:
+        """
+        Pick the input size for a model call.
+
+        Uses the model's configured size as an upper bound. With adaptive sizing,
+        small crops get the smallest stride-aligned size that fits them instead
+        of being upscaled to the full input size.
+        """
+        max_size = self.config.model_imgsz.get(name)
+        if not self.config.adaptive_imgsz:
+            return max_size
+
+        limit = max_size or DEFAULT_IMGSZ
+        longest = max(image.shape[0], image.shape[1])
+        size = -(-longest // IMGSZ_STRIDE) * IMGSZ_STRIDE
+        return max(self.config.min_imgsz, min(limit, size))
+
+    def _predict(self, name: str, image: np.ndarray):
+        """Run one model of the cascade at its effective input size."""
+        imgsz = self._imgsz_for(name, image)
+        if imgsz is None:
+            return self.models[name](image, verbose=False)
+        return self.models[name](image, imgsz=imgsz, verbose=False)
+
+    async def detect(
+        self,
+        frame: np.ndarray,
+        full_frame: Optional[np.ndarray] = None,
+        deadline: Optional[float] = None
+    ) -> Optional[np.ndarray]:
         """
         Run cascade detection on the frame.
         
         Args:
             frame: OpenCV frame (numpy array)
+            full_frame: Full-resolution original of `frame` for tiled mode;
+                detections are returned in its coordinates
+            deadline: Epoch time after which the frame is too old to be
+                worth detecting on (checked when an inference worker picks it up)
             
         Returns:
-            List of detections in format:
-            [
-                {
-                    "class": "person",
-                    "bbox": [x1, y1, x2, y2],
-                    "confidence": 0.95
-                },
-                ...
-            ]
+            Detection array (see services.detections): one row per box with
+            class_id, confidence and xyxy. Use detections.to_dicts() for the
+            [{"class", "bbox", "confidence"}] format. None if the deadline
+            passed while the frame waited for a worker.
         """
         # Handle Mock Mode or Missing YOLO
         if self.config.use_mock_detector or (not self.models and not HAS_YOLO):
-            return self._mock_detect(frame)
+            return self._mock_detect(frame if full_frame is None else full_frame)
+
+        # Run detection on the inference executor to avoid blocking async loop
+        return await executors.run(INFERENCE, self._detect_before, deadline, frame, full_frame)
 
-        # Run detection in thread pool to avoid blocking async loop
-        return await asyncio.to_thread(self._run_cascade_detection, frame)
+    def _detect_before(
+        self,
+        deadline: Optional[float],
+        frame: np.ndarray,
+        full_frame: Optional[np.ndarray]
+    ) -> Optional[np.ndarray]:
+        """Run the cascade unless the frame expired while queued."""
+        if deadline is not None and time.time() > deadline:
+            return None
+        return self._run_cascade_detection(frame, full_frame)
 
-    def _run_cascade_detection(self, frame: np.ndarray) -> List[Dict]:
+    def _run_model(self, name: str, image: np.ndarray, dx: float = 0.0, dy: float = 0.0) -> np.ndarray:
+        """Run one model and return its boxes as a detection array offset by (dx, dy)."""
+        lookup = self._class_lookups[name]
+        return concatenate([from_result(r, lookup, dx, dy) for r in self._predict(name, image)])
+
+    def _run_cascade_detection(
+        self,
+        frame: np.ndarray,
+        full_frame: Optional[np.ndarray] = None
+    ) -> np.ndarray:
         """
         Synchronous implementation of the cascade logic matching the requested flow:
         Layer 1: Person Detection -> Crop Person
@@ -105,207 +221,171 @@ class AIClient:
              - Hand Detection -> Crop Hand -> Glove Detection
              - Eyes Detection -> Crop Eyes -> Goggles Detection
              - Lab Coat Detection
+
+        In tiled mode, `frame` is a downscaled copy of `full_frame`: the person
+        model runs on `frame` (and optionally on tiles of `full_frame`), while
+        the layer 2/3 crops are taken from `full_frame`. Detections are then in
+        `full_frame` coordinates.
         """
-        detections = []
-        
         if "person" not in self.models:
-            return []
+            return empty()
+
+        source = frame if full_frame is None else full_frame
 
         try:
-            results_person = self.models["person"](frame, verbose=False)
+            people = self._detect_people(frame, full_frame)
         except Exception as e:
             logger.error(f"Error running person model: {e}")
-            return []
-
-        for result in results_person:
-            boxes = result.boxes
-            # Temporary Debug Log
-            if len(boxes) > 0:
-                logger.info(f"AI Client: Person Model found {len(boxes)} potential people.")
-            else:
-                # logger.info("AI Client: Person Model found 0 people.") # Uncomment to spam logs
-                pass
-
-            for box in boxes:
-                # Get Person Box
-                x1, y1, x2, y2 = box.xyxy[0].tolist()
-                conf = float(box.conf[0])
-                cls_id = int(box.cls[0])
-                cls_name = self.models["person"].names.get(cls_id, "Person")
-                logger.info(f"Detected {cls_name} at {conf:.2f}")
-
-                # Add Person Detection
-                detections.append({
-                    "class": cls_name,
-                    "bbox": [x1, y1, x2, y2],
-                    "confidence": conf
-                })
-                logger.info(f"AI Client: Found {cls_name} (conf: {conf:.2f})")
-
-                if conf < 0.4:
-                    continue
+            return empty()
+
+        # Per-frame counts are logged in aggregate (core.logs.detection_summary)
+
+        parts = [people]
+        for x1, y1, x2, y2 in people["xyxy"][people["confidence"] >= 0.4]:
+            parts.extend(self._detect_person_ppe(source, x1, y1, x2, y2))
+
+        return concatenate(parts)
+
+    def _detect_people(
+        self,
+        frame: np.ndarray,
+        full_frame: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """
+        Layer 1: find people, in `full_frame` coordinates when one is given.
+
+        With tiling enabled, overlapping full-resolution tiles are also searched
+        (catching people too small to survive the downscale) and all person
+        boxes are merged with NMS.
+        """
+        people = self._run_model("person", frame)
+        if full_frame is None:
+            return people
 
-                # Crop Person
-                x1_c, y1_c = int(max(0, x1)), int(max(0, y1))
-                x2_c, y2_c = int(min(frame.shape[1], x2)), int(min(frame.shape[0], y2))
+        # Scale boxes from the downscaled frame back to full resolution
+        sx = full_frame.shape[1] / frame.shape[1]
+        sy = full_frame.shape[0] / frame.shape[0]
+        people["xyxy"] *= np.array([sx, sy, sx, sy], dtype=np.float32)
+
+        tiles = compute_tiles(
+            full_frame.shape[1],
+            full_frame.shape[0],
+            self.config.tile_size,
+            self.config.tile_overlap
+        )
+        if not tiles:
+            return people
+
+        # Tiles are views into the full frame, no copy
+        people = concatenate([people] + [
+            self._run_model("person", full_frame[ty1:ty2, tx1:tx2], tx1, ty1)
+            for tx1, ty1, tx2, ty2 in tiles
+        ])
+
+        keep = nms(
+            people["xyxy"],
+            people["confidence"],
+            self.config.tile_nms_iou,
+            self.config.tile_nms_containment
+        )
+        return people[keep]
+
+    def _detect_person_ppe(
+        self,
+        frame: np.ndarray,
+        x1: float,
+        y1: float,
+        x2: float,
+        y2: float
+    ) -> List[np.ndarray]:
+        """Layers 2 and 3 for one person box, as detection arrays in `frame` coordinates."""
+        parts = []
+
+        # Crop Person
+        x1_c, y1_c = int(max(0, x1)), int(max(0, y1))
+        x2_c, y2_c = int(min(frame.shape[1], x2)), int(min(frame.shape[0], y2))
+        
+        if x2_c <= x1_c or y2_c <= y1_c:
+            return parts
+            
+        person_crop = frame[y1_c:y2_c, x1_c:x2_c]
+        
+        # If crop is too small, skip sub-models
+        if person_crop.shape[0] < 10 or person_crop.shape[1] < 10:
+            return parts
+
+        # ================= LAYER 2: Hand, Eyes, Coat =================
+        
+        # 1. Lab Coat (Directly on Person Crop)
+        if "coat" in self.models:
+            try:
+                parts.append(self._run_model("coat", person_crop, x1_c, y1_c))
+            except Exception as e:
+                logger.error(f"Error running coat model: {e}")
+
+        # 2. Hand Detection -> Crop -> Glove Detection
+        parts.extend(self._detect_part_ppe(person_crop, "hand", "gloves", x1_c, y1_c))
+
+        # 3. Eyes Detection -> Crop -> Goggles Detection
+        parts.extend(self._detect_part_ppe(person_crop, "eyes", "goggles", x1_c, y1_c))
+
+        return parts
+
+    def _detect_part_ppe(
+        self,
+        person_crop: np.ndarray,
+        part_model: str,
+        ppe_model: str,
+        ox: int,
+        oy: int
+    ) -> List[np.ndarray]:
+        """
+        Layer 2 body part (hand/eyes) on the person crop, then layer 3 PPE
+        (gloves/goggles) on each confident part crop.
+
+        Args:
+            person_crop: Person crop the part model runs on
+            part_model, ppe_model: Model names, e.g. "hand" and "gloves"
+            ox, oy: Person crop offset in the frame
+        """
+        parts = []
+        if part_model not in self.models:
+            return parts
+
+        try:
+            # Part boxes stay crop-local until their sub-crops are taken
+            found = self._run_model(part_model, person_crop)
+
+            for px1, py1, px2, py2 in found["xyxy"][found["confidence"] >= 0.4]:
+                # Crop part
+                px1_c, py1_c = int(max(0, px1)), int(max(0, py1))
+                px2_c = int(min(person_crop.shape[1], px2))
+                py2_c = int(min(person_crop.shape[0], py2))
                 
-                if x2_c <= x1_c or y2_c <= y1_c:
+                if px2_c <= px1_c or py2_c <= py1_c:
                     continue
-                    
-                person_crop = frame[y1_c:y2_c, x1_c:x2_c]
                 
-                # If crop is too small, skip sub-models
-                if person_crop.shape[0] < 10 or person_crop.shape[1] < 10:
-                    continue
-
-                # ================= LAYER 2: Hand, Eyes, Coat =================
+                part_crop = person_crop[py1_c:py2_c, px1_c:px2_c]
                 
-                # 1. Lab Coat (Directly on Person Crop)
-                if "coat" in self.models:
+                # Run PPE model on the part crop
+                if ppe_model in self.models and part_crop.shape[0] > 5 and part_crop.shape[1] > 5:
                     try:
-                        coat_results = self.models["coat"](person_crop, verbose=False)
-                        for c_res in coat_results:
-                            for c_box in c_res.boxes:
-                                cx1, cy1, cx2, cy2 = c_box.xyxy[0].tolist()
-                                c_conf = float(c_box.conf[0])
-                                c_cls_id = int(c_box.cls[0])
-                                c_cls_name = self.models["coat"].names.get(c_cls_id, "Lab_Coat")
-                                
-                                # Global Coords: Coat_Local + Person_Offset
-                                gx1 = cx1 + x1_c
-                                gy1 = cy1 + y1_c
-                                gx2 = cx2 + x1_c
-                                gy2 = cy2 + y1_c
-                                
-                                detections.append({
-                                    "class": c_cls_name,
-                                    "bbox": [gx1, gy1, gx2, gy2],
-                                    "confidence": c_conf
-                                })
-                                logger.info(f"AI Client: Found {c_cls_name} (conf: {c_conf:.2f})")
+                        # Global Coords: PPE_Local + Part_Offset + Person_Offset
+                        parts.append(
+                            self._run_model(ppe_model, part_crop, px1_c + ox, py1_c + oy)
+                        )
                     except Exception as e:
-                        logger.error(f"Error running coat model: {e}")
+                        logger.error(f"Error running {ppe_model} model: {e}")
 
-                # 2. Hand Detection -> Crop -> Glove Detection
-                if "hand" in self.models:
-                    try:
-                        hand_results = self.models["hand"](person_crop, verbose=False)
-                        for h_res in hand_results:
-                            for h_box in h_res.boxes:
-                                hx1, hy1, hx2, hy2 = h_box.xyxy[0].tolist()
-                                h_conf = float(h_box.conf[0])
-                                h_cls_id = int(h_box.cls[0])
-                                h_cls_name = self.models["hand"].names.get(h_cls_id, "Hand")
-                                
-                                # Add Hand detection (Optional, useful for debugging)
-                                detections.append({
-                                    "class": h_cls_name,
-                                    "bbox": [hx1 + x1_c, hy1 + y1_c, hx2 + x1_c, hy2 + y1_c],
-                                    "confidence": h_conf
-                                })
-
-                                if h_conf < 0.4:
-                                    continue
-                                
-                                # Crop Hand
-                                hx1_c, hy1_c = int(max(0, hx1)), int(max(0, hy1))
-                                hx2_c, hy2_c = int(min(person_crop.shape[1], hx2)), int(min(person_crop.shape[0], hy2))
-                                
-                                if hx2_c <= hx1_c or hy2_c <= hy1_c:
-                                    continue
-                                
-                                hand_crop = person_crop[hy1_c:hy2_c, hx1_c:hx2_c]
-                                
-                                # Run Glove Model on Hand Crop
-                                if "gloves" in self.models and hand_crop.shape[0] > 5 and hand_crop.shape[1] > 5:
-                                    try:
-                                        glove_results = self.models["gloves"](hand_crop, verbose=False)
-                                        for g_res in glove_results:
-                                            for g_box in g_res.boxes:
-                                                gx1, gy1, gx2, gy2 = g_box.xyxy[0].tolist()
-                                                g_conf = float(g_box.conf[0])
-                                                g_cls_id = int(g_box.cls[0])
-                                                g_cls_name = self.models["gloves"].names.get(g_cls_id, "Gloves")
-                                                
-                                                # Global Coords: Glove_Local + Hand_Offset + Person_Offset
-                                                final_gx1 = gx1 + hx1_c + x1_c
-                                                final_gy1 = gy1 + hy1_c + y1_c
-                                                final_gx2 = gx2 + hx1_c + x1_c
-                                                final_gy2 = gy2 + hy1_c + y1_c
-                                
-                                detections.append({
-                                    "class": g_cls_name,
-                                    "bbox": [final_gx1, final_gy1, final_gx2, final_gy2],
-                                    "confidence": g_conf
-                                })
-                                logger.info(f"AI Client: Found {g_cls_name} (conf: {g_conf:.2f})")
-                    except Exception as e:
-                                        logger.error(f"Error running glove model: {e}")
-
-                    except Exception as e:
-                        logger.error(f"Error running hand model: {e}")
-
-                # 3. Eyes Detection -> Crop -> Goggles Detection
-                if "eyes" in self.models:
-                    try:
-                        eyes_results = self.models["eyes"](person_crop, verbose=False)
-                        for e_res in eyes_results:
-                            for e_box in e_res.boxes:
-                                ex1, ey1, ex2, ey2 = e_box.xyxy[0].tolist()
-                                e_conf = float(e_box.conf[0])
-                                e_cls_id = int(e_box.cls[0])
-                                e_cls_name = self.models["eyes"].names.get(e_cls_id, "Eyes")
-                                
-                                # Add Eyes detection
-                                detections.append({
-                                    "class": e_cls_name,
-                                    "bbox": [ex1 + x1_c, ey1 + y1_c, ex2 + x1_c, ey2 + y1_c],
-                                    "confidence": e_conf
-                                })
-
-                                if e_conf < 0.4:
-                                    continue
-                                
-                                # Crop Eyes
-                                ex1_c, ey1_c = int(max(0, ex1)), int(max(0, ey1))
-                                ex2_c, ey2_c = int(min(person_crop.shape[1], ex2)), int(min(person_crop.shape[0], ey2))
-                                
-                                if ex2_c <= ex1_c or ey2_c <= ey1_c:
-                                    continue
-                                
-                                eyes_crop = person_crop[ey1_c:ey2_c, ex1_c:ex2_c]
-                                
-                                # Run Goggles Model on Eyes Crop
-                                if "goggles" in self.models and eyes_crop.shape[0] > 5 and eyes_crop.shape[1] > 5:
-                                    try:
-                                        goggles_results = self.models["goggles"](eyes_crop, verbose=False)
-                                        for g_res in goggles_results:
-                                            for g_box in g_res.boxes:
-                                                ggx1, ggy1, ggx2, ggy2 = g_box.xyxy[0].tolist()
-                                                gg_conf = float(g_box.conf[0])
-                                                gg_cls_id = int(g_box.cls[0])
-                                                gg_cls_name = self.models["goggles"].names.get(gg_cls_id, "Goggles")
-                                                
-                                                # Global Coords: Goggles_Local + Eyes_Offset + Person_Offset
-                                                final_ggx1 = ggx1 + ex1_c + x1_c
-                                                final_ggy1 = ggy1 + ey1_c + y1_c
-                                                final_ggx2 = ggx2 + ex1_c + x1_c
-                                                final_ggy2 = ggy2 + ey1_c + y1_c
-                                                
-                                                detections.append({
-                                                    "class": gg_cls_name,
-                                                    "bbox": [final_ggx1, final_ggy1, final_ggx2, final_ggy2],
-                                                    "confidence": gg_conf
-                                                })
-                                    except Exception as e:
-                                        logger.error(f"Error running goggles model: {e}")
-
-                    except Exception as e:
-                        logger.error(f"Error running eyes model: {e}")
+            # Part detections are reported too (useful for debugging)
+            found["xyxy"] += np.array([ox, oy, ox, oy], dtype=np.float32)
+            parts.append(found)
+        except Exception as e:
+            logger.error(f"Error running {part_model} model: {e}")
 
-        return detections
+        return parts
 
-    def _mock_detect(self, frame: np.ndarray) -> List[Dict]:
+    def _mock_detect(self, frame: np.ndarray) -> np.ndarray:
         """Return mock detections."""
         h, w = frame.shape[:2]
         x1 = int(w * 0.3)
@@ -314,7 +394,7 @@ class AIClient:
         y2 = int(h * 0.8)
         
         # Mock Person + Goggles
-        return [
+        return from_dicts([
             {
                 "class": "Person",
                 "bbox": [x1, y1, x2, y2],
@@ -325,7 +405,7 @@ class AIClient:
                 "bbox": [int(w*0.45), int(h*0.25), int(w*0.55), int(h*0.3)],
                 "confidence": 0.95
             }
-        ]
+        ])
     
     async def health_check(self) -> bool:
         """Check if models are loaded."""
@@ -7,12 +7,25 @@ frame capture, and reconnection logic.
 
 import asyncio
 import logging
-from typing import Dict, Optional
+import time
+from typing import Dict, List, Optional, Tuple
 import cv2
 import numpy as np
 
 from core import Config, CameraConfig
+from core.logs import detection_summary
+from core.metrics import debug_counters, frame_latency
+from core.ppe import LABELS
 from .ai_client import AIClient
+from .clip_recorder import ClipRecorder
+from .decoder_pool import DecoderPool, flush_buffered_frames, parse_source
+from .detections import empty
+from .event_bus import EventBus
+from .frame_ring import SharedFrameRing
+from .history_store import HistoryStore
+from .preview import PreviewBroadcaster
+from .roi import build_roi
+from .stream_health import StreamClock, StreamHealth, reconnect_delay
 from .violation_engine import ViolationEngine
 
 logger = logging.getLogger(__name__)
@@ -26,37 +39,72 @@ class CameraStream:
         config: CameraConfig,
         global_config: Config,
         ai_client: AIClient,
-        violation_engine: ViolationEngine
+        violation_engine: ViolationEngine,
+        session_active: Optional[asyncio.Event] = None,
+        ring: Optional[SharedFrameRing] = None,
+        preview: Optional[PreviewBroadcaster] = None,
+        event_bus: Optional[EventBus] = None,
+        clip_recorder: Optional[ClipRecorder] = None,
+        history: Optional[HistoryStore] = None
     ):
         self.config = config
         self.global_config = global_config
         self.ai_client = ai_client
         self.violation_engine = violation_engine
+        # Set while a lab session is running; cleared means idle (grab-only) mode
+        self.session_active = session_active or asyncio.Event()
+        self.roi = build_roi(config.roi)
+        # Preallocated frame buffers reused across frames: name -> array
+        self._buffers: Dict[str, np.ndarray] = {}
         
         self.cap: Optional[cv2.VideoCapture] = None
+        # Frames come from a decoder process' shared-memory ring instead of cap
+        self.ring = ring
+        self.preview = preview
+        self.event_bus = event_bus
+        self.clip_recorder = clip_recorder
+        self.history = history
         self.running = False
+        # Paused streams stay connected but skip inference, like idle mode
+        self.paused = False
         self.frame_count = 0
+        # When the next frame is due for processing (monotonic seconds)
+        self.next_process_at = 0.0
         self.reconnect_attempts = 0
+        self.health = StreamHealth()
+        self.clock = StreamClock()
+        # Live captures buffer frames between idle grabs; skipped when processing resumes
+        self.needs_flush = False
+    
+    @property
+    def fps(self) -> int:
+        return self.config.fps or self.global_config.fps
+    
+    @property
+    def frame_width(self) -> int:
+        return self.config.frame_width or self.global_config.frame_width
+    
+    @property
+    def frame_height(self) -> int:
+        return self.config.frame_height or self.global_config.frame_height
+    
+    def _due_for_processing(self, now: float) -> bool:
+        """Whether a frame read at `now` should be processed to hold the configured FPS."""
+        interval = 1.0 / self.fps
+        # Half an interval of slack so read jitter doesn't skip frames when
+        # the source runs at exactly FPS
+        if now < self.next_process_at - interval / 2:
+            return False
+        # Stay on schedule, but don't burst to catch up after a stall
+        self.next_process_at = max(self.next_process_at, now) + interval
+        return True
+    
+    def _is_idle(self) -> bool:
+        return self.paused or not self.session_active.is_set()
         
     def _parse_source(self) -> tuple:
         """Parse camera source to determine type and value."""
-        source = self.config.source.strip()
-        
-        # Check if it's an RTSP URL
-        if source.startswith(("rtsp://", "http://", "https://")):
-            return "rtsp", source
-        
-        # Check if it's a local image file (for testing)
-        if source.endswith((".jpg", ".jpeg", ".png")):
-            return "image", source
-
-        # Check if it's a USB device index (numeric)
-        try:
-            index = int(source)
-            return "usb", index
-        except ValueError:
-            # Assume it's a file path or other OpenCV source
-            return "file", source
+        return parse_source(self.config.source)
     
     async def _connect(self) -> bool:
         """Connect to the camera."""
@@ -91,9 +139,10 @@ class CameraStream:
                 )
                 return False
             
-            # Set frame properties
-            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.global_config.frame_width)
-            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.global_config.frame_height)
+            # Set frame properties (tiled mode wants the camera's native resolution)
+            if not self.global_config.tiled_detection:
+                self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.frame_width)
+                self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.frame_height)
             
             # Test read
             ret, frame = self.cap.read()
@@ -109,7 +158,8 @@ class CameraStream:
                 f"Camera {self.config.id}: Connected successfully "
                 f"(source: {source_value})"
             )
-            self.reconnect_attempts = 0
+            self.clock.reset()
+            self.health.connected()
             return True
             
         except Exception as e:
@@ -122,80 +172,288 @@ class CameraStream:
                 self.cap = None
             return False
     
-    async def _process_frame(self, frame: np.ndarray):
+    def _resize_into(self, name: str, image: np.ndarray, width: int, height: int) -> np.ndarray:
+        """
+        Resize into a named per-camera buffer that is reused across frames.
+
+        The returned array is overwritten by the next call with the same name,
+        so anything that must outlive the frame has to copy or encode it first.
+        """
+        shape = (height, width) + image.shape[2:]
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.shape != shape or buffer.dtype != image.dtype:
+            buffer = np.empty(shape, dtype=image.dtype)
+            self._buffers[name] = buffer
+            debug_counters.add(f"alloc.{name}")
+        cv2.resize(image, (width, height), dst=buffer)
+        return buffer
+    
+    def _read_frame(self) -> tuple:
+        """Read the next frame, decoding into the reused capture buffer when possible."""
+        ret, frame = self.cap.read(self._buffers.get("capture"))
+        if ret and frame is not self._buffers.get("capture"):
+            # First frame or the source changed resolution
+            self._buffers["capture"] = frame
+            debug_counters.add("alloc.capture")
+        return ret, frame
+    
+    def _expired(self, capture_time: Optional[float], expires: Optional[float]) -> bool:
+        """Whether a frame missed the freshness deadline; counts and logs it if so."""
+        if expires is None or time.time() <= expires:
+            return False
+        self.health.frame_stale()
+        debug_counters.add("frames_stale")
+        logger.warning(
+            f"Camera {self.config.id}: Dropped frame captured "
+            f"{(time.time() - capture_time) * 1000:.0f} ms ago "
+            f"(FRAME_DEADLINE {self.global_config.frame_deadline}s)",
+            extra={"log_key": ("frame_stale", self.config.id)}
+        )
+        return True
+    
+    async def _process_frame(self, frame: np.ndarray, capture_time: Optional[float] = None):
         """Process a single frame through AI and violation detection."""
         try:
+            # Frames too old by the end of detection are dropped rather than
+            # alerting on a scene that has already changed
+            deadline = self.global_config.frame_deadline
+            expires = capture_time + deadline if deadline > 0 and capture_time is not None else None
+            if self._expired(capture_time, expires):
+                return
+            
+            frame_width = self.frame_width
+            frame_height = self.frame_height
+            # Tiled mode keeps the full resolution for frames larger than the processing size
+            tiled = self.global_config.tiled_detection and (
+                frame.shape[1] > frame_width or frame.shape[0] > frame_height
+            )
+            
             # Resize frame if needed
-            if (frame.shape[1] != self.global_config.frame_width or
-                frame.shape[0] != self.global_config.frame_height):
-                frame = cv2.resize(
-                    frame,
-                    (self.global_config.frame_width,
-                     self.global_config.frame_height)
+            if (not tiled and
+                (frame.shape[1] != frame_width or
+                 frame.shape[0] != frame_height)):
+                frame = self._resize_into("resize", frame, frame_width, frame_height)
+            
+            # Only the ROI's bounding region goes to the detector
+            region, offset = self.roi.crop(frame) if self.roi else (frame, (0, 0))
+            
+            if tiled:
+                # People are found on a downscaled copy (at the scale the whole
+                # frame would get), PPE crops come from the full-resolution frame
+                small = self._resize_into(
+                    "downscale",
+                    region,
+                    max(1, round(region.shape[1] * frame_width / frame.shape[1])),
+                    max(1, round(region.shape[0] * frame_height / frame.shape[0]))
                 )
+                detections = await self.ai_client.detect(small, full_frame=region, deadline=expires)
+            else:
+                # Send to AI detector
+                detections = await self.ai_client.detect(region, deadline=expires)
+            
+            # None: expired while waiting for an inference worker
+            if self._expired(capture_time, expires) or detections is None:
+                return
+            if capture_time is not None:
+                frame_latency.observe("detection", time.time() - capture_time)
             
-            # Send to AI detector
-            detections = await self.ai_client.detect(frame)
+            if self.roi:
+                detections = self.roi.filter_detections(detections, frame.shape, offset)
             
-            if detections:
-                # Process violations
-                await self.violation_engine.process_detections(
-                    camera_id=self.config.id,
-                    frame=frame,
-                    detections=detections
+            if self.preview and self.preview.wants_frame(self.config.id):
+                await self._publish_preview(frame, detections)
+            
+            if self.event_bus and self.event_bus.has_subscribers:
+                self._publish_detections(detections)
+            
+            # Buffered before violations are checked, so a clip includes this frame
+            if self.clip_recorder and self.clip_recorder.wants_frame(self.config.id):
+                width, height = self.clip_recorder.clip_size(frame.shape[1], frame.shape[0])
+                await self.clip_recorder.add_frame(
+                    self.config.id,
+                    self._resize_into("clip", frame, width, height),
+                    capture_time
                 )
             
+            # Process violations (frames without detections too, so that
+            # compliance time is weighted by the actual frame intervals)
+            await self.violation_engine.process_detections(
+                camera_id=self.config.id,
+                frame=frame,
+                detections=detections,
+                timestamp=capture_time
+            )
+            
             self.frame_count += 1
+            self.health.frame_processed(capture_time)
+            detection_summary.add(self.config.id, detections["class_id"])
+            if self.history:
+                self.history.add(self.config.id, capture_time or time.time(), detections["class_id"])
+            debug_counters.add("frames_processed")
             
         except Exception as e:
+            # Rate limited per camera, so one broken stream can't hide the others
             logger.error(
                 f"Camera {self.config.id}: Frame processing error: {e}",
-                exc_info=True
+                exc_info=True,
+                extra={"log_key": ("frame_error", self.config.id)}
+            )
+    
+    async def _publish_preview(self, frame: np.ndarray, detections: np.ndarray):
+        """Send a preview-sized copy of the frame to live preview viewers."""
+        width, height = self.preview.preview_size(frame.shape[1], frame.shape[0])
+        # Own buffer, so boxes can be drawn without touching the frame
+        image = self._resize_into("preview", frame, width, height)
+        await self.preview.publish(self.config.id, image, detections, width / frame.shape[1])
+    
+    def _publish_detections(self, detections: np.ndarray):
+        """Send a per-class detection count summary to event subscribers."""
+        class_ids, totals = np.unique(detections["class_id"], return_counts=True)
+        counts = {LABELS[c]: n for c, n in zip(class_ids.tolist(), totals.tolist())}
+        self.event_bus.publish(
+            "detections",
+            self.config.id,
+            frame=self.frame_count,
+            counts=counts
+        )
+    
+    async def _wait_idle(self):
+        """Sleep for one health-check interval, waking early if a session starts."""
+        if self.paused:
+            await asyncio.sleep(self.global_config.idle_health_check_interval)
+            return
+        try:
+            await asyncio.wait_for(
+                self.session_active.wait(),
+                timeout=self.global_config.idle_health_check_interval
             )
+        except asyncio.TimeoutError:
+            pass
+    
+    async def _reconnect_backoff(self, reason: str):
+        """Wait before the next reconnect, backing off exponentially with jitter."""
+        attempt = self.reconnect_attempts
+        max_attempts = self.global_config.max_reconnect_attempts
+        delay = reconnect_delay(
+            attempt,
+            self.global_config.camera_reconnect_delay,
+            self.global_config.camera_reconnect_max_delay,
+            max_attempts,
+            self.global_config.camera_slow_retry_interval
+        )
+        slow = max_attempts > 0 and attempt >= max_attempts
+        if attempt == max_attempts and max_attempts > 0:
+            logger.error(
+                f"Camera {self.config.id}: Max reconnection attempts reached. "
+                f"Retrying every ~{self.global_config.camera_slow_retry_interval:.0f}s."
+            )
+        self.health.reconnecting(reason, delay, attempt + 1, slow)
+        self.reconnect_attempts += 1
+        await asyncio.sleep(delay)
+    
+    async def _run_ring(self):
+        """Camera loop for frames decoded by a decoder process."""
+        last_seq = -1
+        loop = asyncio.get_running_loop()
+        
+        while self.running:
+            # Connection and reconnects are handled by the decoder process
+            self.health.decoder_connection(*self.ring.connection())
+            if self._is_idle():
+                if self.health.connected_since is not None:
+                    self.health.set_state("paused" if self.paused else "idle")
+                self.ring.release()
+                await self._wait_idle()
+                continue
+            
+            started = loop.time()
+            latest = self.ring.read_latest(last_seq)
+            if latest is None:
+                # No new frame yet
+                await asyncio.sleep(0.005)
+                continue
+            
+            # Zero-copy view, pinned until the next read
+            last_seq, frame, capture_time = latest
+            if self.health.connected_since is not None:
+                self.health.set_state("streaming")
+            self.health.frame_read()
+            await self._process_frame(frame, capture_time)
+            
+            remaining = 1.0 / self.fps - (loop.time() - started)
+            if remaining > 0:
+                await asyncio.sleep(remaining)
+        
+        self.ring.release()
     
     async def run(self):
         """Main camera loop."""
         self.running = True
         source_type, source_value = self._parse_source()
         
+        if self.ring is not None:
+            await self._run_ring()
+            return
+        
         while self.running:
+            idle = self._is_idle()
+            
             if source_type == "image":
+                if idle:
+                    self.health.set_state("paused" if self.paused else "idle")
+                    await self._wait_idle()
+                    continue
+                
                 # Logic for static image: read the file repeatedly
+                started = time.perf_counter()
                 frame = cv2.imread(source_value)
                 if frame is None:
                     logger.error(f"Camera {self.config.id}: Failed to read image file")
+                    self.health.set_state("error")
                     await asyncio.sleep(1)
                     continue
+                self.health.set_state("streaming")
+                self.health.frame_read(time.perf_counter() - started)
                 
                 # Process frame
-                await self._process_frame(frame)
+                await self._process_frame(frame, time.time())
                 
                 # Sleep to simulate FPS
-                await asyncio.sleep(1.0 / self.global_config.fps)
+                await asyncio.sleep(1.0 / self.fps)
                 continue
 
             # Connect if not connected
             if self.cap is None or not self.cap.isOpened():
-                if self.reconnect_attempts >= self.global_config.max_reconnect_attempts:
-                    logger.error(
-                        f"Camera {self.config.id}: Max reconnection attempts reached. "
-                        "Stopping stream."
-                    )
-                    break
-                
                 logger.info(
                     f"Camera {self.config.id}: Attempting to connect "
                     f"(attempt {self.reconnect_attempts + 1})..."
                 )
+                self.health.set_state("connecting")
                 
                 connected = await self._connect()
                 if not connected:
-                    self.reconnect_attempts += 1
-                    await asyncio.sleep(self.global_config.camera_reconnect_delay)
+                    await self._reconnect_backoff("connect failed")
                     continue
             
-            # Read frame
-            ret, frame = self.cap.read()
+            # Idle with preview viewers: decode for the preview, still no inference
+            preview_only = idle and self.preview is not None and self.preview.has_viewers(self.config.id)
+            
+            if not idle and self.needs_flush:
+                self.needs_flush = False
+                if source_type != "file":
+                    skipped = await asyncio.to_thread(flush_buffered_frames, self.cap)
+                    logger.debug(f"Camera {self.config.id}: Skipped {skipped} frames buffered while idle")
+            
+            started = time.perf_counter()
+            if idle and not preview_only:
+                # No session: keep the stream alive without decoding or inference
+                ret = self.cap.grab()
+                frame = None
+            else:
+                # Read frame
+                ret, frame = self._read_frame()
+            read_time = time.perf_counter() - started
+            captured_at = time.time()
             
             if not ret:
                 # Handle End of Video File (Rewind for testing)
@@ -212,20 +470,43 @@ class CameraStream:
                 if self.cap:
                     self.cap.release()
                     self.cap = None
-                self.reconnect_attempts += 1
-                await asyncio.sleep(self.global_config.camera_reconnect_delay)
+                await self._reconnect_backoff("read failed")
                 continue
             
-            # Process frame (only at configured FPS)
-            if self.frame_count % (30 // self.global_config.fps) == 0:
-                await self._process_frame(frame)
+            # A healthy stream starts the next outage's backoff from scratch
+            self.reconnect_attempts = 0
+            # RTSP frames may have waited in the capture buffer; date them by
+            # their stream timestamps. USB and file frames are dated at read time.
+            if source_type == "rtsp" and frame is not None:
+                captured_at = self.clock.capture_time(self.cap.get(cv2.CAP_PROP_POS_MSEC), captured_at)
+            if idle:
+                self.health.set_state("paused" if self.paused else "idle")
+            else:
+                self.health.set_state("streaming")
+                self.health.frame_read(read_time)
             
-            # Small delay to control frame rate
-            await asyncio.sleep(1.0 / 30.0)  # Read at ~30fps, process at configured FPS
+            if preview_only:
+                if self.preview.wants_frame(self.config.id):
+                    await self._publish_preview(frame, empty())
+                await asyncio.sleep(1.0 / 30.0)
+                continue
+            
+            if idle:
+                self.needs_flush = True
+                await self._wait_idle()
+                continue
+            
+            # Process frame (only at configured FPS, whatever the source's rate)
+            if self._due_for_processing(time.monotonic()):
+                await self._process_frame(frame, captured_at)
+            
+            # Live reads block at the source's rate; files are read at ~30fps
+            await asyncio.sleep(1.0 / 30.0 if source_type == "file" else 0)
     
     async def stop(self):
         """Stop the camera stream."""
         self.running = False
+        self.health.set_state("stopped")
         if self.cap:
             self.cap.release()
             self.cap = None
@@ -239,14 +520,226 @@ class CameraManager:
         self,
         config: Config,
         ai_client: AIClient,
-        violation_engine: ViolationEngine
+        violation_engine: ViolationEngine,
+        event_bus: Optional[EventBus] = None,
+        clip_recorder: Optional[ClipRecorder] = None,
+        history: Optional[HistoryStore] = None
     ):
         self.config = config
         self.ai_client = ai_client
         self.violation_engine = violation_engine
+        self.event_bus = event_bus
+        self.clip_recorder = clip_recorder
+        self.history = history
         
         self.streams: Dict[str, CameraStream] = {}
         self.tasks: Dict[str, asyncio.Task] = {}
+        
+        # Shared by all streams; inference only runs while this is set
+        self.session_active = asyncio.Event()
+        
+        # Live preview shared by all viewers
+        self.preview = PreviewBroadcaster(config)
+        
+        # Decoder processes (DECODER_MODE=process)
+        self.decoder_pool: Optional[DecoderPool] = None
+        self.decoder_supervisor: Optional[asyncio.Task] = None
+    
+    def set_session_active(self, active: bool):
+        """Switch all streams between full inference and idle mode."""
+        if active:
+            self.session_active.set()
+            logger.info("Session active: resuming inference on all cameras")
+        else:
+            self.session_active.clear()
+            logger.info("No active session: cameras switched to idle mode")
+            # Don't hold the session's last counts until the next session
+            detection_summary.flush()
+        if self.decoder_pool:
+            self.decoder_pool.set_session_active(active)
+    
+    def _get_decoder_pool(self) -> DecoderPool:
+        """Create and start the decoder pool on first use."""
+        if self.decoder_pool is None:
+            self.decoder_pool = DecoderPool(self.config)
+            self.decoder_pool.set_session_active(self.session_active.is_set())
+            self.decoder_pool.start()
+            self.decoder_supervisor = asyncio.create_task(self.decoder_pool.supervise())
+        return self.decoder_pool
+    
+    async def start_camera(self, camera_config: CameraConfig) -> bool:
+        """Start a single camera stream. Returns False if it is already running."""
+        if camera_config.id in self.streams:
+            logger.warning(f"Camera {camera_config.id}: Already running")
+            return False
+        
+        ring = None
+        # Static images need no decoding and stay in-process
+        if (self.config.decoder_mode == "process" and
+                parse_source(camera_config.source)[0] != "image"):
+            ring = self._get_decoder_pool().add_camera(camera_config)
+        
+        stream = CameraStream(
+            camera_config,
+            self.config,
+            self.ai_client,
+            self.violation_engine,
+            self.session_active,
+            ring,
+            self.preview,
+            self.event_bus,
+            self.clip_recorder,
+            self.history
+        )
+        self.streams[camera_config.id] = stream
+        
+        # Start camera task
+        task = asyncio.create_task(stream.run())
+        self.tasks[camera_config.id] = task
+        return True
+    
+    async def stop_camera(self, camera_id: str) -> bool:
+        """Stop a single camera stream. Returns False if it is not running."""
+        stream = self.streams.pop(camera_id, None)
+        task = self.tasks.pop(camera_id, None)
+        if stream is None:
+            return False
+        
+        await stream.stop()
+        if task:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        
+        if stream.ring is not None and self.decoder_pool:
+            self.decoder_pool.remove_camera(camera_id)
+        return True
+    
+    def _find_config(self, camera_id: str) -> Optional[CameraConfig]:
+        for camera_config in self.config.cameras:
+            if camera_config.id == camera_id:
+                return camera_config
+        return None
+    
+    async def add_camera(self, camera_config: CameraConfig, start: bool = True) -> bool:
+        """
+        Register a new camera and start it if enabled.
+        
+        Args:
+            camera_config: The camera to add
+            start: False to only register it, e.g. when the shard coordinator
+                starts it once this node holds its lease
+        
+        Returns:
+            False if the id is already in use
+        """
+        if self._find_config(camera_config.id) or camera_config.id in self.streams:
+            logger.warning(f"Camera {camera_config.id}: Already exists")
+            return False
+        
+        self.config.cameras.append(camera_config)
+        if camera_config.enabled and start:
+            await self.start_camera(camera_config)
+        logger.info(f"Camera {camera_config.id}: Added (source: {camera_config.source})")
+        return True
+    
+    async def remove_camera(self, camera_id: str) -> bool:
+        """Stop a camera and forget its configuration. Returns False if unknown."""
+        camera_config = self._find_config(camera_id)
+        if camera_config is None and camera_id not in self.streams:
+            return False
+        
+        await self.stop_camera(camera_id)
+        if camera_config is not None:
+            self.config.cameras.remove(camera_config)
+        logger.info(f"Camera {camera_id}: Removed")
+        return True
+    
+    def pause_camera(self, camera_id: str) -> bool:
+        """Stop inference on one camera while keeping its stream connected."""
+        stream = self.streams.get(camera_id)
+        if stream is None:
+            return False
+        stream.paused = True
+        logger.info(f"Camera {camera_id}: Paused")
+        return True
+    
+    def resume_camera(self, camera_id: str) -> bool:
+        """Resume inference on a paused camera."""
+        stream = self.streams.get(camera_id)
+        if stream is None:
+            return False
+        stream.paused = False
+        logger.info(f"Camera {camera_id}: Resumed")
+        return True
+    
+    async def reconfigure_camera(
+        self,
+        camera_id: str,
+        fps: Optional[int] = None,
+        frame_width: Optional[int] = None,
+        frame_height: Optional[int] = None,
+        roi: Optional[List[List[Tuple[float, float]]]] = None
+    ) -> bool:
+        """
+        Change a camera's processing settings.
+        
+        Only the given settings change; the running stream picks them up on
+        its next frame. An empty ROI list clears the ROI. In process decoding
+        mode the decoder writes frames at the processing size into a ring
+        sized for it, so a new resolution restarts the camera's stream.
+        """
+        camera_config = self._find_config(camera_id)
+        if camera_config is None:
+            return False
+        
+        size = (camera_config.frame_width, camera_config.frame_height)
+        if fps is not None:
+            camera_config.fps = fps
+        if frame_width is not None:
+            camera_config.frame_width = frame_width
+        if frame_height is not None:
+            camera_config.frame_height = frame_height
+        if roi is not None:
+            camera_config.roi = roi
+            stream = self.streams.get(camera_id)
+            if stream:
+                stream.roi = build_roi(roi)
+        
+        stream = self.streams.get(camera_id)
+        if (stream is not None and stream.ring is not None and
+                not self.config.tiled_detection and
+                (camera_config.frame_width, camera_config.frame_height) != size):
+            paused = stream.paused
+            await self.stop_camera(camera_id)
+            await self.start_camera(camera_config)
+            self.streams[camera_id].paused = paused
+        
+        logger.info(f"Camera {camera_id}: Reconfigured")
+        return True
+    
+    def get_cameras(self) -> List[Dict]:
+        """Configuration and state of every known camera."""
+        cameras = []
+        for camera_config in self.config.cameras:
+            stream = self.streams.get(camera_config.id)
+            cameras.append({
+                "id": camera_config.id,
+                "source": camera_config.source,
+                "enabled": camera_config.enabled,
+                "running": stream is not None and stream.running,
+                "paused": stream is not None and stream.paused,
+                "fps": camera_config.fps or self.config.fps,
+                "frame_width": camera_config.frame_width or self.config.frame_width,
+                "frame_height": camera_config.frame_height or self.config.frame_height,
+                "roi": camera_config.roi,
+                "frames_processed": stream.frame_count if stream else 0,
+                "state": stream.health.state if stream else "stopped",
+            })
+        return cameras
+    
+    def get_stream_stats(self) -> Dict[str, Dict]:
+        """Health statistics of every running stream."""
+        return {camera_id: stream.health.snapshot() for camera_id, stream in self.streams.items()}
     
     async def start_all_cameras(self):
         """Start all enabled cameras."""
@@ -256,18 +749,7 @@ class CameraManager:
             if not camera_config.enabled:
                 logger.info(f"Camera {camera_config.id}: Disabled, skipping")
                 continue
-            
-            stream = CameraStream(
-                camera_config,
-                self.config,
-                self.ai_client,
-                self.violation_engine
-            )
-            self.streams[camera_config.id] = stream
-            
-            # Start camera task
-            task = asyncio.create_task(stream.run())
-            self.tasks[camera_config.id] = task
+            await self.start_camera(camera_config)
         
         logger.info(f"Started {len(self.tasks)} camera stream(s)")
     
@@ -289,4 +771,11 @@ class CameraManager:
         
         self.streams.clear()
         self.tasks.clear()
+        
+        if self.decoder_pool:
+            self.decoder_supervisor.cancel()
+            await asyncio.gather(self.decoder_supervisor, return_exceptions=True)
+            await asyncio.to_thread(self.decoder_pool.stop)
+            self.decoder_pool = None
+            self.decoder_supervisor = None
         logger.info("All camera streams stopped")
@@ -0,0 +1,238 @@
+r"""
+Cascade Benchmark
+
+Measures the accuracy versus latency trade-off of per-model input sizes on
+recorded video. Every variant runs the full cascade on the same sampled
+frames; accuracy is reported against the "default" variant (ultralytics'
+default input size for every model), which serves as the reference.
+
+Example usage:
+
+    python -m services.cascade_benchmark \
+        --video videos/test1.mp4 --video videos/test2.mp4 \
+        --frames 100 \
+        --variant person:640,eyes:160,goggles:96,hand:160,gloves:96,coat:320
+
+Built-in variants:
+    default     ultralytics defaults for every model (reference)
+    configured  MODEL_IMGSZ / ADAPTIVE_IMGSZ from the environment
+    adaptive    MODEL_IMGSZ caps with crop-size-aware sizing enabled
+
+Each --variant spec is a MODEL_IMGSZ-style mapping run with adaptive sizing.
+"""
+
+import argparse
+import logging
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from core import Config
+from core.config import parse_model_imgsz
+from .ai_client import AIClient
+from .detections import to_dicts
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_VIDEOS = ["videos/test1.mp4", "videos/test2.mp4"]
+
+
+def sample_frames(
+    video_paths: List[str],
+    frames_per_video: int,
+    width: int,
+    height: int,
+) -> List[np.ndarray]:
+    """Sample frames evenly from each video, resized like CameraStream does."""
+    frames = []
+    for path in video_paths:
+        cap = cv2.VideoCapture(path)
+        if not cap.isOpened():
+            logger.error(f"Could not open video: {path}")
+            continue
+
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or frames_per_video
+        step = max(1, total // frames_per_video)
+        for index in range(0, total, step)[:frames_per_video]:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(cv2.resize(frame, (width, height)))
+        cap.release()
+        logger.info(f"Sampled frames from {path} (total so far: {len(frames)})")
+    return frames
+
+
+def _iou(a: List[float], b: List[float]) -> float:
+    """IoU of two xyxy boxes."""
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    if ix2 <= ix1 or iy2 <= iy1:
+        return 0.0
+    inter = (ix2 - ix1) * (iy2 - iy1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def match_detections(
+    reference: List[Dict],
+    candidate: List[Dict],
+    iou_threshold: float = 0.5,
+) -> Dict[str, Tuple[int, int, int]]:
+    """
+    Greedily match candidate detections to reference detections per class.
+
+    Returns:
+        class name -> (matched, reference count, candidate count)
+    """
+    by_class: Dict[str, Tuple[List, List]] = defaultdict(lambda: ([], []))
+    for det in reference:
+        by_class[det["class"].lower()][0].append(det)
+    for det in candidate:
+        by_class[det["class"].lower()][1].append(det)
+
+    counts = {}
+    for cls_name, (refs, cands) in by_class.items():
+        used = set()
+        matched = 0
+        for ref in sorted(refs, key=lambda d: -d["confidence"]):
+            best, best_iou = None, iou_threshold
+            for i, cand in enumerate(cands):
+                if i in used:
+                    continue
+                iou = _iou(ref["bbox"], cand["bbox"])
+                if iou >= best_iou:
+                    best, best_iou = i, iou
+            if best is not None:
+                used.add(best)
+                matched += 1
+        counts[cls_name] = (matched, len(refs), len(cands))
+    return counts
+
+
+def run_variant(
+    client: AIClient,
+    frames: List[np.ndarray],
+    model_imgsz: Dict[str, int],
+    adaptive: bool,
+) -> Tuple[List[List[Dict]], List[float]]:
+    """Run the cascade on every frame with the given sizing. Returns (detections, latencies)."""
+    client.config.model_imgsz = model_imgsz
+    client.config.adaptive_imgsz = adaptive
+
+    # Warm-up so model initialization does not count towards latency
+    if frames:
+        client._run_cascade_detection(frames[0])
+
+    results, latencies = [], []
+    for frame in frames:
+        start = time.perf_counter()
+        detections = client._run_cascade_detection(frame)
+        latencies.append(time.perf_counter() - start)
+        results.append(to_dicts(detections))
+    return results, latencies
+
+
+def format_report(
+    name: str,
+    reference: List[List[Dict]],
+    results: List[List[Dict]],
+    latencies: List[float],
+) -> str:
+    """Format one variant's latency and per-class accuracy."""
+    totals: Dict[str, List[int]] = defaultdict(lambda: [0, 0, 0])
+    for ref_dets, dets in zip(reference, results):
+        for cls_name, counts in match_detections(ref_dets, dets).items():
+            for i, value in enumerate(counts):
+                totals[cls_name][i] += value
+
+    lat_ms = np.array(latencies) * 1000.0 if latencies else np.zeros(1)
+    lines = [
+        f"== {name} ==",
+        f"  latency ms: mean {lat_ms.mean():.1f}  p50 {np.percentile(lat_ms, 50):.1f}  "
+        f"p95 {np.percentile(lat_ms, 95):.1f}  ({len(latencies)} frames)",
+    ]
+    for cls_name in sorted(totals):
+        matched, n_ref, n_cand = totals[cls_name]
+        recall = matched / n_ref if n_ref else 1.0
+        precision = matched / n_cand if n_cand else 1.0
+        lines.append(
+            f"  {cls_name:<14} recall {recall:.3f}  precision {precision:.3f}  "
+            f"(ref {n_ref}, found {n_cand})"
+        )
+    return "\n".join(lines)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Benchmark per-model input sizes for the detection cascade."
+    )
+    parser.add_argument(
+        "--video",
+        action="append",
+        help="Video file to sample frames from (repeatable). Defaults to the bundled videos.",
+    )
+    parser.add_argument(
+        "--frames",
+        type=int,
+        default=50,
+        help="Frames to sample per video.",
+    )
+    parser.add_argument(
+        "--variant",
+        action="append",
+        default=[],
+        help="Extra MODEL_IMGSZ-style spec to benchmark with adaptive sizing (repeatable).",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
+    args = parse_args(argv)
+    config = Config(require_supabase=False)
+    configured = (dict(config.model_imgsz), config.adaptive_imgsz)
+
+    client = AIClient(config)
+    if not client.models:
+        logger.error("No models loaded; place the .pt files in models/ to benchmark.")
+        return 1
+
+    frames = sample_frames(
+        args.video or DEFAULT_VIDEOS,
+        args.frames,
+        config.frame_width,
+        config.frame_height,
+    )
+    if not frames:
+        logger.error("No frames sampled.")
+        return 1
+
+    variants = [
+        ("default", {}, False),
+        ("configured", configured[0], configured[1]),
+        ("adaptive", configured[0], True),
+    ]
+    variants += [(spec, parse_model_imgsz(spec), True) for spec in args.variant]
+
+    reference = None
+    for name, model_imgsz, adaptive in variants:
+        logger.info(f"Running variant {name}...")
+        results, latencies = run_variant(client, frames, model_imgsz, adaptive)
+        if reference is None:
+            reference = results
+        print(format_report(name, reference, results, latencies))
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
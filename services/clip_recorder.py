@@ -0,0 +1,336 @@
+"""
+Clip Recorder
+
+Short video clips around violations.
+
+Every camera keeps a ring of JPEG-compressed frames covering the last
+pre + post event seconds, bounded in bytes. When a violation fires, the
+recorder waits out the post-event window, writes the frames around the
+event to an MP4 on disk in a worker thread, and queues it for upload next
+to the violation snapshot. Raw frames are never retained.
+
+Uploaded clips are deleted; clips that could not be uploaded stay in
+CLIP_DIR, which is pruned oldest first beyond CLIP_DIR_MAX_MB.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Tuple
+import cv2
+import numpy as np
+
+from core import Config
+from core.executors import ENCODE, IO, executors
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait for the snapshot upload before uploading a clip unlinked
+_SNAPSHOT_WAIT = 30.0
+
+
+class ClipBuffer:
+    """Time- and byte-bounded ring of (timestamp, JPEG) frames of one camera."""
+
+    def __init__(self, max_seconds: float, max_bytes: int):
+        self.max_seconds = max_seconds
+        self.max_bytes = max_bytes
+        self.frames: Deque[Tuple[float, bytes]] = deque()
+        self.bytes = 0
+        self.last_add = 0.0
+
+    def add(self, timestamp: float, jpeg: bytes):
+        self.frames.append((timestamp, jpeg))
+        self.bytes += len(jpeg)
+        while self.frames and (
+            self.bytes > self.max_bytes or
+            self.frames[0][0] < timestamp - self.max_seconds
+        ):
+            _, old = self.frames.popleft()
+            self.bytes -= len(old)
+
+    def window(self, start: float, end: float) -> List[Tuple[float, bytes]]:
+        return [(t, jpeg) for t, jpeg in self.frames if start <= t <= end]
+
+    @property
+    def seconds(self) -> float:
+        return self.frames[-1][0] - self.frames[0][0] if len(self.frames) > 1 else 0.0
+
+
+@dataclass
+class PendingClip:
+    """A clip waiting for its post-event frames and snapshot paths."""
+    camera_id: str
+    trigger_time: float
+    triggers: int = 1
+    snapshot_paths: List[str] = field(default_factory=list)
+    attached: int = 0
+    all_attached: asyncio.Event = field(default_factory=asyncio.Event)
+
+    def add_snapshot(self, snapshot_path: Optional[str]):
+        """Link the uploaded snapshot of one of this clip's violations (None if it failed)."""
+        if snapshot_path:
+            self.snapshot_paths.append(snapshot_path)
+        self.attached += 1
+        if self.attached >= self.triggers:
+            self.all_attached.set()
+
+
+class ClipRecorder:
+    """Per-camera pre-event buffers plus background clip writing and upload."""
+
+    def __init__(self, config: Config, cloud_sync=None):
+        self.config = config
+        self.cloud_sync = cloud_sync
+        self.interval = 1.0 / config.clip_fps if config.clip_fps > 0 else 0.0
+        self.buffer_seconds = config.clip_pre_seconds + config.clip_post_seconds
+        self.max_bytes = int(config.clip_buffer_mb * 1024 * 1024)
+        self.max_dir_bytes = int(config.clip_dir_max_mb * 1024 * 1024)
+
+        self.buffers: Dict[str, ClipBuffer] = {}
+        self.pending: Dict[str, PendingClip] = {}
+        self.upload_queue: asyncio.Queue = asyncio.Queue(maxsize=config.clip_upload_queue)
+        self.tasks: set = set()
+        self.uploader: Optional[asyncio.Task] = None
+        # Clips queued or uploading; never pruned
+        self.uploading: set = set()
+
+        # Cost accounting
+        self.frames_encoded = 0
+        self.encode_seconds = 0.0
+        self.clips_written = 0
+        self.write_seconds = 0.0
+        self.clips_uploaded = 0
+        self.uploads_failed = 0
+        self.clips_pruned = 0
+        self.dir_bytes = 0
+
+        os.makedirs(config.clip_dir, exist_ok=True)
+        self._prune_dir()
+
+    def _buffer(self, camera_id: str) -> ClipBuffer:
+        if camera_id not in self.buffers:
+            self.buffers[camera_id] = ClipBuffer(self.buffer_seconds, self.max_bytes)
+        return self.buffers[camera_id]
+
+    def clip_size(self, width: int, height: int) -> Tuple[int, int]:
+        """Clip resolution for a frame, keeping the aspect ratio (even dimensions)."""
+        if self.config.clip_width > 0 and width > self.config.clip_width:
+            height = round(height * self.config.clip_width / width)
+            width = self.config.clip_width
+        return width - width % 2, max(2, height - height % 2)
+
+    def wants_frame(self, camera_id: str) -> bool:
+        buffer = self.buffers.get(camera_id)
+        return buffer is None or time.monotonic() - buffer.last_add >= self.interval
+
+    def _encode(self, image: np.ndarray) -> Tuple[bytes, float]:
+        started = time.perf_counter()
+        success, encoded = cv2.imencode(
+            ".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, self.config.clip_quality]
+        )
+        if not success:
+            raise ValueError("Failed to encode clip frame")
+        return encoded.tobytes(), time.perf_counter() - started
+
+    async def add_frame(self, camera_id: str, image: np.ndarray, timestamp: Optional[float] = None):
+        """
+        Compress a clip-sized frame into the camera's ring.
+
+        The image is encoded before this returns, so it may be a reused buffer.
+        """
+        buffer = self._buffer(camera_id)
+        buffer.last_add = time.monotonic()
+        try:
+            jpeg, elapsed = await executors.run(ENCODE, self._encode, image)
+        except Exception as e:
+            logger.warning(f"Camera {camera_id}: {e}")
+            return
+        buffer.add(timestamp or time.time(), jpeg)
+        self.frames_encoded += 1
+        self.encode_seconds += elapsed
+
+    def trigger(self, camera_id: str) -> PendingClip:
+        """
+        Start a clip around an event happening now.
+
+        Violations that fire while a clip of the same camera is still
+        collecting post-event frames share that clip.
+        """
+        clip = self.pending.get(camera_id)
+        if clip is not None:
+            clip.triggers += 1
+            clip.all_attached.clear()
+            return clip
+
+        clip = PendingClip(camera_id, time.time())
+        self.pending[camera_id] = clip
+        task = asyncio.create_task(self._finish(clip))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return clip
+
+    def _write(self, path: str, frames: List[Tuple[float, bytes]]) -> float:
+        """Decode the buffered JPEGs into an MP4. Returns the time taken."""
+        started = time.perf_counter()
+        first = cv2.imdecode(np.frombuffer(frames[0][1], np.uint8), cv2.IMREAD_COLOR)
+        duration = frames[-1][0] - frames[0][0]
+        fps = (len(frames) - 1) / duration if duration > 0 else (self.config.clip_fps or 1.0)
+        writer = cv2.VideoWriter(
+            path,
+            cv2.VideoWriter_fourcc(*"mp4v"),
+            fps,
+            (first.shape[1], first.shape[0])
+        )
+        try:
+            writer.write(first)
+            for _, jpeg in frames[1:]:
+                frame = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+                if frame.shape[:2] != first.shape[:2]:
+                    frame = cv2.resize(frame, (first.shape[1], first.shape[0]))
+                writer.write(frame)
+        finally:
+            writer.release()
+        return time.perf_counter() - started
+
+    def _prune_dir(self):
+        """Delete the oldest clips not awaiting upload while CLIP_DIR is over its cap."""
+        clips = []
+        for name in os.listdir(self.config.clip_dir):
+            path = os.path.join(self.config.clip_dir, name)
+            if not name.endswith(".mp4"):
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            clips.append((stat.st_mtime, path, stat.st_size))
+        total = sum(size for _, _, size in clips)
+        if self.max_dir_bytes > 0:
+            for _, path, size in sorted(clips):
+                if total <= self.max_dir_bytes:
+                    break
+                if path in self.uploading:
+                    continue
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                self.clips_pruned += 1
+                logger.warning(f"Clip directory over {self.config.clip_dir_max_mb} MB, deleted {path}")
+        self.dir_bytes = total
+
+    def _delete(self, path: str):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            self.dir_bytes = max(0, self.dir_bytes - size)
+        except OSError as e:
+            logger.warning(f"Could not delete uploaded clip {path}: {e}")
+
+    async def _finish(self, clip: PendingClip):
+        """Wait for the post-event frames, write the clip and queue its upload."""
+        try:
+            await asyncio.sleep(self.config.clip_post_seconds)
+            # Later violations of this camera start a new clip from here on
+            self.pending.pop(clip.camera_id, None)
+
+            frames = self._buffer(clip.camera_id).window(
+                clip.trigger_time - self.config.clip_pre_seconds,
+                clip.trigger_time + self.config.clip_post_seconds
+            )
+            if len(frames) < 2:
+                logger.warning(f"Camera {clip.camera_id}: Not enough buffered frames for a clip")
+                return
+
+            stamp = datetime.fromtimestamp(clip.trigger_time).strftime("%Y%m%d_%H%M%S_%f")
+            path = os.path.join(self.config.clip_dir, f"{clip.camera_id}_{stamp}.mp4")
+            elapsed = await executors.run(IO, self._write, path, frames)
+            self.clips_written += 1
+            self.write_seconds += elapsed
+            logger.info(
+                f"Camera {clip.camera_id}: Wrote {len(frames)}-frame clip {path} "
+                f"in {elapsed * 1000:.0f} ms"
+            )
+
+            if self.cloud_sync is not None:
+                try:
+                    self.upload_queue.put_nowait((clip, path))
+                    self.uploading.add(path)
+                except asyncio.QueueFull:
+                    logger.warning(f"Clip upload queue full, keeping {path} locally only")
+            await executors.run(IO, self._prune_dir)
+        except Exception as e:
+            logger.error(f"Camera {clip.camera_id}: Failed to write clip: {e}", exc_info=True)
+
+    async def _upload_loop(self):
+        """Upload written clips one at a time, next to their snapshots."""
+        while True:
+            clip, path = await self.upload_queue.get()
+            try:
+                try:
+                    await asyncio.wait_for(clip.all_attached.wait(), timeout=_SNAPSHOT_WAIT)
+                except asyncio.TimeoutError:
+                    pass
+                if not clip.snapshot_paths:
+                    logger.warning(f"No snapshot uploaded for clip {path}, keeping it locally only")
+                    continue
+                remote_path = os.path.splitext(clip.snapshot_paths[0])[0] + ".mp4"
+                if await self.cloud_sync.upload_clip(path, remote_path, clip.snapshot_paths):
+                    self.clips_uploaded += 1
+                    await executors.run(IO, self._delete, path)
+                else:
+                    self.uploads_failed += 1
+            finally:
+                self.uploading.discard(path)
+                self.upload_queue.task_done()
+
+    def start(self):
+        if self.cloud_sync is not None and self.uploader is None:
+            self.uploader = asyncio.create_task(self._upload_loop())
+
+    async def stop(self):
+        """Finish clips in progress; uploads still queued are left on disk."""
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+        if self.uploader:
+            self.uploader.cancel()
+            await asyncio.gather(self.uploader, return_exceptions=True)
+            self.uploader = None
+
+    def stats(self) -> Dict:
+        """Ring memory use and encode/write costs."""
+        return {
+            "ring_bytes": sum(b.bytes for b in self.buffers.values()),
+            "ring_limit_bytes_per_camera": self.max_bytes,
+            "cameras": {
+                camera_id: {
+                    "frames": len(buffer.frames),
+                    "bytes": buffer.bytes,
+                    "seconds": round(buffer.seconds, 2),
+                }
+                for camera_id, buffer in self.buffers.items()
+            },
+            "frames_encoded": self.frames_encoded,
+            "encode_ms_avg": (
+                round(self.encode_seconds / self.frames_encoded * 1000, 3)
+                if self.frames_encoded else 0.0
+            ),
+            "clips_written": self.clips_written,
+            "write_ms_avg": (
+                round(self.write_seconds / self.clips_written * 1000, 1)
+                if self.clips_written else 0.0
+            ),
+            "clips_pending": len(self.pending),
+            "uploads_queued": self.upload_queue.qsize(),
+            "clips_uploaded": self.clips_uploaded,
+            "uploads_failed": self.uploads_failed,
+            "dir_bytes": self.dir_bytes,
+            "dir_limit_bytes": self.max_dir_bytes,
+            "clips_pruned": self.clips_pruned,
+        }
@@ -1,45 +1,88 @@
 """
 Cloud Sync Service
 
-Handles all Supabase interactions:
-- Uploading violation snapshots to Storage
+Handles all Supabase interactions, through the async client so network
+waits don't occupy threads:
+- Uploading violation snapshots to Storage (optionally tiered: thumbnail
+  first, full image from a local cache in off-peak batches)
 - Inserting alert records
+- Writing compliance rollups and session summaries
 - Listening for session start/stop commands
 """
 
 import asyncio
+import io
 import logging
-from typing import Optional, Callable, Dict
+import time
+from typing import Optional, Callable, Dict, List, Tuple
 from datetime import datetime
 import cv2
 import numpy as np
-from supabase import create_client, Client, ClientOptions
+from supabase import AsyncClient, acreate_client
 
 from core import Config
+from core.executors import ENCODE, IO, executors
+from core.metrics import debug_counters, frame_latency
+from .snapshot_cache import SnapshotCache, full_image_path
 
 logger = logging.getLogger(__name__)
 
 
+class MemoryViewReader(io.RawIOBase):
+    """Seekable read-only stream over a memoryview, so uploads don't copy to bytes."""
+    
+    def __init__(self, view: memoryview):
+        self._view = view.cast("B")
+        self._pos = 0
+    
+    def readable(self) -> bool:
+        return True
+    
+    def seekable(self) -> bool:
+        return True
+    
+    def readinto(self, buffer) -> int:
+        n = min(len(buffer), len(self._view) - self._pos)
+        buffer[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+    
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._pos = max(0, min(offset, len(self._view)))
+        return self._pos
+    
+    def tell(self) -> int:
+        return self._pos
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
 class CloudSync:
     """Service for syncing data with Supabase."""
     
     def __init__(self, config: Config):
         self.config = config
-        self.supabase: Optional[Client] = None
+        self.supabase: Optional[AsyncClient] = None
         self.session_listener_task: Optional[asyncio.Task] = None
         self.session_command_callback: Optional[Callable] = None
         self.current_session_id: Optional[str] = None
+        
+        # Tiered snapshots: full images wait in a local cache
+        self.snapshot_cache = SnapshotCache(config) if config.snapshot_tiered else None
+        self.snapshot_upload_task: Optional[asyncio.Task] = None
+        self.upload_bytes = {"full": 0, "thumbnail": 0}
     
     async def initialize(self):
         """Initialize Supabase client."""
         try:
-            # For realtime support in async contexts, sometimes we need special handling
-            # But standard client usually works if we don't block the loop.
-            # However, the error suggests 'sync' client issues.
-            # We will try to use the client but acknowledge realtime might need
-            # a different approach or just simple polling if realtime fails.
-            
-            self.supabase = create_client(
+            self.supabase = await acreate_client(
                 self.config.supabase_url,
                 self.config.supabase_key
             )
@@ -49,15 +92,29 @@ class CloudSync:
             logger.error(f"Failed to initialize Supabase: {e}", exc_info=True)
             raise
     
-    def _encode_frame(self, frame: np.ndarray) -> bytes:
-        """Encode frame as JPEG bytes."""
-        encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), self.config.snapshot_quality]
+    def _encode_frame(self, frame: np.ndarray, quality: Optional[int] = None) -> memoryview:
+        """Encode frame as JPEG, returning a view of the encoder's buffer (no bytes copy)."""
+        encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), quality or self.config.snapshot_quality]
         success, buffer = cv2.imencode('.jpg', frame, encode_param)
         
         if not success:
             raise ValueError("Failed to encode frame as JPEG")
         
-        return buffer.tobytes()
+        debug_counters.add("alloc.jpeg")
+        return memoryview(buffer)
+    
+    def _encode_snapshot(self, frame: np.ndarray) -> Tuple[memoryview, Optional[memoryview]]:
+        """Encode the full snapshot and, in tiered mode, a downscaled thumbnail."""
+        image = self._encode_frame(frame)
+        if not self.snapshot_cache:
+            return image, None
+        height, width = frame.shape[:2]
+        target = self.config.snapshot_thumbnail_width
+        if width > target:
+            frame = cv2.resize(
+                frame, (target, max(1, round(height * target / width))), interpolation=cv2.INTER_AREA
+            )
+        return image, self._encode_frame(frame, self.config.snapshot_thumbnail_quality)
     
     async def upload_violation(
         self,
@@ -66,8 +123,9 @@ class CloudSync:
         person_id: str,
         missing_ppe: str,
         frame: np.ndarray,
-        bbox: list
-    ):
+        bbox: list,
+        captured_at: Optional[float] = None
+    ) -> Optional[str]:
         """
         Upload violation snapshot and create alert record.
         
@@ -76,68 +134,256 @@ class CloudSync:
             camera_id: Camera that detected the violation
             person_id: ID of the person with violation
             missing_ppe: Type of missing PPE (e.g., "goggles")
-            frame: Frame snapshot (numpy array)
+            frame: Frame snapshot (numpy array). May be a view into a reused
+                frame buffer; it is encoded before this coroutine returns.
             bbox: Bounding box [x1, y1, x2, y2]
+            captured_at: Capture time of the frame (epoch seconds)
+        
+        Returns:
+            Storage path of the snapshot (the thumbnail in tiered mode), or
+            None if the upload failed
         """
+        if captured_at is not None:
+            frame_latency.observe("decision", time.time() - captured_at)
         try:
-            # Run blocking Supabase calls in a thread to avoid blocking asyncio loop
-            await asyncio.to_thread(
-                self._upload_violation_sync,
-                session_id,
-                camera_id,
-                person_id,
-                missing_ppe,
-                frame,
-                bbox
+            image, thumbnail = await executors.run(ENCODE, self._encode_snapshot, frame)
+            
+            # Generate filename
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+            filename = f"{session_id}/{camera_id}/{timestamp}_{person_id}_{missing_ppe}.jpg"
+            
+            # Tiered: the full image is cached for a later upload, the thumbnail goes now
+            if thumbnail is not None:
+                await executors.run(IO, self.snapshot_cache.put, filename, image)
+                image, tier = thumbnail, "thumbnail"
+            else:
+                tier = "full"
+            
+            # Upload to Supabase Storage
+            await self.supabase.storage.from_(
+                self.config.snapshot_storage_bucket
+            ).upload(
+                path=filename,
+                file=io.BufferedReader(MemoryViewReader(image)),
+                file_options={"content-type": "image/jpeg"}
             )
+            self.upload_bytes[tier] += image.nbytes
+            
+            logger.info(f"Uploaded violation snapshot: {filename}")
+            
+            await self._insert_alert(session_id, missing_ppe, filename, captured_at)
+            return filename
             
         except Exception as e:
             logger.error(f"Failed to upload violation: {e}", exc_info=True)
-
-    def _upload_violation_sync(
+            return None
+    
+    async def _insert_alert(
         self,
         session_id: str,
-        camera_id: str,
-        person_id: str,
         missing_ppe: str,
-        frame: np.ndarray,
-        bbox: list
+        image_path: str,
+        captured_at: Optional[float] = None
     ):
-        """Synchronous implementation of upload."""
-        # Encode frame
-        image_bytes = self._encode_frame(frame)
-        
-        # Generate filename
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-        filename = f"{session_id}/{camera_id}/{timestamp}_{person_id}_{missing_ppe}.jpg"
-        
-        # Upload to Supabase Storage
-        response = self.supabase.storage.from_(
-            self.config.snapshot_storage_bucket
-        ).upload(
-            path=filename,
-            file=image_bytes,
-            file_options={"content-type": "image/jpeg"}
-        )
-        
-        logger.info(f"Uploaded violation snapshot: {filename}")
-        
-        # Create alert record in database
+        """Create the alert record of a violation."""
         alert_data = {
             "session_id": session_id,
             "violation_type": missing_ppe,
-            "image_path": filename,
+            "image_path": image_path,
             "created_at": datetime.now().isoformat(),
         }
+        if captured_at is not None:
+            alert_data["captured_at"] = datetime.fromtimestamp(captured_at).isoformat()
         
         # Insert into alerts table
-        result = self.supabase.table("alerts").insert(alert_data).execute()
+        result = await self.supabase.table("alerts").insert(alert_data).execute()
         
+        # Glass-to-alert: the alert is committed
+        if captured_at is not None:
+            frame_latency.observe("alert", time.time() - captured_at)
         logger.info(f"Created violation alert: {result.data}")
     
+    async def link_violation(
+        self,
+        session_id: str,
+        missing_ppe: str,
+        image_path: str,
+        captured_at: Optional[float] = None
+    ) -> bool:
+        """
+        Create an alert record that reuses an already uploaded snapshot.
+        
+        Args:
+            session_id: Active lab session ID
+            missing_ppe: Type of missing PPE (e.g., "goggles")
+            image_path: Storage path of the earlier snapshot
+            captured_at: Capture time of the frame (epoch seconds)
+        
+        Returns:
+            True if the alert was created
+        """
+        if captured_at is not None:
+            frame_latency.observe("decision", time.time() - captured_at)
+        try:
+            await self._insert_alert(session_id, missing_ppe, image_path, captured_at)
+            return True
+        except Exception as e:
+            logger.error(f"Failed to create linked violation alert: {e}", exc_info=True)
+            return False
+    
+    async def upload_full_snapshot(self, image_path: str) -> Optional[str]:
+        """
+        Upload the cached full-resolution image of an alert (tiered mode) and
+        set the alert's full_image_path.
+        
+        Args:
+            image_path: The alert's image_path (its thumbnail)
+        
+        Returns:
+            Storage path of the full image, or None if it is not cached, the
+            upload failed or no alert row was updated
+        """
+        if not self.snapshot_cache:
+            return None
+        if self.snapshot_cache.is_uploaded(image_path):
+            return full_image_path(image_path)
+        local_path = self.snapshot_cache.get(image_path)
+        if local_path is None:
+            return None
+        try:
+            remote_path = full_image_path(image_path)
+            data = await executors.run(IO, _read_file, local_path)
+            await self.supabase.storage.from_(
+                self.config.snapshot_storage_bucket
+            ).upload(
+                path=remote_path,
+                file=data,
+                file_options={"content-type": "image/jpeg"}
+            )
+            
+            # Alerts linked to a deduplicated snapshot share its image_path
+            result = await self.supabase.table("alerts").update(
+                {"full_image_path": remote_path}
+            ).eq("image_path", image_path).execute()
+            if not result.data:
+                # Keep it pending: once evicted, no alert would point at it
+                logger.warning(f"Full snapshot {remote_path} matched no alert rows")
+                return None
+            
+            await executors.run(IO, self.snapshot_cache.mark_uploaded, image_path)
+            self.upload_bytes["full"] += len(data)
+            return remote_path
+        except Exception as e:
+            logger.error(f"Failed to upload full snapshot {image_path}: {e}")
+            return None
+    
+    def _in_upload_window(self) -> bool:
+        hours = self.config.snapshot_upload_hours
+        if hours is None:
+            return True
+        start, end = hours
+        hour = datetime.now().hour
+        return start <= hour < end if start <= end else hour >= start or hour < end
+    
+    async def _snapshot_upload_loop(self):
+        """Upload cached full images in batches inside the off-peak window."""
+        while True:
+            await asyncio.sleep(self.config.snapshot_upload_interval)
+            if not self._in_upload_window():
+                continue
+            pending = self.snapshot_cache.pending(self.config.snapshot_upload_batch)
+            uploaded = 0
+            for image_path in pending:
+                if await self.upload_full_snapshot(image_path) is None:
+                    break
+                uploaded += 1
+            if uploaded:
+                logger.info(f"Uploaded {uploaded} full-resolution snapshot(s)")
+    
+    def start_snapshot_uploads(self):
+        """Start the off-peak upload of cached full images (tiered mode only)."""
+        if self.snapshot_cache and self.snapshot_upload_task is None:
+            self.snapshot_upload_task = asyncio.create_task(self._snapshot_upload_loop())
+    
+    def snapshot_stats(self) -> Dict:
+        """Upload bytes per snapshot tier and the state of the full-image cache."""
+        return {
+            "tiered": self.snapshot_cache is not None,
+            "upload_bytes": dict(self.upload_bytes),
+            "cache": self.snapshot_cache.stats() if self.snapshot_cache else None,
+        }
+    
+    async def upload_clip(self, local_path: str, remote_path: str, snapshot_paths: List[str]) -> bool:
+        """
+        Upload a violation clip and link it to the alerts of its snapshots.
+        
+        Args:
+            local_path: MP4 file written by the clip recorder
+            remote_path: Storage path (next to the first snapshot)
+            snapshot_paths: image_path of every alert the clip covers
+        
+        Returns:
+            True if the clip was uploaded and linked to at least one alert
+        """
+        try:
+            data = await executors.run(IO, _read_file, local_path)
+            await self.supabase.storage.from_(
+                self.config.snapshot_storage_bucket
+            ).upload(
+                path=remote_path,
+                file=data,
+                file_options={"content-type": "video/mp4"}
+            )
+            
+            result = await self.supabase.table("alerts").update(
+                {"clip_path": remote_path}
+            ).in_("image_path", snapshot_paths).execute()
+            if not result.data:
+                # RLS or a missing alert row makes the update a silent no-op
+                logger.warning(f"Uploaded clip {remote_path} matched no alert rows")
+                return False
+            
+            logger.info(f"Uploaded violation clip: {remote_path}")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to upload clip {local_path}: {e}", exc_info=True)
+            return False
+    
+    async def upload_compliance_rollups(self, rows: List[Dict]) -> bool:
+        """
+        Insert periodic compliance rollup rows (see services.compliance).
+        
+        Returns:
+            True if the rows were written
+        """
+        try:
+            await self.supabase.table("compliance_rollups").insert(rows).execute()
+            return True
+        except Exception as e:
+            logger.error(f"Failed to upload compliance rollups: {e}")
+            return False
+    
+    async def upload_compliance_summary(self, rows: List[Dict]) -> bool:
+        """
+        Write the end-of-session compliance summary, replacing an earlier one.
+        
+        Returns:
+            True if the rows were written
+        """
+        try:
+            await (
+                self.supabase.table("compliance_summaries")
+                .upsert(rows, on_conflict="session_id,camera_id,ppe_type")
+                .execute()
+            )
+            return True
+        except Exception as e:
+            logger.error(f"Failed to upload compliance summary: {e}")
+            return False
+    
     async def start_session_listener(self, callback: Callable[[Dict], None]):
         """
-        Start polling for session changes (Fallback since Realtime is tricky in sync client).
+        Start polling for session changes.
         
         Args:
             callback: Function to call when a command is received
@@ -154,8 +400,8 @@ class CloudSync:
         while True:
             try:
                 # Poll for the latest active session
-                response = await asyncio.to_thread(
-                    lambda: self.supabase.table("monitoring_sessions")
+                response = await (
+                    self.supabase.table("monitoring_sessions")
                     .select("*")
                     .eq("status", "active")
                     .order("created_at", desc=True)
@@ -214,6 +460,10 @@ class CloudSync:
     
     async def stop(self):
         """Stop cloud sync service."""
+        if self.snapshot_upload_task:
+            self.snapshot_upload_task.cancel()
+            await asyncio.gather(self.snapshot_upload_task, return_exceptions=True)
+        
         if self.session_listener_task:
             self.session_listener_task.cancel()
             try:
@@ -230,8 +480,8 @@ class CloudSync:
             # Let's modify _poll_sessions to store the current session ID in self.current_session_id
             if getattr(self, 'current_session_id', None):
                 logger.info(f"Gracefully stopping session {self.current_session_id}...")
-                await asyncio.to_thread(
-                    lambda: self.supabase.table("monitoring_sessions")
+                await (
+                    self.supabase.table("monitoring_sessions")
                     .update({"status": "stopped"})
                     .eq("id", self.current_session_id)
                     .execute()
@@ -0,0 +1,227 @@
+"""
+Compliance Aggregates
+
+Time-weighted PPE compliance per session, camera and PPE item, computed at
+the edge so raw detections never leave the device.
+
+For every processed frame the violation engine reports how many people a
+camera sees and how many of them wear each PPE item. Both are weighted by
+the time since the camera's previous frame (capped, so a stalled stream
+doesn't count as hours of observation) and added to running totals: the
+per-frame cost is constant. Deltas are flushed periodically as rollup rows,
+and the totals are written as a summary when the session ends.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+import numpy as np
+
+from core import Config
+from core.ppe import PPE_ITEMS, PPEClass
+
+logger = logging.getLogger(__name__)
+
+
+class CameraCompliance:
+    """Running totals of one camera within a session."""
+
+    def __init__(self):
+        self.person_seconds = 0.0
+        self.worn_seconds = np.zeros(len(PPE_ITEMS))
+        self.violations = np.zeros(len(PPE_ITEMS), dtype=np.int64)
+        self.last_frame: Optional[float] = None
+
+    def copy(self) -> "CameraCompliance":
+        other = CameraCompliance()
+        other.person_seconds = self.person_seconds
+        other.worn_seconds = self.worn_seconds.copy()
+        other.violations = self.violations.copy()
+        return other
+
+
+class SessionCompliance:
+    """Totals of one session, plus what has already been flushed."""
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.started = time.time()
+        self.cameras: Dict[str, CameraCompliance] = {}
+        self.flushed: Dict[str, CameraCompliance] = {}
+        self.period_start = self.started
+
+    def camera(self, camera_id: str) -> CameraCompliance:
+        if camera_id not in self.cameras:
+            self.cameras[camera_id] = CameraCompliance()
+        return self.cameras[camera_id]
+
+    def snapshot(self) -> Dict[str, CameraCompliance]:
+        """Copy of the current per-camera totals, for a flush in progress."""
+        return {camera_id: totals.copy() for camera_id, totals in self.cameras.items()}
+
+    def rollup_rows(self, snapshot: Dict[str, CameraCompliance], period_end: float) -> List[Dict]:
+        """Increments of a snapshot since the last successful flush, one row per camera and PPE item."""
+        rows = []
+        for camera_id, totals in snapshot.items():
+            flushed = self.flushed.get(camera_id) or CameraCompliance()
+            person_seconds = totals.person_seconds - flushed.person_seconds
+            worn = totals.worn_seconds - flushed.worn_seconds
+            violations = totals.violations - flushed.violations
+            if person_seconds <= 0 and not violations.any():
+                continue
+            for i, item in enumerate(PPE_ITEMS):
+                rows.append({
+                    "session_id": self.session_id,
+                    "camera_id": camera_id,
+                    "ppe_type": item.label,
+                    "period_start": datetime.fromtimestamp(self.period_start).isoformat(),
+                    "period_end": datetime.fromtimestamp(period_end).isoformat(),
+                    "person_seconds": round(person_seconds, 2),
+                    "worn_seconds": round(float(worn[i]), 2),
+                    "violations": int(violations[i]),
+                })
+        return rows
+
+    def mark_flushed(self, snapshot: Dict[str, CameraCompliance], period_end: float):
+        # Frames observed while the upload was in flight go to the next rollup
+        self.flushed = snapshot
+        self.period_start = period_end
+
+    def summary_rows(self, required: Dict[str, bool]) -> List[Dict]:
+        """Session totals, one row per camera and PPE item."""
+        rows = []
+        for camera_id, totals in self.cameras.items():
+            for i, item in enumerate(PPE_ITEMS):
+                worn = float(totals.worn_seconds[i])
+                rows.append({
+                    "session_id": self.session_id,
+                    "camera_id": camera_id,
+                    "ppe_type": item.label,
+                    "required": bool(required.get(item.label, False)),
+                    "person_seconds": round(totals.person_seconds, 2),
+                    "worn_seconds": round(worn, 2),
+                    "compliance_rate": (
+                        round(worn / totals.person_seconds, 4) if totals.person_seconds > 0 else None
+                    ),
+                    "violations": int(totals.violations[i]),
+                })
+        return rows
+
+
+class ComplianceTracker:
+    """Per-session compliance counters with periodic rollups through CloudSync."""
+
+    def __init__(self, config: Config, cloud_sync=None):
+        self.config = config
+        self.cloud_sync = cloud_sync
+        self.session: Optional[SessionCompliance] = None
+        self.tasks: set = set()
+        self.flusher: Optional[asyncio.Task] = None
+
+    def start_session(self, session_id: str):
+        if self.session and self.session.session_id == session_id:
+            return
+        self.end_session()
+        self.session = SessionCompliance(session_id)
+
+    def end_session(self, required: Optional[Dict[str, bool]] = None):
+        """Close the active session and write its final rollup and summary in the background."""
+        session, self.session = self.session, None
+        if session is None or self.cloud_sync is None:
+            return
+        task = asyncio.create_task(self._finish_session(session, required or {}))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    def observe(self, camera_id: str, people: int, worn: np.ndarray):
+        """
+        Add one processed frame.
+
+        Args:
+            camera_id: Camera the frame came from
+            people: Number of people in the frame
+            worn: People wearing each PPE item, in PPE_ITEMS order
+        """
+        if self.session is None:
+            return
+        totals = self.session.camera(camera_id)
+        now = time.monotonic()
+        if totals.last_frame is not None and people:
+            dt = min(now - totals.last_frame, self.config.compliance_max_gap)
+            totals.person_seconds += people * dt
+            totals.worn_seconds += worn * dt
+        totals.last_frame = now
+
+    def violation(self, camera_id: str, item: PPEClass):
+        if self.session is None:
+            return
+        self.session.camera(camera_id).violations[PPE_ITEMS.index(item)] += 1
+
+    async def _flush(self, session: SessionCompliance) -> bool:
+        period_end = time.time()
+        snapshot = session.snapshot()
+        rows = session.rollup_rows(snapshot, period_end)
+        if not rows:
+            return True
+        if not await self.cloud_sync.upload_compliance_rollups(rows):
+            # Kept for the next flush
+            return False
+        session.mark_flushed(snapshot, period_end)
+        return True
+
+    async def _finish_session(self, session: SessionCompliance, required: Dict[str, bool]):
+        await self._flush(session)
+        rows = session.summary_rows(required)
+        if rows and await self.cloud_sync.upload_compliance_summary(rows):
+            logger.info(
+                f"Wrote compliance summary of session {session.session_id} "
+                f"({len(session.cameras)} camera(s))"
+            )
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.config.compliance_flush_interval)
+            if self.session is not None:
+                await self._flush(self.session)
+
+    def start(self):
+        if self.cloud_sync is not None and self.flusher is None:
+            self.flusher = asyncio.create_task(self._flush_loop())
+
+    async def stop(self, required: Optional[Dict[str, bool]] = None):
+        """Summarize the active session and wait for pending writes."""
+        if self.flusher:
+            self.flusher.cancel()
+            await asyncio.gather(self.flusher, return_exceptions=True)
+            self.flusher = None
+        self.end_session(required)
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    def snapshot(self) -> Dict:
+        """Live totals of the active session."""
+        if self.session is None:
+            return {"session_id": None, "cameras": {}}
+        return {
+            "session_id": self.session.session_id,
+            "started": self.session.started,
+            "cameras": {
+                camera_id: {
+                    "person_seconds": round(totals.person_seconds, 2),
+                    "ppe": {
+                        item.label: {
+                            "worn_seconds": round(float(totals.worn_seconds[i]), 2),
+                            "compliance_rate": (
+                                round(float(totals.worn_seconds[i]) / totals.person_seconds, 4)
+                                if totals.person_seconds > 0 else None
+                            ),
+                            "violations": int(totals.violations[i]),
+                        }
+                        for i, item in enumerate(PPE_ITEMS)
+                    },
+                }
+                for camera_id, totals in self.session.cameras.items()
+            },
+        }
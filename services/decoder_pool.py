@@ -0,0 +1,639 @@
+"""
+Decoder Pool
+
+Multi-process frame decoding for many cameras. Each decoder process owns a
+subset of the cameras and decodes them (one thread per camera, OpenCV
+releases the GIL while decoding) into per-camera shared-memory rings, so
+H.264 decode no longer competes with inference for the main process' GIL.
+The main process supervises the decoders through heartbeats and restarts
+any that die or hang. Each camera's thread also beats in its ring header, so
+a single camera stuck in a read is restarted without touching the others.
+
+Decode throughput can be measured across process counts with:
+
+    python -m services.decoder_pool --video videos/test1.mp4 --cameras 16 --processes 1,2,4
+"""
+
+import argparse
+import asyncio
+import importlib
+import importlib.util
+import logging
+import multiprocessing as mp
+import os
+import queue
+import re
+import sys
+import threading
+import time
+import types
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from core import Config, CameraConfig
+from .frame_ring import SharedFrameRing
+from .stream_health import StreamClock, reconnect_delay
+
+logger = logging.getLogger(__name__)
+
+# Importable name of this module, also when run with `python -m`
+_MODULE_NAME = __spec__.name if __spec__ else __name__
+
+
+def parse_source(source: str) -> tuple:
+    """Parse camera source to determine type and value."""
+    source = source.strip()
+
+    # Check if it's an RTSP URL
+    if source.startswith(("rtsp://", "http://", "https://")):
+        return "rtsp", source
+
+    # Check if it's a local image file (for testing)
+    if source.endswith((".jpg", ".jpeg", ".png")):
+        return "image", source
+
+    # Check if it's a USB device index (numeric)
+    try:
+        index = int(source)
+        return "usb", index
+    except ValueError:
+        # Assume it's a file path or other OpenCV source
+        return "file", source
+
+
+def flush_buffered_frames(cap: cv2.VideoCapture, max_seconds: float = 1.0) -> int:
+    """
+    Skip the frames a live capture buffered while it was only grabbed occasionally.
+
+    Grabs until one has to wait for the camera (takes at least half a frame
+    interval), i.e. the next read returns a current frame.
+
+    Returns:
+        Number of frames skipped
+    """
+    min_wait = 0.5 / (cap.get(cv2.CAP_PROP_FPS) or 30.0)
+    deadline = time.monotonic() + max_seconds
+    skipped = 0
+    while time.monotonic() < deadline:
+        started = time.monotonic()
+        if not cap.grab() or time.monotonic() - started >= min_wait:
+            break
+        skipped += 1
+    return skipped
+
+
+def _mp_context():
+    """Start decoders from a clean single-threaded server process where available."""
+    if "forkserver" in mp.get_all_start_methods():
+        ctx = mp.get_context("forkserver")
+        # Don't import the service's __main__ (and the YOLO models with it) in decoders
+        ctx.set_forkserver_preload([])
+        return ctx
+    return mp.get_context("spawn")
+
+
+@contextmanager
+def _decoder_main_module():
+    """
+    Make new decoder processes use this module as their __main__.
+
+    Spawned/forkserver children re-run the parent's __main__ (main.py, which
+    imports ultralytics and the models' dependencies). Swapping in a stub whose
+    spec names this module while a process starts keeps decoders lightweight.
+    """
+    main = sys.modules["__main__"]
+    stub = types.ModuleType("__main__")
+    stub.__spec__ = importlib.util.find_spec(_MODULE_NAME)
+    sys.modules["__main__"] = stub
+    try:
+        yield
+    finally:
+        sys.modules["__main__"] = main
+
+
+def _output_size(
+    width: int,
+    height: int,
+    resize_to: Optional[Tuple[int, int]],
+    settings: Dict
+) -> Tuple[int, int]:
+    """Size a decoded frame is written to the ring at."""
+    if resize_to:
+        return resize_to
+
+    # Full-resolution (tiled) mode: only shrink frames that exceed the slot size
+    max_w, max_h = settings["max_size"]
+    scale = min(1.0, max_w / width, max_h / height)
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def _decode_camera(
+    camera_id: str,
+    source: str,
+    ring: SharedFrameRing,
+    resize_to: Optional[Tuple[int, int]],
+    settings: Dict,
+    session_active,
+    stop_event
+):
+    """Decoder thread: read one camera into its ring until stopped."""
+    source_type, source_value = parse_source(source)
+    cap: Optional[cv2.VideoCapture] = None
+    raw: Optional[np.ndarray] = None
+    frame_interval = 0.0
+    attempts = 0
+    clock = StreamClock()
+    was_idle = False
+
+    def backoff() -> float:
+        nonlocal attempts
+        delay = reconnect_delay(
+            attempts,
+            settings["reconnect_delay"],
+            settings["reconnect_max_delay"],
+            settings["max_reconnect_attempts"],
+            settings["slow_retry_interval"]
+        )
+        attempts += 1
+        return delay
+
+    def wait(seconds: float):
+        """Sleep until stopped, beating at least once a second."""
+        deadline = time.monotonic() + seconds
+        while not stop_event.is_set():
+            ring.beat()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            stop_event.wait(min(1.0, remaining))
+
+    while not stop_event.is_set():
+        ring.beat()
+        if cap is None or not cap.isOpened():
+            if source_type == "rtsp":
+                # Give up on a dead stream before the camera's heartbeat goes stale
+                timeout_ms = settings["io_timeout_ms"]
+                cap = cv2.VideoCapture(
+                    source_value,
+                    cv2.CAP_FFMPEG,
+                    [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, timeout_ms, cv2.CAP_PROP_READ_TIMEOUT_MSEC, timeout_ms]
+                )
+                cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            else:
+                cap = cv2.VideoCapture(source_value)
+            if not cap.isOpened():
+                logger.error(f"Decoder {camera_id}: Failed to open source {source_value}")
+                cap = None
+                ring.set_disconnected()
+                wait(backoff())
+                continue
+            if source_type == "file" and settings["pace"]:
+                frame_interval = 1.0 / (cap.get(cv2.CAP_PROP_FPS) or 30.0)
+            clock.reset()
+            ring.set_connected()
+            logger.info(f"Decoder {camera_id}: Connected (pid {os.getpid()})")
+
+        # Idle mode: keep the stream alive without decoding
+        if not session_active.is_set():
+            was_idle = True
+            if not cap.grab():
+                if source_type == "file":
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    continue
+                logger.warning(f"Decoder {camera_id}: Failed to grab frame while idle, reconnecting...")
+                cap.release()
+                cap = None
+                ring.set_disconnected()
+                wait(backoff())
+                continue
+            attempts = 0
+            session_active.wait(settings["idle_interval"])
+            continue
+        if was_idle:
+            was_idle = False
+            if source_type != "file":
+                skipped = flush_buffered_frames(cap)
+                logger.debug(f"Decoder {camera_id}: Skipped {skipped} frames buffered while idle")
+
+        started = time.monotonic()
+        ret, frame = cap.read(raw)
+        if stop_event.is_set():
+            # Restarted while blocked in the read; the ring may be closed
+            break
+        if not ret:
+            if source_type == "file":
+                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                continue
+            logger.warning(f"Decoder {camera_id}: Failed to read frame, reconnecting...")
+            cap.release()
+            cap = None
+            ring.set_disconnected()
+            wait(backoff())
+            continue
+        raw = frame
+        attempts = 0
+        capture_ns = time.time_ns()
+        if source_type == "rtsp":
+            # Date buffered frames by their stream timestamps (see StreamClock)
+            capture_ns = int(clock.capture_time(cap.get(cv2.CAP_PROP_POS_MSEC), capture_ns / 1e9) * 1e9)
+
+        width, height = _output_size(frame.shape[1], frame.shape[0], resize_to, settings)
+        slot = ring.begin_write((height, width) + frame.shape[2:])
+        if (width, height) == (frame.shape[1], frame.shape[0]):
+            np.copyto(slot, frame)
+        else:
+            cv2.resize(frame, (width, height), dst=slot)
+        del slot
+        ring.commit(capture_ns)
+
+        if frame_interval:
+            remaining = frame_interval - (time.monotonic() - started)
+            if remaining > 0:
+                stop_event.wait(remaining)
+
+    if cap is not None:
+        cap.release()
+
+
+def _decoder_process_main(
+    index: int,
+    cameras: List[Tuple[str, str, str, object]],
+    settings: Dict,
+    session_active,
+    stop_event,
+    heartbeats,
+    commands,
+    locks
+):
+    """
+    Decoder process entry point: one thread per camera plus a heartbeat.
+
+    Cameras are added and removed at runtime through the `commands` queue:
+    ("add", (camera_id, source, ring_name, lock_index, resize_to)),
+    ("remove", camera_id) or ("restart", <same spec as add>).
+    Locks can't be sent through a queue, so the pool's locks are inherited at
+    start and referenced by index.
+    """
+    logging.basicConfig(
+        level=settings["log_level"],
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    # camera_id -> (thread, per-camera stop event, ring)
+    decoders: Dict[str, Tuple[threading.Thread, threading.Event, SharedFrameRing]] = {}
+
+    def add(
+        camera_id: str,
+        source: str,
+        ring_name: str,
+        lock_index: int,
+        resize_to: Optional[Tuple[int, int]]
+    ):
+        if camera_id in decoders:
+            return
+        ring = SharedFrameRing.attach(ring_name, locks[lock_index])
+        camera_stop = threading.Event()
+        thread = threading.Thread(
+            target=_decode_camera,
+            args=(camera_id, source, ring, resize_to, settings, session_active, camera_stop),
+            name=f"decoder-{camera_id}",
+            daemon=True
+        )
+        thread.start()
+        decoders[camera_id] = (thread, camera_stop, ring)
+
+    def remove(camera_id: str):
+        if camera_id not in decoders:
+            return
+        thread, camera_stop, ring = decoders.pop(camera_id)
+        camera_stop.set()
+        thread.join(timeout=2.0)
+        ring.close()
+
+    for camera in cameras:
+        add(*camera)
+
+    while not stop_event.is_set():
+        heartbeats[index] = time.time()
+        try:
+            action, payload = commands.get(timeout=1.0)
+        except queue.Empty:
+            continue
+        if action == "add":
+            add(*payload)
+        elif action == "remove":
+            remove(payload)
+        elif action == "restart":
+            # A hung thread can't be interrupted; it exits once its read returns
+            remove(payload[0])
+            add(*payload)
+
+    for camera_id in list(decoders):
+        remove(camera_id)
+
+
+class DecoderPool:
+    """Supervised pool of decoder processes feeding shared-memory frame rings."""
+
+    def __init__(
+        self,
+        config: Config,
+        num_processes: Optional[int] = None,
+        pace: bool = True
+    ):
+        self.config = config
+        self.ctx = _mp_context()
+
+        if num_processes is None:
+            num_processes = config.decoder_processes or (os.cpu_count() or 1)
+        self.num_processes = max(1, num_processes)
+
+        self.session_active = self.ctx.Event()
+        self.stop_event = self.ctx.Event()
+        self.heartbeats = self.ctx.Array("d", self.num_processes)
+
+        self.settings = {
+            "max_size": (config.decoder_max_width, config.decoder_max_height),
+            "reconnect_delay": config.camera_reconnect_delay,
+            "reconnect_max_delay": config.camera_reconnect_max_delay,
+            "max_reconnect_attempts": config.max_reconnect_attempts,
+            "slow_retry_interval": config.camera_slow_retry_interval,
+            "idle_interval": config.idle_health_check_interval,
+            "io_timeout_ms": int(config.decoder_heartbeat_timeout * 1000 / 2),
+            "pace": pace,
+            "log_level": config.log_level,
+        }
+
+        # Rings are owned by the main process so they survive decoder restarts
+        self.rings: Dict[str, SharedFrameRing] = {}
+        # Ring locks are preallocated so every decoder inherits them at start
+        self._locks = [self.ctx.Lock() for _ in range(config.decoder_max_cameras)]
+        self._free_locks = list(range(config.decoder_max_cameras))
+        self._lock_index: Dict[str, int] = {}
+
+        # Cameras assigned to each decoder process
+        self.assignments: List[List[CameraConfig]] = [[] for _ in range(self.num_processes)]
+
+        self.processes: List[Optional[mp.Process]] = [None] * self.num_processes
+        self.commands: List = [None] * self.num_processes
+        self.restarts = [0] * self.num_processes
+        self.camera_restarts: Dict[str, int] = {}
+        self.running = False
+
+    def _resize_to(self, camera: CameraConfig) -> Optional[Tuple[int, int]]:
+        """Processing size a camera is decoded at; None keeps full resolution (tiled mode)."""
+        if self.config.tiled_detection:
+            return None
+        return (
+            camera.frame_width or self.config.frame_width,
+            camera.frame_height or self.config.frame_height
+        )
+
+    def _capacity(self, camera: CameraConfig) -> int:
+        """Bytes per ring slot of a camera."""
+        width, height = self._resize_to(camera) or (
+            self.config.decoder_max_width, self.config.decoder_max_height
+        )
+        return width * height * 3
+
+    def _camera_spec(self, camera: CameraConfig) -> Tuple:
+        return (
+            camera.id,
+            camera.source,
+            self.rings[camera.id].name,
+            self._lock_index[camera.id],
+            self._resize_to(camera)
+        )
+
+    def _spawn(self, index: int) -> mp.Process:
+        """Start decoder process `index` for its assigned cameras."""
+        cameras = [self._camera_spec(c) for c in self.assignments[index]]
+        # Fresh queue so a restarted decoder doesn't replay stale commands
+        self.commands[index] = self.ctx.Queue()
+        # Grace period before the first heartbeats are due
+        self.heartbeats[index] = time.time()
+        for camera in self.assignments[index]:
+            self.rings[camera.id].beat()
+        # Reference the entry point through its module name so it pickles
+        # correctly even when this module is running as __main__
+        entry = importlib.import_module(_MODULE_NAME)._decoder_process_main
+        proc = self.ctx.Process(
+            target=entry,
+            args=(
+                index, cameras, self.settings, self.session_active,
+                self.stop_event, self.heartbeats, self.commands[index], self._locks
+            ),
+            name=f"decoder-{index}",
+            daemon=True
+        )
+        with _decoder_main_module():
+            proc.start()
+        logger.info(
+            f"Decoder process {index} started (pid {proc.pid}) for cameras "
+            f"{[c.id for c in self.assignments[index]]}"
+        )
+        return proc
+
+    def start(self):
+        """Start decoder processes for the cameras assigned so far."""
+        self.running = True
+        for index in range(self.num_processes):
+            if self.assignments[index]:
+                self.processes[index] = self._spawn(index)
+
+    def add_camera(self, camera: CameraConfig) -> SharedFrameRing:
+        """Create a ring for a camera and hand it to the least-loaded decoder."""
+        if camera.id in self.rings:
+            return self.rings[camera.id]
+        if not self._free_locks:
+            raise RuntimeError(
+                f"Decoder pool is full ({self.config.decoder_max_cameras} cameras)"
+            )
+
+        lock_index = self._free_locks.pop()
+        name = "ppe_" + re.sub(r"[^A-Za-z0-9_]", "_", f"{os.getpid()}_{camera.id}")
+        self.rings[camera.id] = SharedFrameRing.create(
+            name, self.config.decoder_ring_slots, self._capacity(camera), self._locks[lock_index]
+        )
+        self._lock_index[camera.id] = lock_index
+
+        index = min(range(self.num_processes), key=lambda i: len(self.assignments[i]))
+        self.assignments[index].append(camera)
+
+        if self.running:
+            proc = self.processes[index]
+            if proc is not None and proc.is_alive():
+                self.commands[index].put(("add", self._camera_spec(camera)))
+            else:
+                self.processes[index] = self._spawn(index)
+        return self.rings[camera.id]
+
+    def remove_camera(self, camera_id: str):
+        """Stop decoding a camera and release its ring."""
+        for index, cameras in enumerate(self.assignments):
+            if any(c.id == camera_id for c in cameras):
+                self.assignments[index] = [c for c in cameras if c.id != camera_id]
+                if self.running and self.processes[index] is not None:
+                    self.commands[index].put(("remove", camera_id))
+                break
+
+        ring = self.rings.pop(camera_id, None)
+        self.camera_restarts.pop(camera_id, None)
+        if camera_id in self._lock_index:
+            self._free_locks.append(self._lock_index.pop(camera_id))
+        if ring:
+            # The decoder keeps its own mapping until it drops the camera
+            ring.close()
+
+    def set_session_active(self, active: bool):
+        """Switch decoders between full decoding and grab-only idle mode."""
+        if active:
+            self.session_active.set()
+        else:
+            self.session_active.clear()
+
+    def _restart_stale_cameras(self, index: int, now: float):
+        """Restart the camera threads of a live decoder whose ring heartbeat went stale."""
+        # An idle decoder beats once per grab
+        timeout = self.config.decoder_heartbeat_timeout + self.config.idle_health_check_interval
+        for camera in self.assignments[index]:
+            ring = self.rings[camera.id]
+            age = now - ring.heartbeat
+            if age <= timeout:
+                continue
+            logger.error(f"Decoder {camera.id}: No heartbeat for {age:.0f}s, restarting camera...")
+            # Grace period for the new thread
+            ring.beat()
+            self.camera_restarts[camera.id] = self.camera_restarts.get(camera.id, 0) + 1
+            self.commands[index].put(("restart", self._camera_spec(camera)))
+
+    async def supervise(self):
+        """Restart decoder processes that exit or stop sending heartbeats, and hung cameras."""
+        timeout = self.config.decoder_heartbeat_timeout
+        while self.running:
+            now = time.time()
+            for index, proc in enumerate(self.processes):
+                if proc is None:
+                    continue
+                hung = now - self.heartbeats[index] > timeout
+                if proc.is_alive() and not hung:
+                    self._restart_stale_cameras(index, now)
+                    continue
+
+                reason = "stopped responding" if proc.is_alive() else f"exited ({proc.exitcode})"
+                logger.error(f"Decoder process {index} {reason}, restarting...")
+                if proc.is_alive():
+                    proc.kill()
+                await asyncio.to_thread(proc.join, 2.0)
+
+                self.restarts[index] += 1
+                # Back off when a decoder keeps crashing
+                await asyncio.sleep(min(30.0, 2 ** min(self.restarts[index], 5) / 4))
+                if self.running:
+                    self.processes[index] = self._spawn(index)
+
+            await asyncio.sleep(1.0)
+
+    def stop(self):
+        """Stop decoder processes and release the rings."""
+        self.running = False
+        self.stop_event.set()
+        for proc in self.processes:
+            if proc is None:
+                continue
+            proc.join(timeout=5.0)
+            if proc.is_alive():
+                proc.kill()
+                proc.join(timeout=1.0)
+        for ring in self.rings.values():
+            ring.close()
+        self.rings.clear()
+        logger.info("Decoder pool stopped")
+
+    def stats(self) -> Dict:
+        """Per-process liveness and per-camera frame sequence numbers."""
+        now = time.time()
+        return {
+            "processes": [
+                {
+                    "index": index,
+                    "pid": proc.pid if proc else None,
+                    "alive": bool(proc and proc.is_alive()),
+                    "heartbeat_age": now - self.heartbeats[index],
+                    "restarts": self.restarts[index],
+                    "cameras": [c.id for c in self.assignments[index]],
+                }
+                for index, proc in enumerate(self.processes)
+            ],
+            "frames": {camera_id: ring.latest_seq + 1 for camera_id, ring in self.rings.items()},
+            "lock_misses": {camera_id: ring.lock_misses for camera_id, ring in self.rings.items()},
+            "camera_heartbeat_age": {
+                camera_id: now - ring.heartbeat for camera_id, ring in self.rings.items()
+            },
+            "camera_restarts": dict(self.camera_restarts),
+        }
+
+
+def benchmark(
+    video: str,
+    num_cameras: int,
+    process_counts: List[int],
+    seconds: float
+) -> List[Tuple[int, float]]:
+    """Measure unpaced decode throughput (frames/s, all cameras) per process count."""
+    config = Config(require_supabase=False)
+    cameras = [CameraConfig(id=f"bench_{i}", source=video) for i in range(num_cameras)]
+    results = []
+
+    for count in process_counts:
+        pool = DecoderPool(config, num_processes=count, pace=False)
+        for camera in cameras:
+            pool.add_camera(camera)
+        pool.set_session_active(True)
+        pool.start()
+        try:
+            # Let decoders open their sources before measuring
+            time.sleep(2.0)
+            start_frames = sum(r.latest_seq + 1 for r in pool.rings.values())
+            time.sleep(seconds)
+            frames = sum(r.latest_seq + 1 for r in pool.rings.values()) - start_frames
+        finally:
+            pool.stop()
+        results.append((count, frames / seconds))
+        logger.info(f"{count} process(es): {frames / seconds:.1f} frames/s")
+
+    return results
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Measure decoder pool throughput across process counts."
+    )
+    parser.add_argument("--video", default="videos/test1.mp4", help="Video file every camera decodes.")
+    parser.add_argument("--cameras", type=int, default=16, help="Number of simulated cameras.")
+    parser.add_argument("--processes", default="1,2,4", help="Comma-separated process counts to test.")
+    parser.add_argument("--seconds", type=float, default=10.0, help="Measurement time per process count.")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
+    args = parse_args(argv)
+    counts = [int(c) for c in args.processes.split(",") if c.strip()]
+    results = benchmark(args.video, args.cameras, counts, args.seconds)
+
+    base = results[0][1] if results and results[0][1] else 1.0
+    for count, fps in results:
+        print(f"{count:>3} process(es): {fps:8.1f} frames/s  ({fps / base:.2f}x)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,118 @@
+"""
+Detection arrays.
+
+Detections travel from AIClient to the ViolationEngine as a NumPy structured
+array with one row per box (class id, confidence, xyxy) instead of a list of
+dicts. Boxes are extracted from each model result in one call, and class
+ids are canonical PPE classes (core.ppe.PPEClass), translated from each
+model's own ids through a table built when the model is loaded.
+
+`to_dicts` / `from_dicts` convert to and from the original
+[{"class", "bbox", "confidence"}] format for code that still needs it.
+"""
+
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+
+from core.ppe import LABELS, canonical_class
+
+DETECTION_DTYPE = np.dtype([
+    ("class_id", np.int32),
+    ("confidence", np.float32),
+    ("xyxy", np.float32, (4,)),
+])
+
+
+def build_class_lookup(model_names: Dict[int, str], class_map: Optional[Dict[str, str]] = None) -> np.ndarray:
+    """
+    Table mapping a model's class ids to canonical class ids (-1 = ignored).
+
+    Raises:
+        ValueError: If a model class has no canonical class (see core.ppe).
+    """
+    size = max(model_names) + 1 if model_names else 0
+    table = np.full(size, -1, dtype=np.int32)
+    for model_id, name in model_names.items():
+        canonical = canonical_class(name, class_map)
+        if canonical is not None:
+            table[model_id] = canonical
+    return table
+
+
+def empty(size: int = 0) -> np.ndarray:
+    return np.zeros(size, dtype=DETECTION_DTYPE)
+
+
+def from_result(result, class_lookup: np.ndarray, dx: float = 0.0, dy: float = 0.0) -> np.ndarray:
+    """
+    Convert one ultralytics result to a detection array in a single transfer.
+
+    Args:
+        result: ultralytics Results object
+        class_lookup: Model class id -> canonical class id (see build_class_lookup)
+        dx, dy: Offset added to the boxes (crop position in the parent image)
+    """
+    data = np.asarray(result.boxes.cpu().numpy().data)  # (N, 6): xyxy, conf, cls
+    if not len(data):
+        return empty()
+    class_ids = class_lookup[data[:, 5].astype(np.intp)]
+    if (class_ids < 0).any():
+        # Drop classes mapped to "ignore"
+        keep = class_ids >= 0
+        data, class_ids = data[keep], class_ids[keep]
+    detections = empty(len(data))
+    if len(data):
+        detections["xyxy"] = data[:, :4]
+        detections["confidence"] = data[:, 4]
+        detections["class_id"] = class_ids
+        if dx or dy:
+            detections["xyxy"] += np.array([dx, dy, dx, dy], dtype=np.float32)
+    return detections
+
+
+def concatenate(parts: Sequence[np.ndarray]) -> np.ndarray:
+    parts = [p for p in parts if len(p)]
+    if not parts:
+        return empty()
+    return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+
+def iou_matrix(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU of (N, 4) and (M, 4) xyxy boxes, shape (N, M)."""
+    ax1, ay1, ax2, ay2 = (boxes_a[:, i, None] for i in range(4))
+    bx1, by1, bx2, by2 = (boxes_b[None, :, i] for i in range(4))
+    inter = (
+        np.clip(np.minimum(ax2, bx2) - np.maximum(ax1, bx1), 0, None) *
+        np.clip(np.minimum(ay2, by2) - np.maximum(ay1, by1), 0, None)
+    )
+    union = (ax2 - ax1) * (ay2 - ay1) + (bx2 - bx1) * (by2 - by1) - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+
+def to_dicts(detections: np.ndarray) -> List[Dict]:
+    """Compatibility adapter: detection array -> [{"class", "bbox", "confidence"}]."""
+    return [
+        {
+            "class": LABELS[class_id],
+            "bbox": xyxy.tolist(),
+            "confidence": float(confidence),
+        }
+        for class_id, confidence, xyxy in zip(
+            detections["class_id"].tolist(), detections["confidence"], detections["xyxy"]
+        )
+    ]
+
+
+def from_dicts(detections: List[Dict]) -> np.ndarray:
+    """
+    Compatibility adapter: [{"class", "bbox", "confidence"}] -> detection array.
+
+    Class names go through the same mapping as model classes; ignored classes
+    are dropped.
+    """
+    rows = []
+    for det in detections:
+        canonical = canonical_class(det["class"])
+        if canonical is not None:
+            rows.append((canonical, det["confidence"], det["bbox"]))
+    return np.array(rows, dtype=DETECTION_DTYPE) if rows else empty()
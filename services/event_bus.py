@@ -0,0 +1,116 @@
+"""
+Event Bus
+
+Pushes detection summaries and violation events to connected frontends.
+
+Publishing never blocks the frame pipeline: every subscriber has a bounded
+queue. Detection summaries are coalesced per camera (a slow consumer only
+receives the newest summary), and discrete events such as violations are
+kept up to the queue limit, dropping the oldest when a consumer falls behind.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from core import Config
+
+logger = logging.getLogger(__name__)
+
+# Event types that replace the pending event of the same camera instead of queueing
+COALESCED_TYPES = {"detections"}
+
+
+class Subscriber:
+    """Bounded, coalescing event queue of one connected client."""
+
+    def __init__(self, max_events: int, camera_ids: Optional[Set[str]] = None):
+        self.camera_ids = camera_ids
+        self.dropped = 0
+        self._events: Deque[Dict] = deque()
+        self._max_events = max_events
+        # (type, camera_id) -> newest coalesced event not yet delivered
+        self._latest: Dict[Tuple[str, Optional[str]], Dict] = {}
+        self._ready = asyncio.Event()
+
+    def wants(self, camera_id: Optional[str]) -> bool:
+        return camera_id is None or self.camera_ids is None or camera_id in self.camera_ids
+
+    def put(self, event: Dict):
+        """Queue an event without ever blocking."""
+        if event["type"] in COALESCED_TYPES:
+            key = (event["type"], event.get("camera_id"))
+            if key in self._latest:
+                self.dropped += 1
+            self._latest[key] = event
+        else:
+            if len(self._events) >= self._max_events:
+                self._events.popleft()
+                self.dropped += 1
+            self._events.append(event)
+        self._ready.set()
+
+    async def get(self, timeout: Optional[float] = None) -> List[Dict]:
+        """Wait for and drain all pending events (empty list on timeout)."""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        self._ready.clear()
+
+        events = list(self._events)
+        self._events.clear()
+        events.extend(self._latest.values())
+        self._latest.clear()
+        return events
+
+
+class EventBus:
+    """Fan-out of pipeline events to subscribers."""
+
+    def __init__(self, config: Config):
+        self.max_events = config.event_queue_size
+        self.subscribers: Set[Subscriber] = set()
+
+    @property
+    def has_subscribers(self) -> bool:
+        return bool(self.subscribers)
+
+    def subscribe(self, camera_ids: Optional[Set[str]] = None) -> Subscriber:
+        subscriber = Subscriber(self.max_events, camera_ids)
+        self.subscribers.add(subscriber)
+        logger.info(f"Event subscriber connected ({len(self.subscribers)} connected)")
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+        logger.info(
+            f"Event subscriber disconnected (dropped {subscriber.dropped} events)"
+        )
+
+    def publish(self, event_type: str, camera_id: Optional[str] = None, **data):
+        """Send an event to every interested subscriber. Must run on the event loop."""
+        if not self.subscribers:
+            return
+        event = {"type": event_type, "camera_id": camera_id, "timestamp": time.time(), **data}
+        for subscriber in self.subscribers:
+            if subscriber.wants(camera_id):
+                subscriber.put(event)
+
+    async def sse(self, camera_ids: Optional[Set[str]] = None, keepalive: float = 15.0):
+        """Server-Sent Events stream for one client."""
+        subscriber = self.subscribe(camera_ids)
+        try:
+            while True:
+                events = await subscriber.get(timeout=keepalive)
+                if not events:
+                    # Comment line keeps proxies from closing an idle connection
+                    yield ": keepalive\n\n"
+                    continue
+                for event in events:
+                    yield f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+        finally:
+            self.unsubscribe(subscriber)
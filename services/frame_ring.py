@@ -0,0 +1,301 @@
+"""
+Shared-Memory Frame Ring
+
+Per-camera ring buffer of decoded frames in shared memory, written by a
+decoder process and read by the main process without copying.
+
+Layout: an int64 header followed by fixed-capacity frame slots. Each slot
+records the sequence number, shape and capture time of the frame it holds.
+The header also carries the writer's heartbeat, so a decoder thread that
+hangs (e.g. in a stuck RTSP read) can be told apart from its live process,
+and the source's connection state and reconnect count for stream health.
+The reader pins the slot it is working on so the writer never overwrites a
+frame that is still being processed; the lock only guards the slot
+bookkeeping, never the pixel copy. The reader runs on the event loop, so it
+never waits for the lock: when the writer holds it, the read is skipped and
+retried on the next poll. A decoder killed inside a critical section leaves
+the lock held; its replacement takes the lock over after a timeout.
+"""
+
+import logging
+import time
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from typing import Optional, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Header fields (int64)
+_LATEST_SEQ = 0
+_LATEST_SLOT = 1
+_PINNED_SLOT = 2
+_NUM_SLOTS = 3
+_CAPACITY = 4
+_HEARTBEAT = 5  # Last sign of life of the writer (epoch ns)
+_CONNECTED_SINCE = 6  # When the writer's source connected (epoch ns), 0 while disconnected
+_RECONNECTS = 7  # Connection failures of the writer's source
+_GLOBAL_FIELDS = 8
+
+# Per-slot fields (int64): seq, height, width, channels, capture time (ns)
+_SLOT_FIELDS = 5
+_SLOT_WRITING = -1
+
+_ALIGN = 64
+
+# Critical sections take microseconds; a lock held this long (seconds) was
+# left behind by a writer that was killed while holding it
+_STALE_LOCK_TIMEOUT = 1.0
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Attach to an existing block without taking ownership of it."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 always registers with the resource tracker; decoder
+        # processes share the creator's tracker, so this is a no-op there
+        return shared_memory.SharedMemory(name=name)
+
+
+class SharedFrameRing:
+    """Single-writer, single-reader ring of frames in shared memory."""
+
+    def __init__(self, shm: shared_memory.SharedMemory, lock, owner: bool):
+        self.shm = shm
+        self.lock = lock
+        self.owner = owner
+
+        self.slots = self._slots_from_buf(shm)
+        self.header = np.ndarray(
+            (_GLOBAL_FIELDS + _SLOT_FIELDS * self.slots,),
+            dtype=np.int64,
+            buffer=shm.buf
+        )
+        self.capacity = int(self.header[_CAPACITY])
+        self._data_offset = self._header_bytes(self.slots)
+
+        self._write_slot: Optional[int] = None
+        self._write_shape: Tuple[int, ...] = ()
+        # Reads skipped because the writer held the lock
+        self.lock_misses = 0
+
+    @staticmethod
+    def _slots_from_buf(shm: shared_memory.SharedMemory) -> int:
+        """Read the slot count from an initialized block."""
+        return int(np.ndarray((_GLOBAL_FIELDS,), dtype=np.int64, buffer=shm.buf)[_NUM_SLOTS])
+
+    @staticmethod
+    def _header_bytes(slots: int) -> int:
+        size = (_GLOBAL_FIELDS + _SLOT_FIELDS * slots) * 8
+        return -(-size // _ALIGN) * _ALIGN
+
+    @classmethod
+    def create(cls, name: str, slots: int, capacity: int, lock) -> "SharedFrameRing":
+        """
+        Create a new ring.
+
+        Args:
+            name: Shared memory block name
+            slots: Number of frame slots (at least 3: pinned, writing, latest)
+            capacity: Maximum frame size in bytes
+            lock: multiprocessing lock shared with the writer process
+        """
+        slots = max(3, slots)
+        capacity = -(-capacity // _ALIGN) * _ALIGN
+        size = cls._header_bytes(slots) + slots * capacity
+
+        try:
+            # A crashed previous run may have left the block behind
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+        except FileNotFoundError:
+            pass
+
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        header = np.ndarray((_GLOBAL_FIELDS + _SLOT_FIELDS * slots,), dtype=np.int64, buffer=shm.buf)
+        header[:] = 0
+        header[_LATEST_SEQ] = -1
+        header[_LATEST_SLOT] = -1
+        header[_PINNED_SLOT] = -1
+        header[_NUM_SLOTS] = slots
+        header[_CAPACITY] = capacity
+        # Grace period until the writer's first beat
+        header[_HEARTBEAT] = time.time_ns()
+        header[_GLOBAL_FIELDS::_SLOT_FIELDS] = -1
+        del header
+
+        logger.info(f"Created frame ring {name}: {slots} slots x {capacity / 1e6:.1f} MB")
+        return cls(shm, lock, owner=True)
+
+    @classmethod
+    def attach(cls, name: str, lock) -> "SharedFrameRing":
+        """Attach to a ring created by another process."""
+        return cls(_attach(name), lock, owner=False)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def _slot_field(self, slot: int, field: int) -> int:
+        return _GLOBAL_FIELDS + slot * _SLOT_FIELDS + field
+
+    def _slot_view(self, slot: int, shape: Tuple[int, ...]) -> np.ndarray:
+        offset = self._data_offset + slot * self.capacity
+        return np.ndarray(shape, dtype=np.uint8, buffer=self.shm.buf, offset=offset)
+
+    # ---------------------------------------------------------------- writer
+
+    def beat(self):
+        """Record that the writer is alive (also done by every commit)."""
+        self.header[_HEARTBEAT] = time.time_ns()
+
+    def set_connected(self):
+        """Publish that the writer's source is connected."""
+        self.header[_CONNECTED_SINCE] = time.time_ns()
+
+    def set_disconnected(self):
+        """Publish a connection failure of the writer's source."""
+        self.header[_CONNECTED_SINCE] = 0
+        self.header[_RECONNECTS] += 1
+
+    def fits(self, shape: Tuple[int, ...]) -> bool:
+        """Whether a uint8 frame of this shape fits in a slot."""
+        return int(np.prod(shape)) <= self.capacity
+
+    @contextmanager
+    def _write_lock(self):
+        """Hold the lock as the writer, taking over one orphaned by a killed writer."""
+        if not self.lock.acquire(timeout=_STALE_LOCK_TIMEOUT):
+            # Each ring has one writer and the reader never blocks, so the
+            # holder is a previous writer process that no longer exists
+            logger.warning(f"Frame ring {self.name}: Taking over a lock held for {_STALE_LOCK_TIMEOUT}s")
+        try:
+            yield
+        finally:
+            self.lock.release()
+
+    def begin_write(self, shape: Tuple[int, ...]) -> np.ndarray:
+        """
+        Reserve a free slot and return a writable view of it.
+
+        The slot is neither the latest frame nor the one pinned by the reader.
+        Call commit() once the frame has been written.
+        """
+        if not self.fits(shape):
+            raise ValueError(f"Frame {shape} exceeds ring slot capacity {self.capacity}")
+
+        with self._write_lock():
+            latest = int(self.header[_LATEST_SLOT])
+            pinned = int(self.header[_PINNED_SLOT])
+            start = (latest + 1) % self.slots
+            for i in range(self.slots):
+                slot = (start + i) % self.slots
+                if slot != latest and slot != pinned:
+                    break
+            self.header[self._slot_field(slot, 0)] = _SLOT_WRITING
+
+        self._write_slot = slot
+        self._write_shape = tuple(shape)
+        return self._slot_view(slot, self._write_shape)
+
+    def commit(self, capture_time_ns: Optional[int] = None):
+        """Publish the frame written since begin_write()."""
+        slot = self._write_slot
+        if slot is None:
+            return
+        shape = self._write_shape + (1,) * (3 - len(self._write_shape))
+
+        with self._write_lock():
+            seq = int(self.header[_LATEST_SEQ]) + 1
+            base = self._slot_field(slot, 0)
+            self.header[base + 1] = shape[0]
+            self.header[base + 2] = shape[1]
+            self.header[base + 3] = shape[2]
+            self.header[base + 4] = capture_time_ns or time.time_ns()
+            self.header[base] = seq
+            self.header[_LATEST_SLOT] = slot
+            self.header[_LATEST_SEQ] = seq
+
+        self.beat()
+        self._write_slot = None
+
+    # ---------------------------------------------------------------- reader
+
+    def read_latest(self, after_seq: int = -1) -> Optional[Tuple[int, np.ndarray, float]]:
+        """
+        Pin and return the newest frame if it is newer than after_seq.
+
+        The returned array is a view into shared memory. It stays valid until
+        the next read_latest() or release() call.
+
+        Returns:
+            (sequence number, frame view, capture time in epoch seconds), or
+            None if there is no newer frame or the writer holds the lock
+        """
+        # Unlocked peek: a torn read at worst delays a new frame by one poll
+        if int(self.header[_LATEST_SEQ]) <= after_seq:
+            return None
+        if not self.lock.acquire(block=False):
+            self.lock_misses += 1
+            return None
+        try:
+            seq = int(self.header[_LATEST_SEQ])
+            if seq < 0 or seq <= after_seq:
+                return None
+            slot = int(self.header[_LATEST_SLOT])
+            base = self._slot_field(slot, 0)
+            height = int(self.header[base + 1])
+            width = int(self.header[base + 2])
+            channels = int(self.header[base + 3])
+            capture_ns = int(self.header[base + 4])
+            self.header[_PINNED_SLOT] = slot
+        finally:
+            self.lock.release()
+
+        shape = (height, width) if channels == 1 else (height, width, channels)
+        return seq, self._slot_view(slot, shape), capture_ns / 1e9
+
+    def release(self):
+        """
+        Unpin the frame returned by the last read_latest().
+
+        Best effort: if the writer holds the lock the pin stays until the
+        next read, which only keeps one slot out of rotation meanwhile.
+        """
+        if not self.lock.acquire(block=False):
+            self.lock_misses += 1
+            return
+        try:
+            self.header[_PINNED_SLOT] = -1
+        finally:
+            self.lock.release()
+
+    @property
+    def latest_seq(self) -> int:
+        return int(self.header[_LATEST_SEQ])
+
+    def connection(self) -> Tuple[Optional[float], int]:
+        """(epoch seconds the source connected or None while disconnected, reconnect count)"""
+        since = int(self.header[_CONNECTED_SINCE])
+        return (since / 1e9 if since else None), int(self.header[_RECONNECTS])
+
+    @property
+    def heartbeat(self) -> float:
+        """Epoch seconds of the writer's last beat."""
+        return int(self.header[_HEARTBEAT]) / 1e9
+
+    def close(self):
+        """Detach from the block, unlinking it if this process created it."""
+        self.header = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # Frame views still reference the buffer; they keep it mapped
+            pass
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
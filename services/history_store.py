@@ -0,0 +1,336 @@
+"""
+History Store
+
+Append-only local history of per-frame detection summaries.
+
+Each processed frame adds one row: its timestamp and the number of
+detections per canonical class. Rows are buffered in memory and appended
+in batches to columnar files partitioned by hour and camera:
+
+    <history_dir>/<YYYYMMDDHH UTC>/<camera>/ts.f8      float64 timestamps
+    <history_dir>/<YYYYMMDDHH UTC>/<camera>/counts.u1  uint8 (rows, classes)
+
+Within a file timestamps are in append order, so a time range is found
+with a binary search on a memory-mapped timestamp column and only that
+slice is read. Retention drops whole hour partitions.
+"""
+
+import asyncio
+import logging
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import quote, unquote
+import numpy as np
+
+from core import Config
+from core.executors import IO, executors
+from core.ppe import LABELS, PPEClass
+
+logger = logging.getLogger(__name__)
+
+_TS_FILE = "ts.f8"
+_COUNTS_FILE = "counts.u1"
+_HOUR_FORMAT = "%Y%m%d%H"
+# Upper bound on the buckets of one aggregated query
+MAX_BUCKETS = 100000
+
+
+def _partition_name(hour: int) -> str:
+    return datetime.fromtimestamp(hour * 3600, tz=timezone.utc).strftime(_HOUR_FORMAT)
+
+
+def _partition_hour(name: str) -> Optional[int]:
+    try:
+        moment = datetime.strptime(name, _HOUR_FORMAT).replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+    return int(moment.timestamp()) // 3600
+
+
+def _map(path: str, dtype, rows: int, shape: Tuple[int, ...] = ()) -> np.ndarray:
+    if rows == 0:
+        return np.zeros((0,) + shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=(rows,) + shape)
+
+
+class HistoryStore:
+    """Batched columnar writer and range reader of detection history."""
+
+    def __init__(self, config: Config):
+        self.root = config.history_dir
+        self.retention_hours = config.history_retention_hours
+        self.flush_interval = config.history_flush_interval
+        self.classes = len(LABELS)
+
+        # camera_id -> (timestamps, count rows) not yet on disk
+        self._pending: Dict[str, Tuple[List[float], List[np.ndarray]]] = {}
+        self.flusher: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+
+        self.rows_written = 0
+        self.flushes = 0
+        self.flush_seconds = 0.0
+
+        os.makedirs(self.root, exist_ok=True)
+
+    def add(self, camera_id: str, timestamp: float, class_ids: np.ndarray):
+        """Record one processed frame's detections (canonical class ids)."""
+        counts = np.bincount(class_ids, minlength=self.classes)
+        pending = self._pending.get(camera_id)
+        if pending is None:
+            pending = self._pending[camera_id] = ([], [])
+        pending[0].append(timestamp)
+        pending[1].append(np.minimum(counts, 255).astype(np.uint8))
+
+    def _take_pending(self) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        pending, self._pending = self._pending, {}
+        return {
+            camera_id: (np.array(ts, dtype=np.float64), np.stack(rows))
+            for camera_id, (ts, rows) in pending.items() if ts
+        }
+
+    def _write(self, batches: Dict[str, Tuple[np.ndarray, np.ndarray]]) -> int:
+        """Append batches to their hour/camera partitions. Returns rows written."""
+        written = 0
+        for camera_id, (ts, counts) in batches.items():
+            hours = (ts // 3600).astype(np.int64)
+            # Rows are in time order, so each hour is one contiguous run
+            bounds = np.flatnonzero(np.diff(hours)) + 1
+            for run_ts, run_counts, hour in zip(
+                np.split(ts, bounds), np.split(counts, bounds), hours[np.r_[0, bounds]]
+            ):
+                directory = os.path.join(self.root, _partition_name(int(hour)), quote(camera_id, safe=""))
+                os.makedirs(directory, exist_ok=True)
+                # Timestamps last: a reader never sees a row whose counts are missing
+                with open(os.path.join(directory, _COUNTS_FILE), "ab") as f:
+                    f.write(run_counts.tobytes())
+                with open(os.path.join(directory, _TS_FILE), "ab") as f:
+                    f.write(run_ts.tobytes())
+                written += len(run_ts)
+        return written
+
+    def _prune(self):
+        """Drop hour partitions older than the retention period."""
+        if self.retention_hours <= 0:
+            return
+        oldest = int(time.time()) // 3600 - self.retention_hours
+        for name in os.listdir(self.root):
+            hour = _partition_hour(name)
+            if hour is not None and hour < oldest:
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+                logger.info(f"History: dropped partition {name}")
+
+    async def flush(self):
+        """Write buffered rows to disk and apply retention."""
+        async with self._flush_lock:
+            batches = self._take_pending()
+            started = time.perf_counter()
+            try:
+                if batches:
+                    self.rows_written += await executors.run(IO, self._write, batches)
+                await executors.run(IO, self._prune)
+            except Exception as e:
+                logger.error(f"History: failed to write batch: {e}", exc_info=True)
+                return
+            self.flushes += 1
+            self.flush_seconds += time.perf_counter() - started
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self):
+        if self.flusher is None:
+            self.flusher = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self.flusher:
+            self.flusher.cancel()
+            await asyncio.gather(self.flusher, return_exceptions=True)
+            self.flusher = None
+        await self.flush()
+
+    def _open_partition(self, directory: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Memory-mapped columns of one hour/camera partition."""
+        ts_path = os.path.join(directory, _TS_FILE)
+        counts_path = os.path.join(directory, _COUNTS_FILE)
+        try:
+            rows = min(
+                os.path.getsize(ts_path) // 8,
+                os.path.getsize(counts_path) // self.classes
+            )
+        except OSError:
+            rows = 0
+        return (
+            _map(ts_path, np.float64, rows),
+            _map(counts_path, np.uint8, rows, (self.classes,))
+        )
+
+    def _runs(
+        self,
+        start: float,
+        end: float,
+        camera_ids: Optional[Iterable[str]] = None
+    ) -> Iterator[Tuple[str, np.ndarray, np.ndarray]]:
+        """
+        (camera_id, timestamps, counts) runs with start <= ts < end, in time
+        order per camera: flushed partitions first, then rows not yet flushed.
+        Partition runs are views of the memory-mapped files.
+        """
+        wanted = set(camera_ids) if camera_ids else None
+        first, last = int(start) // 3600, int(end) // 3600
+        for name in sorted(os.listdir(self.root)):
+            hour = _partition_hour(name)
+            if hour is None or not first <= hour <= last:
+                continue
+            partition = os.path.join(self.root, name)
+            for entry in sorted(os.listdir(partition)):
+                camera_id = unquote(entry)
+                if wanted is not None and camera_id not in wanted:
+                    continue
+                ts, counts = self._open_partition(os.path.join(partition, entry))
+                lo, hi = np.searchsorted(ts, [start, end])
+                if hi > lo:
+                    yield camera_id, ts[lo:hi], counts[lo:hi]
+
+        # Queries run in a worker thread while the loop keeps appending
+        for camera_id, (ts, rows) in list(self._pending.items()):
+            n = min(len(ts), len(rows))
+            if not n or (wanted is not None and camera_id not in wanted):
+                continue
+            ts_arr = np.array(ts[:n], dtype=np.float64)
+            keep = (ts_arr >= start) & (ts_arr < end)
+            if keep.any():
+                yield camera_id, ts_arr[keep], np.stack(rows[:n])[keep]
+
+    def read(
+        self,
+        start: float,
+        end: float,
+        camera_ids: Optional[Iterable[str]] = None
+    ) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        """
+        Rows of the time range [start, end), including rows not yet flushed.
+
+        Returns:
+            camera_id -> (timestamps, counts per class)
+        """
+        parts: Dict[str, List[Tuple[np.ndarray, np.ndarray]]] = {}
+        for camera_id, ts, counts in self._runs(start, end, camera_ids):
+            parts.setdefault(camera_id, []).append((ts, counts))
+        return {
+            camera_id: (
+                np.concatenate([p[0] for p in camera_parts]),
+                np.concatenate([p[1] for p in camera_parts])
+            )
+            for camera_id, camera_parts in parts.items()
+        }
+
+    def query(
+        self,
+        start: float,
+        end: float,
+        camera_ids: Optional[Iterable[str]] = None,
+        bucket: float = 60.0,
+        limit: int = 1000
+    ) -> Dict:
+        """
+        Detection history of a time range.
+
+        Args:
+            start, end: Epoch seconds, end exclusive
+            camera_ids: Cameras to include (None = all)
+            bucket: Aggregate into buckets of this many seconds; 0 returns
+                individual frame rows (at most `limit` per camera, newest first)
+            limit: Row cap per camera in raw mode
+
+        Raises:
+            ValueError: If the range would have more than MAX_BUCKETS buckets.
+        """
+        started = time.perf_counter()
+        if bucket <= 0:
+            cameras = {
+                camera_id: {
+                    "rows": [
+                        {"t": t, "counts": {LABELS[k]: n for k, n in enumerate(row) if n}}
+                        for t, row in zip(ts[::-1][:limit].tolist(), counts[::-1][:limit].tolist())
+                    ]
+                }
+                for camera_id, (ts, counts) in sorted(self.read(start, end, camera_ids).items())
+            }
+        else:
+            cameras = self._aggregate(start, end, camera_ids, bucket)
+        return {
+            "start": start,
+            "end": end,
+            "bucket": bucket,
+            "cameras": cameras,
+            "query_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+
+    def _aggregate(
+        self,
+        start: float,
+        end: float,
+        camera_ids: Optional[Iterable[str]],
+        bucket: float
+    ) -> Dict:
+        """Per-camera frame counts, per-class sums and peak people per time bucket."""
+        buckets = int(np.ceil((end - start) / bucket))
+        if buckets > MAX_BUCKETS:
+            raise ValueError(f"Range has {buckets} buckets, at most {MAX_BUCKETS} allowed")
+        edges = start + bucket * np.arange(buckets + 1)
+        edges[-1] = end
+
+        totals: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+        for camera_id, ts, counts in self._runs(start, end, camera_ids):
+            if camera_id not in totals:
+                totals[camera_id] = (
+                    np.zeros(buckets, dtype=np.int64),
+                    np.zeros((buckets, self.classes), dtype=np.int64),
+                    np.zeros(buckets, dtype=np.int64),
+                )
+            frames, sums, max_people = totals[camera_id]
+            # Bucket boundaries by binary search; no per-row arithmetic
+            sizes = np.diff(np.searchsorted(ts, edges))
+            filled = np.flatnonzero(sizes)
+            firsts = np.r_[0, np.cumsum(sizes[filled])[:-1]]
+            frames[filled] += sizes[filled]
+            sums[filled] += np.add.reduceat(counts, firsts, axis=0, dtype=np.int64)
+            np.maximum.at(
+                max_people, filled, np.maximum.reduceat(counts[:, PPEClass.PERSON], firsts)
+            )
+
+        cameras = {}
+        for camera_id, (frames, sums, max_people) in sorted(totals.items()):
+            filled = np.flatnonzero(frames)
+            cameras[camera_id] = {
+                "buckets": [
+                    {
+                        "start": float(edges[i]),
+                        "frames": n,
+                        "max_people": people,
+                        "counts": {LABELS[k]: v for k, v in enumerate(row) if v},
+                    }
+                    for i, n, people, row in zip(
+                        filled.tolist(),
+                        frames[filled].tolist(),
+                        max_people[filled].tolist(),
+                        sums[filled].tolist()
+                    )
+                ]
+            }
+        return cameras
+
+    def stats(self) -> Dict:
+        return {
+            "rows_pending": sum(len(ts) for ts, _ in self._pending.values()),
+            "rows_written": self.rows_written,
+            "flushes": self.flushes,
+            "flush_ms_avg": round(self.flush_seconds / self.flushes * 1000, 2) if self.flushes else 0.0,
+            "partitions": len([n for n in os.listdir(self.root) if _partition_hour(n) is not None]),
+        }
@@ -0,0 +1,350 @@
+"""
+Offline Video Analysis
+
+Audits recorded footage as fast as the hardware allows. Unlike a file
+camera source, frames are not paced to real time and the file is read
+once. Long files are split into segments that worker processes analyse in
+parallel, each with its own AIClient and ViolationEngine, so the cascade
+and violation logic are exactly those of the live service.
+
+Every segment starts a little early (--overlap, default: debounce plus
+three smoothing time constants) so tracks and debounce timers are warmed
+up at its start; alerts inside that warm-up belong to the previous segment
+and are dropped. Person tracks restart at segment boundaries, so person IDs
+carry the segment number.
+
+Example usage:
+
+    python -m services.offline_analysis videos/test1.mp4 --workers 4 --output audit
+
+writes audit.jsonl and audit.csv (one row per violation) and prints
+throughput. Snapshots of the violations are saved with --snapshots DIR.
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import math
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import cv2
+
+from core import Config
+from .ai_client import HAS_YOLO, AIClient
+from .violation_engine import ViolationEngine
+
+logger = logging.getLogger(__name__)
+
+REPORT_FIELDS = ["video", "segment", "time", "timecode", "person_id", "missing_ppe", "bbox", "snapshot"]
+
+
+@dataclass
+class Segment:
+    """A frame range of one video, analysed by one worker."""
+    video: str
+    index: int
+    start_frame: int  # First frame whose alerts are reported
+    end_frame: int  # Exclusive
+    warmup_frame: int  # First frame processed (<= start_frame)
+    fps: float  # Frames per second to analyse (0 = every frame)
+    snapshot_dir: Optional[str] = None
+
+
+class RecordingSync:
+    """Stands in for CloudSync and records the violations the engine raises."""
+
+    def __init__(self, segment: Segment, start_time: float):
+        self.segment = segment
+        self.start_time = start_time
+        self.video_time = 0.0
+        self.violations: List[Dict] = []
+
+    async def upload_violation(self, camera_id, person_id, missing_ppe, frame, bbox, **kwargs) -> Optional[str]:
+        # Alerts during the warm-up are the previous segment's
+        if self.video_time < self.start_time:
+            return None
+        snapshot = None
+        if self.segment.snapshot_dir:
+            snapshot = os.path.join(
+                self.segment.snapshot_dir,
+                f"{self.segment.video}_{self.video_time:09.2f}_{person_id}_{missing_ppe}.jpg"
+            )
+            cv2.imwrite(snapshot, frame)
+        self.violations.append({
+            "time": round(self.video_time, 3),
+            "person_id": person_id,
+            "missing_ppe": missing_ppe,
+            "bbox": [round(float(v), 1) for v in bbox],
+            "snapshot": snapshot,
+        })
+        return snapshot
+
+    async def link_violation(self, *args, **kwargs) -> bool:
+        return True
+
+
+def _timecode(seconds: float) -> str:
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(int(minutes), 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:06.3f}"
+
+
+def plan_segments(
+    path: str,
+    workers: int,
+    segment_seconds: float,
+    overlap: float,
+    fps: float,
+    snapshot_dir: Optional[str] = None
+) -> List[Segment]:
+    """Split a video into at least `workers` segments of at most `segment_seconds`."""
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError(f"Could not open video: {path}")
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    video_fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    cap.release()
+    if total <= 0:
+        raise ValueError(f"Could not determine the length of {path}")
+
+    count = max(workers, math.ceil(total / video_fps / segment_seconds)) if segment_seconds > 0 else workers
+    count = max(1, min(count, total))
+    bounds = [round(i * total / count) for i in range(count + 1)]
+    warmup = round(overlap * video_fps)
+    name = os.path.splitext(os.path.basename(path))[0]
+    return [
+        Segment(name, i, bounds[i], bounds[i + 1], max(0, bounds[i] - warmup), fps, snapshot_dir)
+        for i in range(count)
+    ]
+
+
+async def _analyse(segment: Segment, path: str, config: Config) -> Dict:
+    cap = cv2.VideoCapture(path)
+    video_fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+
+    client = AIClient(config)
+    sync = RecordingSync(segment, segment.start_frame / video_fps)
+    engine = ViolationEngine(config, sync)
+    engine.set_active_session(f"offline-{segment.video}")
+    camera_id = f"{segment.video}#{segment.index}"
+
+    step = max(1, round(video_fps / segment.fps)) if segment.fps > 0 else 1
+    cap.set(cv2.CAP_PROP_POS_FRAMES, segment.warmup_frame)
+
+    analysed = 0
+    started = time.perf_counter()
+    index = segment.warmup_frame
+    try:
+        while index < segment.end_frame:
+            # Skipped frames are only grabbed, not converted
+            if (index - segment.warmup_frame) % step:
+                if not cap.grab():
+                    break
+                index += 1
+                continue
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if frame.shape[1] != config.frame_width or frame.shape[0] != config.frame_height:
+                frame = cv2.resize(frame, (config.frame_width, config.frame_height))
+            detections = await client.detect(frame)
+            sync.video_time = index / video_fps
+            await engine.process_detections(camera_id, frame, detections, timestamp=sync.video_time)
+            analysed += 1
+            index += 1
+    finally:
+        cap.release()
+
+    return {
+        "segment": segment.index,
+        "frames": index - segment.warmup_frame,
+        "analysed": analysed,
+        # Warm-up frames cost time but aren't part of the segment
+        "video_seconds": max(0, index - segment.start_frame) / video_fps,
+        "seconds": time.perf_counter() - started,
+        "violations": sync.violations,
+    }
+
+
+def analyse_segment(segment: Segment, path: str, threads: int) -> Dict:
+    """Worker entry point: analyse one segment with a fresh cascade and engine."""
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    # Every violation is in the report; don't log them too
+    logging.getLogger("services.violation_engine").setLevel(logging.ERROR)
+    cv2.setNumThreads(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    return asyncio.run(_analyse(segment, path, Config(require_supabase=False)))
+
+
+def analyse_video(
+    path: str,
+    workers: int,
+    segment_seconds: float,
+    overlap: float,
+    fps: float,
+    snapshot_dir: Optional[str] = None
+) -> Dict:
+    """
+    Analyse one video across worker processes.
+
+    Returns:
+        Violations in time order and throughput statistics.
+    """
+    segments = plan_segments(path, workers, segment_seconds, overlap, fps, snapshot_dir)
+    workers = min(workers, len(segments))
+    # Split the cores between workers instead of letting every model use all of them
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    logger.info(f"{path}: {len(segments)} segment(s) on {workers} worker(s)")
+
+    started = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn")) as pool:
+        futures = [pool.submit(analyse_segment, segment, path, threads) for segment in segments]
+        for future in futures:
+            result = future.result()
+            results.append(result)
+            logger.info(
+                f"Segment {result['segment'] + 1}/{len(segments)}: {result['analysed']} frames analysed "
+                f"in {result['seconds']:.1f}s, {len(result['violations'])} violation(s)"
+            )
+    wall = time.perf_counter() - started
+
+    video = segments[0].video
+    violations = [
+        {"video": video, "segment": result["segment"], **violation}
+        for result in results for violation in result["violations"]
+    ]
+    for violation in violations:
+        violation["timecode"] = _timecode(violation["time"])
+    video_seconds = sum(r["video_seconds"] for r in results)
+    analysed = sum(r["analysed"] for r in results)
+    return {
+        "violations": violations,
+        "stats": {
+            "video": video,
+            "segments": len(segments),
+            "workers": workers,
+            "frames_analysed": analysed,
+            "video_seconds": round(video_seconds, 1),
+            "wall_seconds": round(wall, 1),
+            "analysed_fps": round(analysed / wall, 1) if wall else 0.0,
+            "realtime_factor": round(video_seconds / wall, 2) if wall else 0.0,
+        },
+    }
+
+
+def write_report(violations: List[Dict], output: str, formats: List[str]) -> List[str]:
+    """Write violations as <output>.jsonl and/or <output>.csv. Returns the files written."""
+    written = []
+    if "jsonl" in formats:
+        path = f"{output}.jsonl"
+        with open(path, "w") as f:
+            for violation in violations:
+                f.write(json.dumps({key: violation.get(key) for key in REPORT_FIELDS}) + "\n")
+        written.append(path)
+    if "csv" in formats:
+        path = f"{output}.csv"
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+            writer.writeheader()
+            for violation in violations:
+                row = {key: violation.get(key) for key in REPORT_FIELDS}
+                row["bbox"] = " ".join(str(v) for v in violation["bbox"])
+                writer.writerow(row)
+        written.append(path)
+    return written
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Analyse recorded video for PPE violations faster than real time."
+    )
+    parser.add_argument("videos", nargs="+", help="Video files to analyse.")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Worker processes (default: one per core).",
+    )
+    parser.add_argument(
+        "--segment-seconds",
+        type=float,
+        default=600.0,
+        help="Maximum segment length; files are split into at least --workers segments.",
+    )
+    parser.add_argument(
+        "--overlap",
+        type=float,
+        default=None,
+        help="Warm-up seconds before each segment (default: debounce + 3x PPE smoothing).",
+    )
+    parser.add_argument(
+        "--fps",
+        type=float,
+        default=None,
+        help="Frames per second to analyse (default: FPS from the environment, 0 = every frame).",
+    )
+    parser.add_argument("--output", default="offline_report", help="Report path without extension.")
+    parser.add_argument(
+        "--format",
+        default="jsonl,csv",
+        help="Comma-separated report formats: jsonl, csv.",
+    )
+    parser.add_argument("--snapshots", default=None, help="Directory to save violation snapshots in.")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    args = parse_args(argv)
+    config = Config(require_supabase=False)
+    if config.use_mock_detector or not HAS_YOLO:
+        logger.warning("Detector is in MOCK mode; the report will contain mock detections.")
+
+    overlap = args.overlap
+    if overlap is None:
+        overlap = config.violation_debounce_seconds + 3 * config.ppe_smoothing_seconds
+    fps = config.fps if args.fps is None else args.fps
+    if args.snapshots:
+        os.makedirs(args.snapshots, exist_ok=True)
+
+    violations = []
+    for path in args.videos:
+        try:
+            result = analyse_video(
+                path, max(1, args.workers), args.segment_seconds, overlap, fps, args.snapshots
+            )
+        except ValueError as e:
+            logger.error(str(e))
+            return 1
+        violations.extend(result["violations"])
+        stats = result["stats"]
+        print(
+            f"{stats['video']}: {stats['video_seconds']}s of video in {stats['wall_seconds']}s "
+            f"({stats['realtime_factor']}x real time, {stats['analysed_fps']} frames/s, "
+            f"{stats['segments']} segment(s) on {stats['workers']} worker(s)), "
+            f"{len(result['violations'])} violation(s)"
+        )
+
+    formats = [f.strip() for f in args.format.split(",") if f.strip()]
+    for path in write_report(violations, args.output, formats):
+        print(f"Wrote {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
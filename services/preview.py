@@ -0,0 +1,152 @@
+"""
+Live Preview
+
+MJPEG preview of what each camera sees. Frames are encoded at most once per
+preview interval per camera, and only while someone is watching; every
+viewer of a camera is sent the same JPEG bytes. Viewers always get the
+latest frame, so a slow client skips frames instead of building a backlog.
+"""
+
+import asyncio
+import logging
+import time
+from typing import AsyncIterator, Dict, Optional
+import cv2
+import numpy as np
+
+from core import Config
+from core.executors import ENCODE, executors
+from core.ppe import LABELS, PPEClass
+
+logger = logging.getLogger(__name__)
+
+BOUNDARY = "frame"
+
+# BGR box colours
+_PERSON_COLOR = (0, 200, 0)
+_PPE_COLOR = (255, 128, 0)
+
+
+class _CameraPreview:
+    """Latest encoded frame of one camera and its viewers."""
+
+    def __init__(self):
+        self.viewers = 0
+        self.jpeg: Optional[bytes] = None
+        self.seq = 0
+        self.last_encode = 0.0
+        # Replaced on every publish; waiting viewers hold the old one
+        self.updated = asyncio.Event()
+
+
+class PreviewBroadcaster:
+    """Shares one JPEG encode per camera frame between all preview viewers."""
+
+    def __init__(self, config: Config):
+        self.interval = 1.0 / config.preview_fps if config.preview_fps > 0 else 0.0
+        self.width = config.preview_width
+        self.quality = config.preview_quality
+        self.draw_boxes = config.preview_draw_boxes
+        self.cameras: Dict[str, _CameraPreview] = {}
+
+    def _camera(self, camera_id: str) -> _CameraPreview:
+        if camera_id not in self.cameras:
+            self.cameras[camera_id] = _CameraPreview()
+        return self.cameras[camera_id]
+
+    def has_viewers(self, camera_id: str) -> bool:
+        preview = self.cameras.get(camera_id)
+        return preview is not None and preview.viewers > 0
+
+    def wants_frame(self, camera_id: str) -> bool:
+        """Whether a frame from this camera should be published now."""
+        preview = self.cameras.get(camera_id)
+        if preview is None or preview.viewers == 0:
+            return False
+        return time.monotonic() - preview.last_encode >= self.interval
+
+    def preview_size(self, width: int, height: int) -> tuple:
+        """Preview resolution for a frame, keeping the aspect ratio."""
+        if self.width <= 0 or width <= self.width:
+            return width, height
+        return self.width, max(1, round(height * self.width / width))
+
+    def _annotate(self, image: np.ndarray, detections: np.ndarray, scale: float):
+        """Draw detection boxes in place."""
+        boxes = (detections["xyxy"] * scale).astype(int).tolist()
+        for class_id, confidence, (x1, y1, x2, y2) in zip(
+            detections["class_id"].tolist(), detections["confidence"].tolist(), boxes
+        ):
+            name = LABELS[class_id]
+            color = _PERSON_COLOR if class_id == PPEClass.PERSON else _PPE_COLOR
+            cv2.rectangle(image, (x1, y1), (x2, y2), color, 2)
+            cv2.putText(
+                image,
+                f"{name} {confidence:.2f}",
+                (x1, max(12, y1 - 4)),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.45,
+                color,
+                1
+            )
+
+    async def publish(
+        self,
+        camera_id: str,
+        image: np.ndarray,
+        detections: np.ndarray,
+        scale: float = 1.0
+    ):
+        """
+        Encode a preview frame and hand it to all viewers.
+
+        Args:
+            camera_id: Camera the frame belongs to
+            image: Preview-sized frame owned by the caller; boxes are drawn on it
+            detections: Detection array in source frame coordinates
+            scale: Factor from source frame to preview coordinates
+        """
+        preview = self._camera(camera_id)
+        preview.last_encode = time.monotonic()
+
+        if self.draw_boxes and len(detections):
+            self._annotate(image, detections, scale)
+
+        success, buffer = await executors.run(
+            ENCODE,
+            cv2.imencode, ".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, self.quality]
+        )
+        if not success:
+            logger.warning(f"Camera {camera_id}: Failed to encode preview frame")
+            return
+
+        preview.jpeg = buffer.tobytes()
+        preview.seq += 1
+        updated, preview.updated = preview.updated, asyncio.Event()
+        updated.set()
+
+    async def stream(self, camera_id: str) -> AsyncIterator[bytes]:
+        """MJPEG multipart stream of a camera's preview for one viewer."""
+        preview = self._camera(camera_id)
+        preview.viewers += 1
+        logger.info(f"Camera {camera_id}: Preview viewer connected ({preview.viewers} watching)")
+        last_seq = 0
+        try:
+            while True:
+                if preview.seq == last_seq:
+                    await preview.updated.wait()
+                    continue
+                # Always the latest frame; anything published meanwhile is skipped
+                last_seq = preview.seq
+                jpeg = preview.jpeg
+                yield (
+                    f"--{BOUNDARY}\r\n"
+                    f"Content-Type: image/jpeg\r\n"
+                    f"Content-Length: {len(jpeg)}\r\n\r\n"
+                ).encode()
+                # The shared encode is sent as is, not copied per viewer
+                yield jpeg
+                yield b"\r\n"
+        finally:
+            preview.viewers -= 1
+            logger.info(f"Camera {camera_id}: Preview viewer disconnected")
@@ -0,0 +1,335 @@
+"""
+INT8 Model Variants
+
+Post-training static INT8 quantization of the cascade models for CPU-only
+edge boxes, and a suite comparing the INT8 cascade against FP32.
+
+    export   Export each model's .pt weights to ONNX and quantize it with
+             onnxruntime, calibrated on the inputs that model actually sees
+             in the cascade (full frames for the person model, person/eye/
+             hand crops for the others) on frames sampled from the videos.
+             Writes models/<name>_int8.onnx next to the .pt files.
+    compare  Run the FP32 and INT8 cascades on the same sampled frames and
+             report latency, per-class detection agreement and agreement of
+             the per-person PPE decisions the violation engine would make.
+
+Select INT8 per model with MODEL_VARIANTS (e.g. "person:int8,coat:int8").
+
+Example usage:
+
+    python -m services.quantization export --frames 100
+    python -m services.quantization compare --frames 50
+
+Requires `onnx` and `onnxruntime` (not needed for FP32 inference).
+The detection head (last module of the network) stays in FP32: it
+concatenates box coordinates in pixels with class scores in [0, 1], which
+can't share one INT8 scale.
+"""
+
+import argparse
+import copy
+import logging
+import os
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from core import Config
+from core.ppe import PPE_ITEMS
+from .ai_client import DEFAULT_IMGSZ, MODEL_FILES, AIClient, find_model, model_file
+from .cascade_benchmark import DEFAULT_VIDEOS, format_report, run_variant, sample_frames
+from .detections import from_dicts, iou_matrix
+from .violation_engine import match_ppe
+
+logger = logging.getLogger(__name__)
+
+# Letterbox padding value used by ultralytics
+_PAD = 114
+# People of the two cascades are the same person above this IoU
+PERSON_MATCH_IOU = 0.5
+
+
+class RecordingClient(AIClient):
+    """AIClient that keeps the images each model is called with, for calibration."""
+
+    def __init__(self, config: Config):
+        super().__init__(config)
+        self.inputs: Dict[str, List[np.ndarray]] = defaultdict(list)
+
+    def _predict(self, name: str, image: np.ndarray):
+        self.inputs[name].append(image.copy())
+        return super()._predict(name, image)
+
+
+def letterbox(image: np.ndarray, size: int) -> np.ndarray:
+    """Resize into a size x size square keeping the aspect ratio, as RGB NCHW float32 in [0, 1]."""
+    height, width = image.shape[:2]
+    scale = min(size / height, size / width)
+    resized = cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))))
+    canvas = np.full((size, size, 3), _PAD, dtype=np.uint8)
+    top = (size - resized.shape[0]) // 2
+    left = (size - resized.shape[1]) // 2
+    canvas[top:top + resized.shape[0], left:left + resized.shape[1]] = resized
+    return (canvas[:, :, ::-1].transpose(2, 0, 1)[None] / 255.0).astype(np.float32)
+
+
+def collect_calibration_inputs(
+    config: Config,
+    frames: List[np.ndarray],
+    samples: int
+) -> Dict[str, List[np.ndarray]]:
+    """Images every cascade model receives on the sampled frames (FP32), at most `samples` each."""
+    client = RecordingClient(config)
+    for frame in frames:
+        client._run_cascade_detection(frame)
+    inputs = {}
+    for name, images in client.inputs.items():
+        step = max(1, len(images) // samples)
+        inputs[name] = images[::step][:samples]
+        logger.info(f"Calibration: {len(inputs[name])} {name} inputs")
+    return inputs
+
+
+def quantize_model(
+    name: str,
+    images: List[np.ndarray],
+    imgsz: int,
+    per_channel: bool = True
+) -> Optional[str]:
+    """
+    Export one model to ONNX and quantize it to INT8 with static calibration.
+
+    Returns:
+        Path of the INT8 model, or None if the FP32 weights are missing.
+    """
+    import onnx
+    from onnxruntime.quantization import (
+        CalibrationDataReader, CalibrationMethod, QuantFormat, QuantType, quantize_static
+    )
+    from ultralytics import YOLO
+
+    weights = find_model(model_file(name))
+    if weights is None:
+        logger.warning(f"Model file {model_file(name)} not found, skipping {name}")
+        return None
+
+    yolo = YOLO(weights)
+    head = f"/model.{len(yolo.model.model) - 1}/"
+    fp32_path = yolo.export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+    fp32 = onnx.load(fp32_path)
+    input_name = fp32.graph.input[0].name
+    excluded = [node.name for node in fp32.graph.node if node.name.startswith(head)]
+
+    class FrameReader(CalibrationDataReader):
+        def __init__(self):
+            self._inputs = ({input_name: letterbox(image, imgsz)} for image in images)
+
+        def get_next(self):
+            return next(self._inputs, None)
+
+    int8_path = os.path.join(os.path.dirname(weights), model_file(name, "int8"))
+    started = time.perf_counter()
+    quantize_static(
+        fp32_path,
+        int8_path,
+        FrameReader(),
+        quant_format=QuantFormat.QDQ,
+        per_channel=per_channel,
+        weight_type=QuantType.QInt8,
+        activation_type=QuantType.QUInt8,
+        calibrate_method=CalibrationMethod.MinMax,
+        nodes_to_exclude=excluded,
+    )
+
+    # Keep the class names, stride and input size ultralytics reads from the metadata
+    int8 = onnx.load(int8_path)
+    del int8.metadata_props[:]
+    int8.metadata_props.extend(fp32.metadata_props)
+    onnx.save(int8, int8_path)
+
+    logger.info(
+        f"Quantized {name}: {int8_path} ({os.path.getsize(int8_path) / 1e6:.1f} MB, "
+        f"FP32 ONNX {os.path.getsize(fp32_path) / 1e6:.1f} MB, {len(excluded)} head nodes kept FP32, "
+        f"{time.perf_counter() - started:.0f}s)"
+    )
+    return int8_path
+
+
+def decision_agreement(
+    reference: List[List[Dict]],
+    candidate: List[List[Dict]],
+    iou_threshold: float
+) -> Dict[str, Dict[str, int]]:
+    """
+    Compare the per-person PPE decisions (worn / not worn) of two cascades.
+
+    People are paired across cascades by IoU; a person only one cascade
+    found counts as a disagreement for every item.
+
+    Returns:
+        PPE label -> {"agree", "total", "missing_only_candidate", "missing_only_reference"}
+    """
+    counts = {item.label: defaultdict(int) for item in PPE_ITEMS}
+    for ref_dets, cand_dets in zip(reference, candidate):
+        ref_people, ref_worn = match_ppe(from_dicts(ref_dets), iou_threshold)
+        cand_people, cand_worn = match_ppe(from_dicts(cand_dets), iou_threshold)
+        overlap = iou_matrix(ref_people["xyxy"], cand_people["xyxy"])
+
+        # Greedy pairing, best overlap first
+        pairs = []
+        while overlap.size and overlap.max() >= PERSON_MATCH_IOU:
+            r, c = np.unravel_index(np.argmax(overlap), overlap.shape)
+            pairs.append((r, c))
+            overlap[r, :] = -1.0
+            overlap[:, c] = -1.0
+        unpaired = len(ref_people) + len(cand_people) - 2 * len(pairs)
+
+        for i, item in enumerate(PPE_ITEMS):
+            item_counts = counts[item.label]
+            item_counts["total"] += len(pairs) + unpaired
+            for r, c in pairs:
+                if ref_worn[r, i] == cand_worn[c, i]:
+                    item_counts["agree"] += 1
+                elif ref_worn[r, i]:
+                    # Only the candidate would raise a violation
+                    item_counts["missing_only_candidate"] += 1
+                else:
+                    item_counts["missing_only_reference"] += 1
+    return {label: dict(values) for label, values in counts.items()}
+
+
+def format_decisions(agreement: Dict[str, Dict[str, int]]) -> str:
+    lines = ["  PPE decisions per person (vs FP32):"]
+    for label, values in agreement.items():
+        total = values.get("total", 0)
+        lines.append(
+            f"    {label:<12} agreement {values.get('agree', 0) / total if total else 1.0:.3f}  "
+            f"missing only in INT8 {values.get('missing_only_candidate', 0)}  "
+            f"missing only in FP32 {values.get('missing_only_reference', 0)}  ({total} decisions)"
+        )
+    return "\n".join(lines)
+
+
+def _parse_models(spec: Optional[str]) -> List[str]:
+    if not spec:
+        return list(MODEL_FILES)
+    models = [m.strip() for m in spec.split(",") if m.strip()]
+    unknown = [m for m in models if m not in MODEL_FILES]
+    if unknown:
+        raise ValueError(f"Unknown model(s) {unknown}, expected some of {list(MODEL_FILES)}")
+    return models
+
+
+def export(args: argparse.Namespace, config: Config, frames: List[np.ndarray]) -> int:
+    try:
+        import onnx  # noqa: F401
+        import onnxruntime  # noqa: F401
+    except ImportError:
+        logger.error("INT8 export needs onnx and onnxruntime: pip install onnx onnxruntime")
+        return 1
+
+    inputs = collect_calibration_inputs(config, frames, args.calibration_samples)
+    written = 0
+    for name in _parse_models(args.models):
+        if not inputs.get(name):
+            logger.warning(f"No calibration inputs for {name} (the cascade never called it), skipping")
+            continue
+        imgsz = config.model_imgsz.get(name, DEFAULT_IMGSZ)
+        if quantize_model(name, inputs[name], imgsz, per_channel=not args.per_tensor):
+            written += 1
+    print(f"Wrote {written} INT8 model(s); enable them with MODEL_VARIANTS, e.g. person:int8")
+    return 0 if written else 1
+
+
+def compare(args: argparse.Namespace, config: Config, frames: List[np.ndarray]) -> int:
+    fp32_config = copy.copy(config)
+    fp32_config.model_variants = {}
+    int8_config = copy.copy(config)
+    int8_config.model_variants = {name: "int8" for name in _parse_models(args.models)}
+
+    results = {}
+    for name, variant_config in (("fp32", fp32_config), ("int8", int8_config)):
+        client = AIClient(variant_config)
+        # run_variant sets input sizes on the client's config; keep the configured ones
+        results[name] = run_variant(
+            client, frames, dict(config.model_imgsz), config.adaptive_imgsz
+        )
+
+    reference, reference_latencies = results["fp32"]
+    print(format_report("fp32", reference, reference, reference_latencies))
+    detections, latencies = results["int8"]
+    print(format_report("int8", reference, detections, latencies))
+    speedup = np.mean(reference_latencies) / np.mean(latencies) if latencies else 0.0
+    print(f"  speedup vs FP32: {speedup:.2f}x")
+    print(format_decisions(decision_agreement(reference, detections, config.iou_threshold)))
+    return 0
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Create INT8 variants of the cascade models and compare them with FP32."
+    )
+    parser.add_argument("command", choices=["export", "compare"])
+    parser.add_argument(
+        "--video",
+        action="append",
+        help="Video file to sample frames from (repeatable). Defaults to the bundled videos.",
+    )
+    parser.add_argument("--frames", type=int, default=50, help="Frames to sample per video.")
+    parser.add_argument(
+        "--models",
+        default=None,
+        help="Comma-separated models to quantize/compare in INT8 (default: all).",
+    )
+    parser.add_argument(
+        "--calibration-samples",
+        type=int,
+        default=200,
+        help="Maximum calibration inputs per model (export).",
+    )
+    parser.add_argument(
+        "--per-tensor",
+        action="store_true",
+        help="Quantize weights per tensor instead of per channel (export).",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    args = parse_args(argv)
+    config = Config(require_supabase=False)
+
+    try:
+        _parse_models(args.models)
+    except ValueError as e:
+        logger.error(str(e))
+        return 1
+
+    if not AIClient(config).models:
+        logger.error("No models loaded; place the .pt files in models/ first.")
+        return 1
+
+    frames = sample_frames(
+        args.video or DEFAULT_VIDEOS,
+        args.frames,
+        config.frame_width,
+        config.frame_height,
+    )
+    if not frames:
+        logger.error("No frames sampled.")
+        return 1
+
+    if args.command == "export":
+        return export(args, config, frames)
+    return compare(args, config, frames)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,122 @@
+"""
+Region of Interest
+
+Per-camera ROI handling. Frames are cropped to the bounding region of the
+configured polygons before inference. After mapping back to full-frame
+coordinates, people whose box center falls outside the polygons are dropped,
+and so is every other box (PPE, hands, eyes) that overlaps no remaining
+person. A person straddling the ROI edge keeps all of their PPE.
+"""
+
+import logging
+from typing import Dict, List, Optional, Tuple
+import cv2
+import numpy as np
+
+from core.ppe import PPEClass
+
+logger = logging.getLogger(__name__)
+
+
+class RegionOfInterest:
+    """ROI made of one or more polygons in normalized (0-1) frame coordinates."""
+
+    def __init__(self, polygons: List[List[Tuple[float, float]]]):
+        self.polygons = [p for p in polygons if len(p) >= 3]
+
+        # Pixel geometry is cached per frame size: (w, h) -> (bounds, mask)
+        self._cache: Dict[Tuple[int, int], Tuple[Tuple[int, int, int, int], np.ndarray]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        """Whether any polygon is configured."""
+        return len(self.polygons) > 0
+
+    def _geometry(self, width: int, height: int) -> Tuple[Tuple[int, int, int, int], np.ndarray]:
+        """Get the pixel bounding region and mask for a frame size."""
+        key = (width, height)
+        if key in self._cache:
+            return self._cache[key]
+
+        scale = np.array([width, height], dtype=np.float32)
+        pixel_polygons = [
+            np.round(np.clip(np.array(p, dtype=np.float32), 0.0, 1.0) * scale).astype(np.int32)
+            for p in self.polygons
+        ]
+
+        points = np.concatenate(pixel_polygons)
+        x1, y1 = points.min(axis=0)
+        x2, y2 = points.max(axis=0)
+        x1, y1 = int(x1), int(y1)
+        x2, y2 = int(min(width, max(x2, x1 + 1))), int(min(height, max(y2, y1 + 1)))
+
+        # Mask covers only the bounding region, in crop-local coordinates
+        mask = np.zeros((y2 - y1, x2 - x1), dtype=np.uint8)
+        cv2.fillPoly(mask, [p - np.array([x1, y1], dtype=np.int32) for p in pixel_polygons], 1)
+
+        self._cache[key] = ((x1, y1, x2, y2), mask)
+        logger.debug(f"ROI prepared for {width}x{height}: bounds {(x1, y1, x2, y2)}")
+        return self._cache[key]
+
+    def crop(self, frame: np.ndarray) -> Tuple[np.ndarray, Tuple[int, int]]:
+        """
+        Crop a frame to the ROI bounding region.
+
+        Returns:
+            (view into frame, (offset_x, offset_y))
+        """
+        (x1, y1, x2, y2), _ = self._geometry(frame.shape[1], frame.shape[0])
+        return frame[y1:y2, x1:x2], (x1, y1)
+
+    def filter_detections(
+        self,
+        detections: np.ndarray,
+        frame_shape: Tuple[int, ...],
+        offset: Tuple[int, int]
+    ) -> np.ndarray:
+        """
+        Map crop-local detections back to full-frame space and drop those outside the mask.
+
+        Only person boxes are tested against the mask; other boxes are kept
+        if they overlap a kept person.
+
+        Args:
+            detections: Detection array with boxes relative to the crop (not modified)
+            frame_shape: Shape of the full frame the crop was taken from
+            offset: Crop offset returned by crop()
+
+        Returns:
+            A new array with the kept detections in full-frame coordinates
+        """
+        if not len(detections):
+            return detections
+
+        _, mask = self._geometry(frame_shape[1], frame_shape[0])
+        ox, oy = offset
+
+        xyxy = detections["xyxy"]
+        cx = ((xyxy[:, 0] + xyxy[:, 2]) / 2).astype(np.intp)
+        cy = ((xyxy[:, 1] + xyxy[:, 3]) / 2).astype(np.intp)
+        inside = (cx >= 0) & (cx < mask.shape[1]) & (cy >= 0) & (cy < mask.shape[0])
+        inside[inside] = mask[cy[inside], cx[inside]] > 0
+
+        # PPE follows the person it belongs to, wherever its own center is
+        is_person = detections["class_id"] == PPEClass.PERSON
+        people = xyxy[is_person & inside]
+        others = xyxy[~is_person]
+        overlap_w = np.minimum(others[:, None, 2], people[None, :, 2]) - np.maximum(others[:, None, 0], people[None, :, 0])
+        overlap_h = np.minimum(others[:, None, 3], people[None, :, 3]) - np.maximum(others[:, None, 1], people[None, :, 1])
+        keep = is_person & inside
+        keep[~is_person] = ((overlap_w > 0) & (overlap_h > 0)).any(axis=1)
+
+        kept = detections[keep]
+        kept["xyxy"] += np.array([ox, oy, ox, oy], dtype=np.float32)
+        return kept
+
+
+def build_roi(polygons: Optional[List[List[Tuple[float, float]]]]) -> Optional[RegionOfInterest]:
+    """Create a RegionOfInterest, or None when no polygons are configured."""
+    if not polygons:
+        return None
+    roi = RegionOfInterest(polygons)
+    return roi if roi.enabled else None
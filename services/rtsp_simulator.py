@@ -27,6 +27,9 @@ Then, in your `.env`:
     CAMERA_SOURCES=camera_0:rtsp://127.0.0.1:8554/test
 
 The edge controller will treat this exactly like an IP camera.
+
+To load-test with many cameras (and flaky links) without ffmpeg or an RTSP
+server, use services.stream_simulator instead.
 """
 
 import argparse
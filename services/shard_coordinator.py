@@ -0,0 +1,322 @@
+"""
+Shard Coordinator
+
+Divides the configured cameras between several edge controllers.
+
+Every node renews a membership lease. The owner of each camera is picked by
+rendezvous hashing over the live nodes, so adding or losing a node only moves
+that node's share of cameras. A node runs a camera only while it holds the
+camera's lease; when a node stops renewing, its membership and leases expire
+after the TTL and the remaining nodes take its cameras over.
+
+Leases live either in a local JSON file (several nodes on one box, or offline
+testing) or in Supabase tables (see schema.sql).
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Dict, FrozenSet, List, Optional, Set
+
+from core import Config
+from core.executors import LEASES, executors
+
+logger = logging.getLogger(__name__)
+
+try:
+    import fcntl
+
+    def _lock_file(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+    def _unlock_file(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+except ImportError:  # Windows
+    import msvcrt
+
+    def _lock_file(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+
+    def _unlock_file(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def rendezvous_owner(camera_id: str, nodes: List[str]) -> Optional[str]:
+    """Pick the node with the highest hash for this camera (highest random weight)."""
+    if not nodes:
+        return None
+    return max(
+        nodes,
+        key=lambda node: hashlib.sha1(f"{node}:{camera_id}".encode()).digest()
+    )
+
+
+class FileLeaseStore:
+    """Lease store backed by a JSON file guarded by an exclusive file lock."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock_path = f"{path}.lock"
+
+    @contextmanager
+    def _state(self):
+        """Read-modify-write the lease state under the file lock."""
+        with open(self.lock_path, "a+") as lock_file:
+            _lock_file(lock_file)
+            try:
+                try:
+                    with open(self.path, "r") as f:
+                        state = json.load(f)
+                except (FileNotFoundError, json.JSONDecodeError):
+                    state = {}
+                state.setdefault("nodes", {})
+                state.setdefault("leases", {})
+
+                yield state
+
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump(state, f)
+                os.replace(tmp_path, self.path)
+            finally:
+                _unlock_file(lock_file)
+
+    def heartbeat(self, node_id: str, expires_at: float):
+        with self._state() as state:
+            state["nodes"][node_id] = expires_at
+
+    def live_nodes(self, now: float) -> List[str]:
+        with self._state() as state:
+            # Drop expired members while we hold the lock
+            state["nodes"] = {n: exp for n, exp in state["nodes"].items() if exp > now}
+            return sorted(state["nodes"])
+
+    def try_acquire(self, camera_id: str, node_id: str, expires_at: float, now: float) -> bool:
+        with self._state() as state:
+            lease = state["leases"].get(camera_id)
+            if lease and lease["node_id"] != node_id and lease["expires_at"] > now:
+                return False
+            state["leases"][camera_id] = {"node_id": node_id, "expires_at": expires_at}
+            return True
+
+    def release(self, camera_id: str, node_id: str):
+        with self._state() as state:
+            lease = state["leases"].get(camera_id)
+            if lease and lease["node_id"] == node_id:
+                del state["leases"][camera_id]
+
+    def leave(self, node_id: str):
+        with self._state() as state:
+            state["nodes"].pop(node_id, None)
+            state["leases"] = {
+                cam: lease for cam, lease in state["leases"].items()
+                if lease["node_id"] != node_id
+            }
+
+
+class SupabaseLeaseStore:
+    """Lease store backed by the edge_nodes and camera_leases tables."""
+
+    def __init__(self, supabase):
+        self.supabase = supabase
+
+    def heartbeat(self, node_id: str, expires_at: float):
+        self.supabase.table("edge_nodes").upsert(
+            {"node_id": node_id, "expires_at": expires_at}
+        ).execute()
+
+    def live_nodes(self, now: float) -> List[str]:
+        result = (
+            self.supabase.table("edge_nodes")
+            .select("node_id")
+            .gt("expires_at", now)
+            .execute()
+        )
+        return sorted(row["node_id"] for row in result.data)
+
+    def try_acquire(self, camera_id: str, node_id: str, expires_at: float, now: float) -> bool:
+        # Renew our own lease or take over an expired one
+        result = (
+            self.supabase.table("camera_leases")
+            .update({"node_id": node_id, "expires_at": expires_at})
+            .eq("camera_id", camera_id)
+            .or_(f"node_id.eq.{node_id},expires_at.lt.{now}")
+            .execute()
+        )
+        if result.data:
+            return True
+
+        # No row yet; the primary key makes concurrent inserts fail for all but one node
+        try:
+            self.supabase.table("camera_leases").insert(
+                {"camera_id": camera_id, "node_id": node_id, "expires_at": expires_at}
+            ).execute()
+            return True
+        except Exception:
+            return False
+
+    def release(self, camera_id: str, node_id: str):
+        (
+            self.supabase.table("camera_leases")
+            .delete()
+            .eq("camera_id", camera_id)
+            .eq("node_id", node_id)
+            .execute()
+        )
+
+    def leave(self, node_id: str):
+        self.supabase.table("camera_leases").delete().eq("node_id", node_id).execute()
+        self.supabase.table("edge_nodes").delete().eq("node_id", node_id).execute()
+
+
+class ShardCoordinator:
+    """Keeps this node's share of cameras running according to the leases."""
+
+    def __init__(
+        self,
+        config: Config,
+        store,
+        on_acquire: Callable[[str], Awaitable],
+        on_release: Callable[[str], Awaitable]
+    ):
+        self.config = config
+        self.store = store
+        self.on_acquire = on_acquire
+        self.on_release = on_release
+
+        self.node_id = config.node_id
+        self.camera_ids = [c.id for c in config.cameras if c.enabled]
+        # Cameras added through the API on this node; other nodes don't know them
+        self.local_ids: FrozenSet[str] = frozenset()
+
+        self.owned: Dict[str, float] = {}  # camera_id -> lease expiry
+        # Cameras started through on_acquire; reconciled with `owned` after every renewal
+        self.started: Set[str] = set()
+        self.live_nodes: List[str] = []
+        self.task: Optional[asyncio.Task] = None
+
+    def _tick(self):
+        """Renew membership and leases, updating `owned`."""
+        now = time.time()
+        expires_at = now + self.config.shard_lease_ttl
+
+        self.store.heartbeat(self.node_id, expires_at)
+        nodes = self.store.live_nodes(now)
+        if self.node_id not in nodes:
+            nodes.append(self.node_id)
+        self.live_nodes = nodes
+
+        # Both are replaced, never mutated, by add_camera/remove_camera
+        camera_ids, local_ids = self.camera_ids, self.local_ids
+        desired = {
+            c for c in camera_ids
+            if c in local_ids or rendezvous_owner(c, nodes) == self.node_id
+        }
+
+        # `owned` is also trimmed by _expire_local on the event loop, hence pop()
+        for camera_id in list(self.owned):
+            if camera_id not in desired:
+                # Hand over to the new owner
+                self.store.release(camera_id, self.node_id)
+                self.owned.pop(camera_id, None)
+
+        for camera_id in sorted(desired):
+            if self.store.try_acquire(camera_id, self.node_id, expires_at, now):
+                self.owned[camera_id] = expires_at
+            else:
+                # Lease is held by another node
+                self.owned.pop(camera_id, None)
+
+    def _expire_local(self):
+        """Drop cameras whose lease could not be renewed in time."""
+        now = time.time()
+        for camera_id, expires_at in list(self.owned.items()):
+            if expires_at <= now:
+                self.owned.pop(camera_id, None)
+
+    async def _sync_cameras(self):
+        """Start newly owned cameras and stop the ones no longer owned."""
+        owned = set(self.owned)
+        for camera_id in sorted(self.started - owned):
+            logger.info(f"Shard {self.node_id}: releasing camera {camera_id}")
+            self.started.discard(camera_id)
+            await self.on_release(camera_id)
+        for camera_id in sorted(owned - self.started):
+            logger.info(f"Shard {self.node_id}: acquired camera {camera_id}")
+            self.started.add(camera_id)
+            await self.on_acquire(camera_id)
+
+    async def _run(self):
+        """Renew leases every interval and start/stop cameras accordingly."""
+        # A renewal still running when the leases run out can no longer keep them.
+        # The blocked call keeps its worker; later renewals queue behind it and
+        # time out too, so the leases expire locally until the store answers.
+        timeout = self.config.shard_lease_ttl - self.config.shard_renew_interval
+        while True:
+            try:
+                await asyncio.wait_for(executors.run(LEASES, self._tick), timeout)
+            except asyncio.TimeoutError:
+                logger.error(f"Shard lease renewal timed out after {timeout:.1f}s")
+                self._expire_local()
+            except Exception as e:
+                logger.error(f"Shard lease renewal failed: {e}")
+                self._expire_local()
+
+            await self._sync_cameras()
+            await asyncio.sleep(self.config.shard_renew_interval)
+
+    def add_camera(self, camera_id: str):
+        """
+        Coordinate a camera added at runtime.
+
+        Only this node knows the camera, so it wants it regardless of the
+        hashing, but still runs it only once it holds the camera's lease
+        (from the next renewal on).
+        """
+        if camera_id not in self.camera_ids:
+            self.camera_ids = self.camera_ids + [camera_id]
+        self.local_ids = self.local_ids | {camera_id}
+
+    def remove_camera(self, camera_id: str):
+        """Stop coordinating a camera; the next renewal releases its lease."""
+        self.camera_ids = [c for c in self.camera_ids if c != camera_id]
+        self.local_ids = self.local_ids - {camera_id}
+
+    async def start(self):
+        """Join the cluster and start renewing leases."""
+        logger.info(
+            f"Shard {self.node_id}: coordinating {len(self.camera_ids)} camera(s) "
+            f"(ttl {self.config.shard_lease_ttl}s)"
+        )
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop renewing, stop owned cameras and hand the leases back immediately."""
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+        for camera_id in sorted(self.started):
+            await self.on_release(camera_id)
+        self.started.clear()
+        self.owned.clear()
+
+        try:
+            await executors.run(LEASES, self.store.leave, self.node_id)
+        except Exception as e:
+            logger.error(f"Failed to leave shard cluster: {e}")
+
+    def status(self) -> Dict:
+        """Current membership and ownership as seen by this node."""
+        return {
+            "node_id": self.node_id,
+            "live_nodes": self.live_nodes,
+            "owned_cameras": sorted(self.owned),
+        }
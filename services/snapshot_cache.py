@@ -0,0 +1,149 @@
+"""
+Snapshot Cache
+
+Local, size-bounded store of full-resolution violation snapshots for the
+tiered snapshot mode (SNAPSHOT_TIERED): the alert is uploaded with a small
+thumbnail right away, while the full image waits here until it is uploaded
+in an off-peak batch or on demand, and is served by the edge API meanwhile.
+
+Files are named after the alert's image_path (URL-quoted). Images not yet
+uploaded carry a ".pending" suffix, so the upload backlog survives a
+restart. When the cache is over SNAPSHOT_CACHE_MB the least recently used
+images are deleted, uploaded or not.
+"""
+
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from urllib.parse import quote, unquote
+
+from core import Config
+
+logger = logging.getLogger(__name__)
+
+_PENDING = ".pending"
+
+
+def full_image_path(image_path: str) -> str:
+    """Storage path of the full-resolution image of a thumbnail."""
+    base, ext = os.path.splitext(image_path)
+    return f"{base}_full{ext}"
+
+
+class SnapshotCache:
+    """LRU of full-resolution snapshots on local disk, keyed by alert image_path."""
+
+    def __init__(self, config: Config):
+        self.root = config.snapshot_cache_dir
+        self.max_bytes = int(config.snapshot_cache_mb * 1024 * 1024)
+        # image_path -> [size in bytes, uploaded], least recently used first
+        self._entries: "OrderedDict[str, list]" = OrderedDict()
+        self._bytes = 0
+        # Written from upload worker threads, read from the loop
+        self._lock = threading.Lock()
+
+        self.evicted = 0
+        self.evicted_pending = 0
+
+        os.makedirs(self.root, exist_ok=True)
+        self._load()
+
+    def _file(self, image_path: str, uploaded: bool) -> str:
+        name = quote(image_path, safe="")
+        return os.path.join(self.root, name if uploaded else name + _PENDING)
+
+    def _load(self):
+        """Index images left by a previous run, oldest first."""
+        files = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(files):
+            uploaded = not name.endswith(_PENDING)
+            image_path = unquote(name if uploaded else name[:-len(_PENDING)])
+            self._entries[image_path] = [size, uploaded]
+            self._bytes += size
+        if files:
+            logger.info(
+                f"Snapshot cache: {len(self._entries)} images ({self._bytes / 1e6:.1f} MB), "
+                f"{len(self.pending())} awaiting upload"
+            )
+        with self._lock:
+            self._evict()
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._entries:
+            image_path, (size, uploaded) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evicted += 1
+            if not uploaded:
+                self.evicted_pending += 1
+                logger.warning(f"Snapshot cache full, dropped {image_path} before upload")
+            try:
+                os.remove(self._file(image_path, uploaded))
+            except OSError:
+                pass
+
+    def put(self, image_path: str, data) -> None:
+        """Store the full-resolution JPEG of an alert (bytes or memoryview)."""
+        with open(self._file(image_path, False), "wb") as f:
+            f.write(data)
+            size = f.tell()
+        with self._lock:
+            old = self._entries.pop(image_path, None)
+            if old:
+                self._bytes -= old[0]
+            self._entries[image_path] = [size, False]
+            self._bytes += size
+            self._evict()
+
+    def get(self, image_path: str) -> Optional[str]:
+        """Local file of an alert's full image, or None if not cached."""
+        with self._lock:
+            entry = self._entries.get(image_path)
+            if entry is None:
+                return None
+            self._entries.move_to_end(image_path)
+            return self._file(image_path, entry[1])
+
+    def is_uploaded(self, image_path: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(image_path)
+            return bool(entry and entry[1])
+
+    def mark_uploaded(self, image_path: str):
+        with self._lock:
+            entry = self._entries.get(image_path)
+            if entry is None or entry[1]:
+                return
+            try:
+                os.replace(self._file(image_path, False), self._file(image_path, True))
+            except OSError as e:
+                logger.error(f"Snapshot cache: could not mark {image_path} uploaded: {e}")
+                return
+            entry[1] = True
+
+    def pending(self, limit: Optional[int] = None) -> List[str]:
+        """Image paths not uploaded yet, least recently used first."""
+        with self._lock:
+            paths = [path for path, (_, uploaded) in self._entries.items() if not uploaded]
+        return paths[:limit] if limit else paths
+
+    def stats(self) -> Dict:
+        with self._lock:
+            pending = [size for size, uploaded in self._entries.values() if not uploaded]
+            return {
+                "images": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "pending": len(pending),
+                "pending_bytes": sum(pending),
+                "evicted": self.evicted,
+                "evicted_pending": self.evicted_pending,
+            }
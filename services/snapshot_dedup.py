@@ -0,0 +1,132 @@
+"""
+Snapshot Deduplication
+
+Perceptual hashes of violation snapshots, so a near-identical crop of the
+same scene is linked to the image already in Storage instead of being
+uploaded again (e.g. a stationary person re-alerting after every cooldown).
+
+The hash is a 64-bit difference hash (dHash): the crop is converted to
+grayscale and downscaled to 9x8, and each bit records whether a pixel is
+brighter than its right neighbour. It survives JPEG noise, small shifts and
+lighting drift; the Hamming distance between two hashes measures how
+different two crops look.
+
+Every camera keeps a bounded LRU of recent (track, hash, storage path)
+entries. A crop matches an entry of the same track within
+SNAPSHOT_DEDUP_TRACK_DISTANCE bits, or any entry of the camera within the
+stricter SNAPSHOT_DEDUP_CAMERA_DISTANCE (covers a track that was lost and
+re-created for the same person).
+"""
+
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from core import Config
+
+logger = logging.getLogger(__name__)
+
+_HASH_SIZE = 8
+
+
+def dhash(image: np.ndarray) -> int:
+    """64-bit difference hash of a BGR or grayscale image."""
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(image, (_HASH_SIZE + 1, _HASH_SIZE), interpolation=cv2.INTER_AREA)
+    bits = small[:, 1:] > small[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(hashes: np.ndarray, value: int) -> np.ndarray:
+    """Hamming distances between a uint64 array of hashes and one hash."""
+    diff = np.bitwise_xor(hashes, np.uint64(value))
+    return np.unpackbits(diff.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+class CameraIndex:
+    """LRU of recent snapshots of one camera, most recently used last."""
+
+    def __init__(self, size: int):
+        self.size = size
+        # storage path -> (track id, hash)
+        self.entries: "OrderedDict[str, Tuple[str, int]]" = OrderedDict()
+
+    def find(self, track_id: str, value: int, track_distance: int, camera_distance: int) -> Optional[str]:
+        """Storage path of the closest matching entry, or None."""
+        if not self.entries:
+            return None
+        paths = list(self.entries)
+        tracks = [track for track, _ in self.entries.values()]
+        hashes = np.fromiter((h for _, h in self.entries.values()), dtype=np.uint64, count=len(paths))
+        distances = hamming(hashes, value)
+        same_track = np.array([track == track_id for track in tracks])
+        limits = np.where(same_track, track_distance, camera_distance)
+        candidates = np.flatnonzero(distances <= limits)
+        if not len(candidates):
+            return None
+        path = paths[candidates[np.argmin(distances[candidates])]]
+        self.entries.move_to_end(path)
+        return path
+
+    def add(self, path: str, track_id: str, value: int):
+        self.entries[path] = (track_id, value)
+        self.entries.move_to_end(path)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+
+class SnapshotIndex:
+    """Per-camera perceptual-hash index of uploaded violation snapshots."""
+
+    def __init__(self, config: Config):
+        self.size = config.snapshot_dedup_size
+        self.track_distance = config.snapshot_dedup_track_distance
+        self.camera_distance = config.snapshot_dedup_camera_distance
+        self.cameras: Dict[str, CameraIndex] = {}
+
+        self.lookups = 0
+        self.track_hits = 0
+        self.camera_hits = 0
+
+    def lookup(self, camera_id: str, track_id: str, image: np.ndarray) -> Tuple[int, Optional[str]]:
+        """
+        Hash a snapshot and look for a near-duplicate already uploaded.
+
+        Returns:
+            (hash, storage path of the duplicate or None). Pass the hash to
+            `add` once a new snapshot has been uploaded.
+        """
+        value = dhash(image)
+        self.lookups += 1
+        index = self.cameras.get(camera_id)
+        if index is None:
+            return value, None
+        path = index.find(track_id, value, self.track_distance, self.camera_distance)
+        if path is not None:
+            if index.entries[path][0] == track_id:
+                self.track_hits += 1
+            else:
+                self.camera_hits += 1
+            logger.debug(f"Snapshot of {track_id} duplicates {path}")
+        return value, path
+
+    def add(self, camera_id: str, track_id: str, value: int, path: str):
+        """Record an uploaded snapshot."""
+        if camera_id not in self.cameras:
+            self.cameras[camera_id] = CameraIndex(self.size)
+        self.cameras[camera_id].add(path, track_id, value)
+
+    def stats(self) -> Dict:
+        hits = self.track_hits + self.camera_hits
+        return {
+            "lookups": self.lookups,
+            "hits": hits,
+            "track_hits": self.track_hits,
+            "camera_hits": self.camera_hits,
+            "hit_rate": round(hits / self.lookups, 4) if self.lookups else 0.0,
+            "entries": sum(len(index.entries) for index in self.cameras.values()),
+        }
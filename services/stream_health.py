@@ -0,0 +1,189 @@
+"""
+Stream Health
+
+Reconnection backoff, capture times of buffered frames and per-camera
+stream statistics.
+
+Reconnects back off exponentially with jitter, so cameras behind a failed
+switch don't all reconnect in lockstep. After `max_reconnect_attempts`
+a camera is never given up on; it drops to a slow retry interval instead.
+"""
+
+import random
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+# Window over which achieved frame rates are measured (seconds)
+_RATE_WINDOW = 5.0
+# Weight of the newest sample in moving averages
+_EMA_ALPHA = 0.1
+
+
+def reconnect_delay(
+    attempt: int,
+    base: float,
+    maximum: float,
+    slow_after: int,
+    slow_interval: float
+) -> float:
+    """
+    Delay before reconnect attempt `attempt` (0-based).
+
+    Doubles from `base` up to `maximum`, then switches to `slow_interval`
+    once `slow_after` attempts have failed. The result is jittered to 50-100%
+    of the nominal delay.
+    """
+    if slow_after > 0 and attempt >= slow_after:
+        delay = slow_interval
+    else:
+        delay = min(maximum, base * (2 ** min(attempt, 16)))
+    return delay * random.uniform(0.5, 1.0)
+
+
+class StreamClock:
+    """
+    Capture times of a live stream's frames from their presentation timestamps.
+
+    time.time() after a read is when the frame left the capture buffer, which
+    for a buffering RTSP stream can be seconds after the camera sent it. The
+    first frame after connecting anchors the stream's timestamps
+    (CAP_PROP_POS_MSEC) to the wall clock and later frames are dated relative
+    to it, so a frame that sat in the buffer keeps its age. The anchor moves
+    when the timestamps jump back (stream restart) or run ahead of the wall
+    clock (camera clock drift). Without timestamps the read time is used.
+    """
+
+    def __init__(self):
+        self.origin: Optional[float] = None
+        self.last_pos = 0.0
+
+    def reset(self):
+        """Re-anchor on the next frame, e.g. after a reconnect."""
+        self.origin = None
+
+    def capture_time(self, pos_msec: float, read_time: float) -> float:
+        """
+        Args:
+            pos_msec: CAP_PROP_POS_MSEC of the frame just read
+            read_time: Epoch seconds when the read returned
+
+        Returns:
+            Epoch seconds the frame was captured at
+        """
+        if pos_msec <= 0:
+            return read_time
+        pos = pos_msec / 1000.0
+        if self.origin is None or pos_msec < self.last_pos or self.origin + pos > read_time:
+            self.origin = read_time - pos
+        self.last_pos = pos_msec
+        return self.origin + pos
+
+
+def _rate(timestamps: Deque[float], now: float) -> float:
+    """Events per second over the recent window."""
+    while timestamps and timestamps[0] < now - _RATE_WINDOW:
+        timestamps.popleft()
+    if len(timestamps) < 2:
+        return 0.0
+    span = timestamps[-1] - timestamps[0]
+    return (len(timestamps) - 1) / span if span > 0 else 0.0
+
+
+def _ema(current: Optional[float], sample: float) -> float:
+    return sample if current is None else current + _EMA_ALPHA * (sample - current)
+
+
+class StreamHealth:
+    """Connection state and frame statistics of one camera stream."""
+
+    def __init__(self, history: int = 20):
+        self.state = "connecting"
+        self.frames_read = 0
+        self.frames_processed = 0
+        self.frames_stale = 0
+        self.last_frame_time: Optional[float] = None
+        self.decode_ms: Optional[float] = None
+        self.freshness_ms: Optional[float] = None
+        self.reconnects = 0
+        self.last_error: Optional[str] = None
+        self.connected_since: Optional[float] = None
+        self.reconnect_history: Deque[Dict] = deque(maxlen=history)
+        self._read_times: Deque[float] = deque(maxlen=256)
+        self._processed_times: Deque[float] = deque(maxlen=256)
+
+    def set_state(self, state: str):
+        self.state = state
+
+    def connected(self):
+        self.state = "streaming"
+        self.connected_since = time.time()
+
+    def frame_read(self, decode_seconds: Optional[float] = None):
+        """Record a decoded frame and how long reading/decoding it took."""
+        now = time.time()
+        self.frames_read += 1
+        self.last_frame_time = now
+        self._read_times.append(now)
+        if decode_seconds is not None:
+            self.decode_ms = _ema(self.decode_ms, decode_seconds * 1000.0)
+
+    def frame_processed(self, capture_time: Optional[float] = None):
+        """Record a frame that went through inference and how old it was by then."""
+        now = time.time()
+        self.frames_processed += 1
+        self._processed_times.append(now)
+        if capture_time is not None:
+            self.freshness_ms = _ema(self.freshness_ms, (now - capture_time) * 1000.0)
+
+    def frame_stale(self):
+        """Record a frame dropped for missing the freshness deadline."""
+        self.frames_stale += 1
+
+    def reconnecting(self, reason: str, delay: float, attempt: int, slow: bool):
+        """Record a failure that triggers a reconnect after `delay` seconds."""
+        self.state = "slow_retry" if slow else "backoff"
+        self.reconnects += 1
+        self.last_error = reason
+        self.connected_since = None
+        self.reconnect_history.append({
+            "time": time.time(),
+            "reason": reason,
+            "attempt": attempt,
+            "delay": round(delay, 2),
+        })
+
+    def decoder_connection(self, connected_since: Optional[float], reconnects: int):
+        """Mirror the connection state a decoder process publishes in its frame ring."""
+        if reconnects > self.reconnects:
+            self.last_error = "decoder lost the source"
+            self.reconnect_history.append({
+                "time": time.time(),
+                "reason": self.last_error,
+                "attempt": reconnects,
+            })
+        self.reconnects = reconnects
+        self.connected_since = connected_since
+        if connected_since is None:
+            # The decoder is connecting or backing off after a failure
+            self.state = "backoff" if reconnects else "connecting"
+
+    def snapshot(self) -> Dict:
+        now = time.time()
+        return {
+            "state": self.state,
+            "read_fps": round(_rate(self._read_times, now), 2),
+            "processed_fps": round(_rate(self._processed_times, now), 2),
+            "frames_read": self.frames_read,
+            "frames_processed": self.frames_processed,
+            "frames_stale": self.frames_stale,
+            "decode_ms": round(self.decode_ms, 2) if self.decode_ms is not None else None,
+            "freshness_ms": round(self.freshness_ms, 2) if self.freshness_ms is not None else None,
+            "seconds_since_last_frame": (
+                round(now - self.last_frame_time, 2) if self.last_frame_time else None
+            ),
+            "connected_since": self.connected_since,
+            "reconnects": self.reconnects,
+            "last_error": self.last_error,
+            "reconnect_history": list(self.reconnect_history),
+        }
@@ -0,0 +1,472 @@
+"""
+Multi-Stream Camera Simulator
+
+Serves N synthetic cameras as HTTP MJPEG streams from the bundled videos,
+for load-testing CameraManager without real cameras, ffmpeg or an RTSP
+server (see services.rtsp_simulator for streaming one file over RTSP).
+Only the standard library HTTP server and OpenCV are used.
+
+Each video is decoded and JPEG-encoded once per resolution at startup, so
+serving a frame is a socket write and the simulator itself scales to many
+streams. Per stream it can inject:
+
+    jitter      random delay (standard deviation, seconds) on every frame
+    loss        fraction of frames that are never sent
+    corrupt     fraction of frames sent truncated (undecodable JPEG)
+    disconnect  connections are cut after a random time (mean seconds),
+                and the stream refuses new connections for --down-seconds
+
+Example usage:
+
+    python -m services.stream_simulator --streams 32 --fps 10 --jitter 0.02 \\
+        --loss 0.01 --disconnect-every 120 --stream 0:size=1280x720,loss=0.2
+
+prints a CAMERA_SOURCES value for the edge controller. GET /stats on the
+simulator reports per-stream counters. With --measure SECONDS, a
+CameraManager is run against the streams in this process tree instead and
+its per-camera throughput and reconnects are reported.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import math
+import multiprocessing as mp
+import random
+import threading
+import time
+import urllib.request
+from dataclasses import dataclass, fields, replace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+
+from core import Config, CameraConfig
+
+logger = logging.getLogger(__name__)
+
+BOUNDARY = "frame"
+DEFAULT_VIDEOS = ["videos/test1.mp4", "videos/test2.mp4"]
+
+
+@dataclass
+class StreamSpec:
+    """Settings of one simulated camera."""
+    name: str
+    video: str
+    fps: float = 10.0
+    width: int = 640
+    height: int = 480
+    jitter: float = 0.0
+    loss: float = 0.0
+    corrupt: float = 0.0
+    disconnect_every: float = 0.0  # Mean seconds per connection (0 = never)
+    down_seconds: float = 5.0
+
+
+def parse_size(spec: str) -> Tuple[int, int]:
+    width, height = (int(v) for v in spec.lower().split("x"))
+    return width, height
+
+
+def apply_overrides(spec: StreamSpec, overrides: str) -> StreamSpec:
+    """Apply "key=value,..." overrides (size=WxH or any StreamSpec field) to a spec."""
+    fields_ = {f.name for f in fields(StreamSpec)}
+    changes = {}
+    for item in overrides.split(","):
+        if "=" not in item:
+            continue
+        key, value = (part.strip() for part in item.split("=", 1))
+        key = key.replace("-", "_")
+        if key == "size":
+            changes["width"], changes["height"] = parse_size(value)
+        elif key in fields_ and key != "name":
+            changes[key] = type(getattr(spec, key))(value)
+        else:
+            raise ValueError(f"Unknown stream setting {key!r}")
+    return replace(spec, **changes)
+
+
+class FrameLibrary:
+    """JPEG frames of each video, encoded once per resolution."""
+
+    def __init__(self, quality: int, max_frames: int):
+        self.quality = quality
+        self.max_frames = max_frames
+        self._frames: Dict[Tuple[str, int, int], List[bytes]] = {}
+
+    def frames(self, video: str, width: int, height: int) -> List[bytes]:
+        key = (video, width, height)
+        if key not in self._frames:
+            cap = cv2.VideoCapture(video)
+            encoded = []
+            while len(encoded) < self.max_frames:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                frame = cv2.resize(frame, (width, height))
+                ok, jpeg = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), self.quality])
+                if ok:
+                    encoded.append(jpeg.tobytes())
+            cap.release()
+            if not encoded:
+                raise ValueError(f"No frames could be read from {video}")
+            self._frames[key] = encoded
+            logger.info(
+                f"Encoded {len(encoded)} frames of {video} at {width}x{height} "
+                f"({sum(map(len, encoded)) / 1e6:.1f} MB)"
+            )
+        return self._frames[key]
+
+
+class SimulatedStream:
+    """One camera: serves its frames to every client with the configured faults."""
+
+    def __init__(self, spec: StreamSpec, frames: List[bytes], seed: int):
+        self.spec = spec
+        self.frames = frames
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.down_until = 0.0
+
+        self.clients = 0
+        self.connections = 0
+        self.refused = 0
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.frames_corrupted = 0
+        self.disconnects = 0
+
+    def serve(self, handler: BaseHTTPRequestHandler, stopping: threading.Event):
+        spec = self.spec
+        with self._lock:
+            if time.monotonic() < self.down_until:
+                self.refused += 1
+                refuse = True
+            else:
+                self.clients += 1
+                self.connections += 1
+                refuse = False
+            # Connections draw from their own generator; the stream's isn't thread-safe
+            rng = random.Random(self._rng.random())
+        if refuse:
+            handler.send_error(503, "Simulated outage")
+            return
+
+        handler.send_response(200)
+        handler.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={BOUNDARY}")
+        handler.send_header("Cache-Control", "no-cache")
+        handler.end_headers()
+
+        interval = 1.0 / spec.fps
+        cut_at = (
+            time.monotonic() + rng.expovariate(1.0 / spec.disconnect_every)
+            if spec.disconnect_every > 0 else math.inf
+        )
+        next_frame = time.monotonic()
+        try:
+            while not stopping.is_set():
+                next_frame += interval
+                delay = next_frame - time.monotonic()
+                if delay < -1.0:
+                    # The client fell far behind; don't burst to catch up
+                    next_frame = time.monotonic()
+                if spec.jitter > 0:
+                    delay += abs(rng.gauss(0.0, spec.jitter))
+                if delay > 0:
+                    time.sleep(delay)
+
+                if time.monotonic() >= cut_at:
+                    with self._lock:
+                        self.disconnects += 1
+                        self.down_until = time.monotonic() + spec.down_seconds
+                    break
+
+                # Frame position follows the wall clock, like a live camera
+                jpeg = self.frames[int(time.time() * spec.fps) % len(self.frames)]
+                if rng.random() < spec.loss:
+                    self.frames_dropped += 1
+                    continue
+                if rng.random() < spec.corrupt:
+                    jpeg = jpeg[:len(jpeg) // 2]
+                    self.frames_corrupted += 1
+                handler.wfile.write(
+                    f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+                    f"Content-Length: {len(jpeg)}\r\n\r\n".encode()
+                    + jpeg + b"\r\n"
+                )
+                self.frames_sent += 1
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with self._lock:
+                self.clients -= 1
+
+    def stats(self) -> Dict:
+        return {
+            "video": self.spec.video,
+            "fps": self.spec.fps,
+            "size": f"{self.spec.width}x{self.spec.height}",
+            "clients": self.clients,
+            "connections": self.connections,
+            "refused": self.refused,
+            "frames_sent": self.frames_sent,
+            "frames_dropped": self.frames_dropped,
+            "frames_corrupted": self.frames_corrupted,
+            "disconnects": self.disconnects,
+        }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, body: Dict):
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        simulator: "StreamSimulator" = self.server.simulator
+        path = self.path.split("?", 1)[0].strip("/")
+        if path == "stats":
+            self._send_json(simulator.stats())
+            return
+        if path == "":
+            self._send_json({"streams": simulator.urls()})
+            return
+        name = path[:-len(".mjpg")] if path.endswith(".mjpg") else path
+        stream = simulator.streams.get(name)
+        if stream is None:
+            self.send_error(404, f"No stream {name}")
+            return
+        stream.serve(self, simulator.stopping)
+
+
+class StreamSimulator:
+    """HTTP server for a set of simulated MJPEG cameras."""
+
+    def __init__(
+        self,
+        specs: List[StreamSpec],
+        host: str = "127.0.0.1",
+        port: int = 8090,
+        quality: int = 80,
+        max_frames: int = 300,
+        seed: int = 0
+    ):
+        library = FrameLibrary(quality, max_frames)
+        self.streams = {
+            spec.name: SimulatedStream(spec, library.frames(spec.video, spec.width, spec.height), seed + i)
+            for i, spec in enumerate(specs)
+        }
+        self.stopping = threading.Event()
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.simulator = self
+        self.host, self.port = self.server.server_address[:2]
+
+    def urls(self) -> Dict[str, str]:
+        return {name: f"http://{self.host}:{self.port}/{name}.mjpg" for name in self.streams}
+
+    def camera_sources(self) -> str:
+        """CAMERA_SOURCES value for the edge controller."""
+        return ",".join(f"{name}:{url}" for name, url in self.urls().items())
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def shutdown(self):
+        self.stopping.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def stats(self) -> Dict:
+        streams = {name: stream.stats() for name, stream in self.streams.items()}
+        return {
+            "streams": streams,
+            "clients": sum(s["clients"] for s in streams.values()),
+            "frames_sent": sum(s["frames_sent"] for s in streams.values()),
+        }
+
+
+def build_specs(args: argparse.Namespace) -> List[StreamSpec]:
+    width, height = parse_size(args.size)
+    videos = itertools.cycle(args.video or DEFAULT_VIDEOS)
+    specs = [
+        StreamSpec(
+            name=f"sim_{i}",
+            video=next(videos),
+            fps=args.fps,
+            width=width,
+            height=height,
+            jitter=args.jitter,
+            loss=args.loss,
+            corrupt=args.corrupt,
+            disconnect_every=args.disconnect_every,
+            down_seconds=args.down_seconds,
+        )
+        for i in range(args.streams)
+    ]
+    for override in args.stream or []:
+        index, _, settings = override.partition(":")
+        specs[int(index)] = apply_overrides(specs[int(index)], settings)
+    return specs
+
+
+def _serve(specs: List[StreamSpec], host: str, port: int, quality: int, max_frames: int, seed: int):
+    """Simulator process entry point for --measure."""
+    logging.basicConfig(level=logging.WARNING)
+    StreamSimulator(specs, host, port, quality, max_frames, seed).serve_forever()
+
+
+async def measure(config: Config, urls: Dict[str, str], seconds: float) -> Dict[str, Dict]:
+    """Run a CameraManager against the streams for `seconds` and return its stream stats."""
+    # Imported here so the simulator process doesn't load the detector stack
+    from .ai_client import AIClient
+    from .camera_manager import CameraManager
+    from .violation_engine import ViolationEngine
+
+    config.cameras = [CameraConfig(id=name, source=url) for name, url in urls.items()]
+    # No session on the engine: frames go through inference, violations are skipped
+    manager = CameraManager(config, AIClient(config), ViolationEngine(config, None))
+    manager.set_session_active(True)
+    await manager.start_all_cameras()
+    try:
+        await asyncio.sleep(seconds)
+        return manager.get_stream_stats()
+    finally:
+        await manager.stop_all_cameras()
+
+
+def format_measurement(stats: Dict[str, Dict], seconds: float, target_fps: float) -> str:
+    lines = [f"{'camera':<10} {'state':<11} {'read fps':>9} {'proc fps':>9} {'fresh ms':>9} {'reconnects':>10}"]
+    for name, s in stats.items():
+        lines.append(
+            f"{name:<10} {s['state']:<11} {s['frames_read'] / seconds:>9.1f} "
+            f"{s['frames_processed'] / seconds:>9.1f} "
+            f"{'-' if s['freshness_ms'] is None else round(s['freshness_ms']):>9} {s['reconnects']:>10}"
+        )
+    processed = sum(s["frames_processed"] for s in stats.values()) / seconds
+    lines.append(
+        f"{len(stats)} cameras: {processed:.1f} frames/s processed "
+        f"({processed / (target_fps * len(stats)):.0%} of {target_fps:g} fps per camera)"
+    )
+    return "\n".join(lines)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Serve many simulated MJPEG cameras from video files, with fault injection."
+    )
+    parser.add_argument("--streams", type=int, default=16, help="Number of simulated cameras.")
+    parser.add_argument(
+        "--video",
+        action="append",
+        help="Video file to stream (repeatable, assigned round-robin). Defaults to the bundled videos.",
+    )
+    parser.add_argument("--fps", type=float, default=10.0, help="Frames per second per stream.")
+    parser.add_argument("--size", default="640x480", help="Stream resolution, WxH.")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Frame delay jitter (std dev, seconds).")
+    parser.add_argument("--loss", type=float, default=0.0, help="Fraction of frames dropped.")
+    parser.add_argument("--corrupt", type=float, default=0.0, help="Fraction of frames sent truncated.")
+    parser.add_argument(
+        "--disconnect-every",
+        type=float,
+        default=0.0,
+        help="Mean seconds before a connection is cut (0 = never).",
+    )
+    parser.add_argument(
+        "--down-seconds",
+        type=float,
+        default=5.0,
+        help="Seconds a stream refuses connections after a cut.",
+    )
+    parser.add_argument(
+        "--stream",
+        action="append",
+        help="Per-stream overrides, e.g. 3:fps=5,size=1280x720,loss=0.1 (repeatable).",
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--quality", type=int, default=80, help="JPEG quality of the streams.")
+    parser.add_argument("--max-frames", type=int, default=300, help="Frames of each video to loop.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--measure",
+        type=float,
+        default=0.0,
+        help="Run a CameraManager against the streams for this many seconds and report.",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    args = parse_args(argv)
+    try:
+        specs = build_specs(args)
+    except (ValueError, IndexError) as e:
+        logger.error(f"Invalid stream settings: {e}")
+        return 1
+
+    if not args.measure:
+        simulator = StreamSimulator(specs, args.host, args.port, args.quality, args.max_frames, args.seed)
+        print(f"CAMERA_SOURCES={simulator.camera_sources()}")
+        print(f"Stats: http://{simulator.host}:{simulator.port}/stats")
+        try:
+            simulator.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            simulator.shutdown()
+        return 0
+
+    # The simulator gets its own process so it doesn't compete for the GIL
+    server = mp.get_context("spawn").Process(
+        target=_serve,
+        args=(specs, args.host, args.port, args.quality, args.max_frames, args.seed),
+        daemon=True,
+    )
+    server.start()
+    base = f"http://{args.host}:{args.port}"
+    deadline = time.monotonic() + 120.0
+    while True:
+        try:
+            urllib.request.urlopen(f"{base}/stats", timeout=1.0).read()
+            break
+        except OSError:
+            if not server.is_alive() or time.monotonic() > deadline:
+                logger.error("Simulator did not start")
+                return 1
+            time.sleep(0.5)
+
+    try:
+        urls = {spec.name: f"{base}/{spec.name}.mjpg" for spec in specs}
+        config = Config(require_supabase=False)
+        stats = asyncio.run(measure(config, urls, args.measure))
+        print(format_measurement(stats, args.measure, args.fps))
+        server_stats = json.loads(urllib.request.urlopen(f"{base}/stats", timeout=5.0).read())
+        print(
+            f"Simulator: {server_stats['frames_sent']} frames sent, "
+            f"{sum(s['disconnects'] for s in server_stats['streams'].values())} disconnects injected"
+        )
+    finally:
+        server.terminate()
+        server.join()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
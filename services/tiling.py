@@ -0,0 +1,105 @@
+"""
+Tiling helpers for high-resolution detection.
+
+Splits large frames into overlapping tiles and merges the per-tile
+detections with non-maximum suppression.
+"""
+
+from functools import lru_cache
+from typing import List, Tuple
+import numpy as np
+
+
+@lru_cache(maxsize=32)
+def compute_tiles(
+    width: int,
+    height: int,
+    tile_size: int,
+    overlap: float
+) -> Tuple[Tuple[int, int, int, int], ...]:
+    """
+    Compute overlapping square tiles covering a frame.
+
+    Returns an empty tuple when tiling is disabled (tile_size <= 0) or the
+    frame already fits in a single tile. Results are cached per frame size.
+
+    Returns:
+        Tuple of (x1, y1, x2, y2) tile rectangles
+    """
+    if tile_size <= 0 or (width <= tile_size and height <= tile_size):
+        return ()
+
+    stride = max(1, int(tile_size * (1.0 - overlap)))
+
+    def starts(length: int) -> List[int]:
+        if length <= tile_size:
+            return [0]
+        positions = list(range(0, length - tile_size, stride))
+        # Last tile is aligned to the edge instead of running past it
+        positions.append(length - tile_size)
+        return positions
+
+    return tuple(
+        (x, y, min(width, x + tile_size), min(height, y + tile_size))
+        for y in starts(height)
+        for x in starts(width)
+    )
+
+
+def nms(
+    boxes: np.ndarray,
+    scores: np.ndarray,
+    iou_threshold: float,
+    containment_threshold: float = 1.0
+) -> List[int]:
+    """
+    Greedy non-maximum suppression.
+
+    A person cut by a tile edge yields a partial box whose IoU with the
+    whole-body box is low, so boxes are also merged when their intersection
+    covers more than `containment_threshold` of the smaller one. The larger
+    box of such a pair is kept even if the partial one scored higher.
+
+    Args:
+        boxes: (N, 4) array of xyxy boxes
+        scores: (N,) confidence scores
+        iou_threshold: Boxes overlapping a kept box by more than this are dropped
+        containment_threshold: Boxes whose intersection with a kept box covers
+            more than this fraction of the smaller of the two are merged
+            (1.0 = IoU only)
+
+    Returns:
+        Indices of the kept boxes, highest score first (a merged pair is
+        listed at the position of its higher-scoring box)
+    """
+    if len(boxes) == 0:
+        return []
+
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = np.maximum(0.0, x2 - x1) * np.maximum(0.0, y2 - y1)
+    order = np.argsort(-scores)
+
+    keep = []
+    while order.size > 0:
+        i = int(order[0])
+        keep.append(i)
+        rest = order[1:]
+
+        ix1 = np.maximum(x1[i], x1[rest])
+        iy1 = np.maximum(y1[i], y1[rest])
+        ix2 = np.minimum(x2[i], x2[rest])
+        iy2 = np.minimum(y2[i], y2[rest])
+        inter = np.maximum(0.0, ix2 - ix1) * np.maximum(0.0, iy2 - iy1)
+        union = areas[i] + areas[rest] - inter
+        iou = np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+        smaller = np.minimum(areas[i], areas[rest])
+        contained = np.where(smaller > 0, inter / np.maximum(smaller, 1e-9), 0.0) > containment_threshold
+
+        # A higher-scoring partial box gives way to the whole box containing it
+        larger = contained & (areas[rest] > areas[i])
+        if larger.any():
+            keep[-1] = int(rest[larger][np.argmax(areas[rest][larger])])
+
+        order = rest[(iou <= iou_threshold) & ~contained]
+
+    return keep
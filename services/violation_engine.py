@@ -2,54 +2,112 @@
 Violation Engine Service
 
 Processes detections to identify PPE violations.
-Implements person-PPE mapping, compliance checking, and debouncing.
+Implements person tracking, person-PPE mapping, per-track PPE smoothing,
+compliance checking, and debouncing.
 """
 
 import asyncio
+import itertools
 import logging
 from typing import Dict, List, Optional, Tuple
-from collections import defaultdict
 from datetime import datetime, timedelta
 import cv2
 import numpy as np
 
 from core import Config
+from core.ppe import PPE_ITEMS, PPEClass
+from .clip_recorder import ClipRecorder
 from .cloud_sync import CloudSync
+from .compliance import ComplianceTracker
+from .detections import iou_matrix
+from .event_bus import EventBus
+from .snapshot_dedup import SnapshotIndex
 
 logger = logging.getLogger(__name__)
 
+# Class ids of wearable PPE, for vectorized membership tests
+_PPE_IDS = np.array(PPE_ITEMS, dtype=np.int32)
+
+
+def match_ppe(detections: np.ndarray, iou_threshold: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Assign PPE boxes to people by IoU.
+    
+    Returns:
+        (person detections, bool array [people, PPE_ITEMS]: whether each
+        person has a matching box of each PPE item)
+    """
+    # Class ids are canonical PPEClass values
+    class_ids = detections["class_id"]
+    people = detections[class_ids == PPEClass.PERSON]
+    is_ppe = np.isin(class_ids, _PPE_IDS)
+    ppe_ids = class_ids[is_ppe]
+    
+    # IoU of every person against every PPE box at once
+    matches = iou_matrix(people["xyxy"], detections["xyxy"][is_ppe]) >= iou_threshold
+    return people, (matches[:, :, None] & (ppe_ids[:, None] == _PPE_IDS)[None]).any(axis=1)
+
 
 class PersonTracker:
     """Tracks a person and their associated PPE."""
     
-    def __init__(self, person_id: str, bbox: List[float]):
+    def __init__(self, person_id: str, camera_id: str, bbox: List[float], now: datetime):
         self.person_id = person_id
+        self.camera_id = camera_id
         self.bbox = bbox  # [x1, y1, x2, y2]
-        self.ppe: Dict[str, List[Dict]] = defaultdict(list)  # class -> [detections]
-        self.last_seen = datetime.now()
+        # Per PPE item (PPE_ITEMS order): smoothed presence and hysteresis state
+        self.ppe_score = np.zeros(len(PPE_ITEMS), dtype=np.float32)
+        self.ppe_present = np.zeros(len(PPE_ITEMS), dtype=bool)
+        self.last_seen = now
+        self.new = True
     
-    def update_ppe(self, detections: List[Dict]):
-        """Update PPE detections for this person."""
-        self.ppe.clear()
-        for det in detections:
-            ppe_class = det.get("class", "").lower()
-            self.ppe[ppe_class].append(det)
-        self.last_seen = datetime.now()
+    def update_ppe(self, seen: np.ndarray, now: datetime, config: Config):
+        """
+        Fold this frame's PPE observations (1 = seen, 0 = not) into the smoothed
+        confidence that each item is worn.
+        
+        The smoothing weight follows the time since the last update, so it
+        behaves the same at any frame rate. An item turns present at
+        ppe_on_threshold and missing again only below ppe_off_threshold.
+        """
+        if self.new or config.ppe_smoothing_seconds <= 0:
+            self.ppe_score[:] = seen
+            self.new = False
+        else:
+            dt = max(0.0, (now - self.last_seen).total_seconds())
+            alpha = 1.0 - np.exp(-dt / config.ppe_smoothing_seconds)
+            self.ppe_score += alpha * (seen - self.ppe_score)
+        self.ppe_present |= self.ppe_score >= config.ppe_on_threshold
+        self.ppe_present &= self.ppe_score >= config.ppe_off_threshold
+        self.last_seen = now
     
-    def has_ppe(self, required_class: str) -> bool:
+    def has_ppe(self, required_class: PPEClass) -> bool:
         """Check if person has specific PPE."""
-        return required_class.lower() in self.ppe and len(self.ppe[required_class.lower()]) > 0
+        return bool(self.ppe_present[PPE_ITEMS.index(required_class)])
 
 
 class ViolationEngine:
     """Engine for detecting and managing PPE violations."""
     
-    def __init__(self, config: Config, cloud_sync: CloudSync):
+    def __init__(
+        self,
+        config: Config,
+        cloud_sync: CloudSync,
+        event_bus: Optional[EventBus] = None,
+        clip_recorder: Optional[ClipRecorder] = None,
+        compliance: Optional[ComplianceTracker] = None,
+        snapshot_index: Optional[SnapshotIndex] = None
+    ):
         self.config = config
         self.cloud_sync = cloud_sync
+        self.event_bus = event_bus
+        self.clip_recorder = clip_recorder
+        self.compliance = compliance
+        self.snapshot_index = snapshot_index
         
         # Person tracking
         self.people: Dict[str, PersonTracker] = {}  # person_id -> PersonTracker
+        self._track_ids = itertools.count(1)
         
         # Violation tracking (for debouncing)
         self.active_violations: Dict[str, Dict] = {}  # violation_key -> violation_data
@@ -65,21 +123,6 @@ class ViolationEngine:
             "lab_coat": config.require_lab_coat,
             "gloves": config.require_gloves,
         }
-
-        # PPE Class Aliases mapping
-        self.ppe_aliases = {
-            "safety glove": "gloves",
-            "glove": "gloves",
-            "coat": "lab_coat",
-            "safety glasses": "goggles",
-            "glasses": "goggles",
-            "eye protection": "goggles",
-        }
-
-    def _normalize_class(self, class_name: str) -> str:
-        """Normalize class name to standard PPE types."""
-        name = class_name.lower()
-        return self.ppe_aliases.get(name, name)
     
     def set_active_session(self, session_id: str, config: Dict = None):
         """Set the active lab session and update configuration."""
@@ -88,6 +131,9 @@ class ViolationEngine:
         
         if config:
             self.update_config(config)
+        
+        if self.compliance:
+            self.compliance.start_session(session_id)
             
     def update_config(self, config: Dict):
         """Update PPE requirements from session config."""
@@ -113,69 +159,48 @@ class ViolationEngine:
     
     def clear_active_session(self):
         """Clear the active lab session."""
+        if self.compliance:
+            # Writes the session's compliance summary in the background
+            self.compliance.end_session(self.required_ppe)
         self.active_session_id = None
         logger.info("Active session cleared")
     
-    def _calculate_iou(self, bbox1: List[float], bbox2: List[float]) -> float:
-        """Calculate Intersection over Union (IoU) between two bounding boxes."""
-        x1_1, y1_1, x2_1, y2_1 = bbox1
-        x1_2, y1_2, x2_2, y2_2 = bbox2
-        
-        # Calculate intersection
-        x1_i = max(x1_1, x1_2)
-        y1_i = max(y1_1, y1_2)
-        x2_i = min(x2_1, x2_2)
-        y2_i = min(y2_1, y2_2)
-        
-        if x2_i <= x1_i or y2_i <= y1_i:
-            return 0.0
-        
-        intersection = (x2_i - x1_i) * (y2_i - y1_i)
-        
-        # Calculate union
-        area1 = (x2_1 - x1_1) * (y2_1 - y1_1)
-        area2 = (x2_2 - x1_2) * (y2_2 - y1_2)
-        union = area1 + area2 - intersection
-        
-        if union == 0:
-            return 0.0
-        
-        return intersection / union
+    def _generate_person_id(self, camera_id: str) -> str:
+        """Generate an ID for a new person track."""
+        return f"{camera_id}_{next(self._track_ids)}"
     
-    def _match_ppe_to_person(
-        self,
-        person_bbox: List[float],
-        ppe_detections: List[Dict]
-    ) -> List[Dict]:
-        """Match PPE detections to a person based on IoU."""
-        matched_ppe = []
-        
-        for ppe_det in ppe_detections:
-            ppe_bbox = ppe_det.get("bbox", [])
-            if not ppe_bbox:
-                continue
-            
-            iou = self._calculate_iou(person_bbox, ppe_bbox)
-            if iou >= self.config.iou_threshold:
-                matched_ppe.append(ppe_det)
+    def _associate(self, camera_id: str, boxes: np.ndarray) -> List[Optional[PersonTracker]]:
+        """
+        Continue existing tracks of this camera: each person box is matched
+        greedily, by descending IoU, to the track it overlaps most.
         
-        return matched_ppe
-    
-    def _generate_person_id(self, bbox: List[float], camera_id: str) -> str:
-        """Generate a stable person ID based on bbox center and camera."""
-        # Use bbox center as identifier (in production, use proper tracking)
-        x1, y1, x2, y2 = bbox
-        center_x = (x1 + x2) / 2
-        center_y = (y1 + y2) / 2
+        Returns:
+            The matched tracker per box, None for new people
+        """
+        assigned: List[Optional[PersonTracker]] = [None] * len(boxes)
+        tracks = [t for t in self.people.values() if t.camera_id == camera_id]
+        if not tracks or not len(boxes):
+            return assigned
         
-        # Simple ID based on position (could be improved with proper tracking)
-        return f"{camera_id}_{int(center_x)}_{int(center_y)}"
+        overlap = iou_matrix(boxes, np.array([t.bbox for t in tracks], dtype=np.float32))
+        order = np.argsort(overlap, axis=None)[::-1]
+        used_boxes, used_tracks = set(), set()
+        for box, track in zip(*np.unravel_index(order, overlap.shape)):
+            if overlap[box, track] < self.config.track_iou_threshold:
+                break
+            if box in used_boxes or track in used_tracks:
+                continue
+            assigned[box] = tracks[track]
+            used_boxes.add(box)
+            used_tracks.add(track)
+        return assigned
     
     async def process_detections(
         self,
         camera_id: str,
         frame: np.ndarray,
-        detections: List[Dict]
+        detections: np.ndarray,
+        timestamp: Optional[float] = None
     ):
         """
         Process detections to identify violations.
@@ -183,77 +208,67 @@ class ViolationEngine:
         Args:
             camera_id: ID of the camera
             frame: Current frame (for snapshots)
-            detections: List of detections from AI model
+            detections: Detection array from the AI client (services.detections)
+            timestamp: Capture time (epoch seconds); defaults to now. Replays
+                pass video time so debouncing and smoothing follow it.
         """
         if not self.active_session_id:
             # No active session, skip processing
             return
         
-        # Separate people and PPE
-        people_detections = [
-            d for d in detections
-            if d.get("class", "").lower() == "person"
-        ]
+        now = datetime.fromtimestamp(timestamp) if timestamp is not None else datetime.now()
         
-        ppe_detections = []
-        for d in detections:
-            raw_class = d.get("class", "")
-            norm_class = self._normalize_class(raw_class)
-            
-            if norm_class in ["goggles", "lab_coat", "gloves"]:
-                # Create a copy with normalized class name for tracking
-                d_norm = d.copy()
-                d_norm["class"] = norm_class
-                ppe_detections.append(d_norm)
+        people, seen = match_ppe(detections, self.config.iou_threshold)
         
         # Update person tracking
         current_people = {}
-        for person_det in people_detections:
-            person_bbox = person_det.get("bbox", [])
-            if not person_bbox:
-                continue
-            
-            person_id = self._generate_person_id(person_bbox, camera_id)
-            
-            # Match PPE to this person
-            matched_ppe = self._match_ppe_to_person(person_bbox, ppe_detections)
-            
-            # Update or create person tracker
-            if person_id in self.people:
-                tracker = self.people[person_id]
-                tracker.bbox = person_bbox
-                tracker.update_ppe(matched_ppe)
-            else:
-                tracker = PersonTracker(person_id, person_bbox)
-                tracker.update_ppe(matched_ppe)
-                self.people[person_id] = tracker
-            
-            current_people[person_id] = tracker
+        assigned = self._associate(camera_id, people["xyxy"])
+        for person_bbox, person_seen, tracker in zip(
+            people["xyxy"].tolist(), seen.astype(np.float32), assigned
+        ):
+            if tracker is None:
+                tracker = PersonTracker(
+                    self._generate_person_id(camera_id), camera_id, person_bbox, now
+                )
+                self.people[tracker.person_id] = tracker
+            tracker.bbox = person_bbox
+            tracker.update_ppe(person_seen, now, self.config)
+            current_people[tracker.person_id] = tracker
+        
+        if self.compliance:
+            # People wearing each PPE item (smoothed), in PPE_ITEMS order
+            worn = sum((t.ppe_present for t in current_people.values()), np.zeros(len(PPE_ITEMS)))
+            self.compliance.observe(camera_id, len(people), worn)
         
         # Remove old people (not seen in this frame)
-        now = datetime.now()
         expired_people = [
             pid for pid, tracker in self.people.items()
-            if pid not in current_people and
+            if pid not in current_people and tracker.camera_id == camera_id and
             (now - tracker.last_seen).total_seconds() > 5.0
         ]
         for pid in expired_people:
             del self.people[pid]
+            for ppe_class in self.required_ppe:
+                violation_key = f"{camera_id}_{pid}_{ppe_class}"
+                self.violation_start_times.pop(violation_key, None)
+                self.active_violations.pop(violation_key, None)
+                # Track ids are never reused, so nothing else would clear it
+                self.violation_cooldowns.pop(violation_key, None)
         
         # Check for violations
         for person_id, tracker in current_people.items():
-            await self._check_violations(camera_id, person_id, tracker, frame)
+            await self._check_violations(camera_id, person_id, tracker, frame, now)
     
     async def _check_violations(
         self,
         camera_id: str,
         person_id: str,
         tracker: PersonTracker,
-        frame: np.ndarray
+        frame: np.ndarray,
+        now: datetime
     ):
         """Check for PPE violations for a specific person."""
-        now = datetime.now()
-        
+
         # Check each required PPE
         for ppe_class, required in self.required_ppe.items():
             if not required:
@@ -269,7 +284,7 @@ class ViolationEngine:
                     del self.violation_cooldowns[violation_key]
             
             # Check if person has required PPE
-            has_ppe = tracker.has_ppe(ppe_class)
+            has_ppe = tracker.has_ppe(PPEClass[ppe_class.upper()])
             
             if not has_ppe:
                 # Violation detected
@@ -290,7 +305,8 @@ class ViolationEngine:
                             person_id,
                             tracker,
                             ppe_class,
-                            frame
+                            frame,
+                            now
                         )
             else:
                 # Person has required PPE, clear violation
@@ -298,6 +314,13 @@ class ViolationEngine:
                     del self.violation_start_times[violation_key]
                 if violation_key in self.active_violations:
                     del self.active_violations[violation_key]
+                    if self.event_bus:
+                        self.event_bus.publish(
+                            "violation_cleared",
+                            camera_id,
+                            person_id=person_id,
+                            missing_ppe=ppe_class
+                        )
     
     async def _trigger_violation_alert(
         self,
@@ -305,7 +328,8 @@ class ViolationEngine:
         person_id: str,
         tracker: PersonTracker,
         missing_ppe: str,
-        frame: np.ndarray
+        frame: np.ndarray,
+        now: datetime
     ):
         """Trigger a violation alert and upload to Supabase."""
         violation_key = f"{camera_id}_{person_id}_{missing_ppe}"
@@ -324,6 +348,8 @@ class ViolationEngine:
         x2 = min(frame.shape[1], x2 + padding)
         y2 = min(frame.shape[0], y2 + padding)
         
+        # View into the (reused) frame buffer; CloudSync encodes it before
+        # upload_violation returns, so it is never stored
         person_frame = frame[y1:y2, x1:x2]
         
         # Mark as active violation
@@ -331,22 +357,54 @@ class ViolationEngine:
             "camera_id": camera_id,
             "person_id": person_id,
             "missing_ppe": missing_ppe,
-            "timestamp": datetime.now(),
-            "frame": person_frame,
+            "timestamp": now,
             "bbox": tracker.bbox
         }
         
         # Set cooldown
         self.violation_cooldowns[violation_key] = (
-            datetime.now() + timedelta(seconds=self.config.violation_cooldown_seconds)
+            now + timedelta(seconds=self.config.violation_cooldown_seconds)
         )
         
+        if self.compliance:
+            self.compliance.violation(camera_id, PPEClass[missing_ppe.upper()])
+        
+        if self.event_bus:
+            self.event_bus.publish(
+                "violation",
+                camera_id,
+                session_id=self.active_session_id,
+                person_id=person_id,
+                missing_ppe=missing_ppe,
+                bbox=[float(v) for v in tracker.bbox]
+            )
+        
+        # A near-identical snapshot is already uploaded (with its clip): link the alert to it
+        snapshot_hash = None
+        if self.snapshot_index and person_frame.size:
+            snapshot_hash, duplicate = self.snapshot_index.lookup(camera_id, person_id, person_frame)
+            if duplicate:
+                await self.cloud_sync.link_violation(
+                    self.active_session_id, missing_ppe, duplicate, captured_at=now.timestamp()
+                )
+                return
+        
+        # Start the clip before the upload so its window is centred on the event
+        clip = self.clip_recorder.trigger(camera_id) if self.clip_recorder else None
+        
         # Upload to Supabase
-        await self.cloud_sync.upload_violation(
+        snapshot_path = await self.cloud_sync.upload_violation(
             session_id=self.active_session_id,
             camera_id=camera_id,
             person_id=person_id,
             missing_ppe=missing_ppe,
             frame=person_frame,
-            bbox=tracker.bbox
+            bbox=tracker.bbox,
+            captured_at=now.timestamp()
         )
+        
+        if snapshot_hash is not None and snapshot_path:
+            self.snapshot_index.add(camera_id, person_id, snapshot_hash, snapshot_path)
+        
+        if clip:
+            clip.add_snapshot(snapshot_path)
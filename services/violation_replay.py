@@ -0,0 +1,219 @@
+"""
+Violation Replay Benchmark
+
+Replays recorded video through the detector and the violation engine to
+measure alert churn. Detections are computed once per sampled frame and
+then fed, with video timestamps, to one engine per variant:
+
+    raw       PPE presence taken from each frame as is (no smoothing)
+    smoothed  PPE_SMOOTHING_SECONDS / PPE_ON_THRESHOLD / PPE_OFF_THRESHOLD
+
+For each variant it reports alerts (= snapshot uploads) and how often a
+violation debounce timer was started, i.e. how often a person flipped to
+"missing" for some PPE item.
+
+Example usage:
+
+    python -m services.violation_replay --video videos/test1.mp4 --fps 5
+
+--miss-rate drops that fraction of PPE detections at random, to see how
+each variant copes with a detector that misses more often.
+"""
+
+import argparse
+import asyncio
+import copy
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from core import Config
+from core.ppe import PPE_ITEMS
+from .ai_client import AIClient
+from .violation_engine import ViolationEngine
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_VIDEOS = ["videos/test1.mp4", "videos/test2.mp4"]
+
+
+class CountingSync:
+    """Stands in for CloudSync and counts the uploads the engine would make."""
+
+    def __init__(self):
+        self.uploads = 0
+
+    async def upload_violation(self, **kwargs) -> str:
+        self.uploads += 1
+        return f"replay/{self.uploads}.jpg"
+
+
+def detect_video(
+    client: AIClient,
+    path: str,
+    fps: float,
+    max_seconds: float,
+    width: int,
+    height: int
+) -> List[Tuple[float, np.ndarray]]:
+    """Run the cascade on frames sampled at `fps`: (video time, detections)."""
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        logger.error(f"Could not open video: {path}")
+        return []
+
+    video_fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    step = max(1, round(video_fps / fps))
+    results = []
+    index = 0
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        timestamp = index / video_fps
+        if max_seconds and timestamp > max_seconds:
+            break
+        if index % step == 0:
+            frame = cv2.resize(frame, (width, height))
+            results.append((timestamp, client._run_cascade_detection(frame)))
+        index += 1
+    cap.release()
+    logger.info(f"Detected {len(results)} frames of {path}")
+    return results
+
+
+def drop_ppe(detections: np.ndarray, rate: float, rng: np.random.Generator) -> np.ndarray:
+    """Drop each PPE detection with probability `rate`."""
+    if rate <= 0 or not len(detections):
+        return detections
+    is_ppe = np.isin(detections["class_id"], np.array(PPE_ITEMS))
+    keep = ~is_ppe | (rng.random(len(detections)) >= rate)
+    return detections[keep]
+
+
+async def replay(
+    config: Config,
+    videos: Dict[str, List[Tuple[float, np.ndarray]]]
+) -> Dict[str, int]:
+    """Feed cached detections through a fresh engine and count its output."""
+    # Snapshots are only cropped, never uploaded, so any frame of the right size will do
+    frame = np.zeros((config.frame_height, config.frame_width, 3), dtype=np.uint8)
+    sync = CountingSync()
+    engine = ViolationEngine(config, sync)
+    engine.set_active_session("replay")
+
+    base = time.time()
+    debounce_starts = 0
+    for camera_id, frames in videos.items():
+        for timestamp, detections in frames:
+            before = set(engine.violation_start_times)
+            await engine.process_detections(camera_id, frame, detections, timestamp=base + timestamp)
+            debounce_starts += len(set(engine.violation_start_times) - before)
+
+    return {
+        "alerts": sync.uploads,
+        "debounce_starts": debounce_starts,
+        "tracks": next(engine._track_ids) - 1,
+    }
+
+
+def format_report(results: Dict[str, Dict[str, int]]) -> str:
+    """One line per variant, with the change relative to the raw variant."""
+    raw = results["raw"]
+    lines = []
+    for name, result in results.items():
+        line = (
+            f"{name:<9} alerts/uploads {result['alerts']:>5}  "
+            f"debounce starts {result['debounce_starts']:>6}  tracks {result['tracks']:>5}"
+        )
+        if name != "raw":
+            changes = [
+                f"{key.replace('_', ' ')} {result[key] / raw[key] - 1:+.0%}"
+                for key in ("alerts", "debounce_starts") if raw[key]
+            ]
+            if changes:
+                line += f"  ({', '.join(changes)} vs raw)"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Replay video through the violation engine with and without PPE smoothing."
+    )
+    parser.add_argument(
+        "--video",
+        action="append",
+        help="Video file to replay (repeatable). Defaults to the bundled videos.",
+    )
+    parser.add_argument(
+        "--fps",
+        type=float,
+        default=None,
+        help="Frames per second to process (default: FPS from the environment).",
+    )
+    parser.add_argument(
+        "--seconds",
+        type=float,
+        default=0.0,
+        help="Only replay the first N seconds of each video (0 = all).",
+    )
+    parser.add_argument(
+        "--miss-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of PPE detections to drop at random.",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    args = parse_args(argv)
+    config = Config(require_supabase=False)
+
+    client = AIClient(config)
+    if not client.models:
+        logger.error("No models loaded; place the .pt files in models/ to replay.")
+        return 1
+
+    rng = np.random.default_rng(args.seed)
+    videos = {}
+    for path in args.video or DEFAULT_VIDEOS:
+        frames = detect_video(
+            client,
+            path,
+            args.fps or config.fps,
+            args.seconds,
+            config.frame_width,
+            config.frame_height
+        )
+        videos[os.path.splitext(os.path.basename(path))[0]] = [
+            (t, drop_ppe(detections, args.miss_rate, rng)) for t, detections in frames
+        ]
+    if not any(videos.values()):
+        logger.error("No frames replayed.")
+        return 1
+
+    # Violation logs would drown the report
+    logging.getLogger("services.violation_engine").setLevel(logging.ERROR)
+    # PPE counts as worn exactly in the frames it is seen, as without smoothing
+    raw = copy.copy(config)
+    raw.ppe_smoothing_seconds = 0.0
+    raw.ppe_on_threshold = raw.ppe_off_threshold = 0.5
+    variants = {"raw": raw, "smoothed": config}
+    results = {name: asyncio.run(replay(variant, videos)) for name, variant in variants.items()}
+    print(format_report(results))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())